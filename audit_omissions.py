@@ -1,71 +1,259 @@
 import json
 import os
+import sys
+import time
+from typing import Any, Dict, Iterable, Iterator, Optional, Set, Tuple
 
 MAP_FILE = "codebase_map.json"
 RESULTS_FILE = "codebase_embeddings.json"
+REPORT_FILE = "omissions_report.json"
+CHUNK_FIELDS = ("project", "path", "chunk_index", "total_chunks")
+READ_BLOCK = 1 << 20
+
+FileKey = Tuple[str, str]  # (project, rel_path)
+
+# ---------------------------------------------------------
+# STREAMING READERS
+# ---------------------------------------------------------
+def iter_chunk_records(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the CHUNK_FIELDS of every record in codebase_embeddings.json
+    without materializing the list or parsing the vectors.
+
+    generate_embeddings writes the file with indent=2, so record fields
+    sit on their own 4-space-indented lines and every embedding value is
+    a line we only need to skip. Any other layout falls back to decoding
+    one record at a time.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        first = f.readline()
+        if first.rstrip() == "[":
+            yield from _iter_indented(f)
+        else:
+            f.seek(0)
+            yield from _iter_compact(f)
+
+def _iter_indented(f) -> Iterator[Dict[str, Any]]:
+    # str.find jumps from one 4-space field line to the next, so the ~770
+    # vector lines of every record are skipped without a Python loop
+    fields = set(CHUNK_FIELDS)
+    record: Dict[str, Any] = {}
+    tail = ""
+    while True:
+        block = f.read(READ_BLOCK)
+        if not block:
+            break
+        block = tail + block
+        cut = block.rfind("\n")
+        block, tail = block[:cut], block[cut:]
+
+        pos = 0
+        end = block.find("\n  }")
+        while True:
+            start = block.find('\n    "', pos)
+            while end != -1 and (start == -1 or end < start):
+                yield record
+                record = {}
+                end = block.find("\n  }", end + 1)
+            if start == -1:
+                break
+            line_end = block.find("\n", start + 1)
+            if line_end == -1:
+                line_end = len(block)
+            key, _, value = block[start + 6:line_end].partition('": ')
+            if key in fields:
+                record[key] = json.loads(value.rstrip().rstrip(","))
+            pos = line_end
+
+def _iter_compact(f) -> Iterator[Dict[str, Any]]:
+    decoder = json.JSONDecoder()
+    buffer = f.read(READ_BLOCK)
+    pos = buffer.index("[") + 1 if "[" in buffer else 0
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        try:
+            item, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            block = f.read(READ_BLOCK)
+            if not block:
+                return
+            buffer = buffer[pos:] + block
+            pos = 0
+            continue
+        yield {field: item.get(field) for field in CHUNK_FIELDS}
+
+def collect_chunks(records: Iterable[Dict[str, Any]]) -> Dict[FileKey, Dict[str, Any]]:
+    """Per file: the set of chunk indexes present and the expected total."""
+    files: Dict[FileKey, Dict[str, Any]] = {}
+    for r in records:
+        key = (r.get("project"), r.get("path"))
+        entry = files.get(key)
+        if entry is None:
+            entry = files[key] = {"chunks": set(), "total": None}
+        if r.get("chunk_index") is not None:
+            entry["chunks"].add(r["chunk_index"])
+        if r.get("total_chunks") is not None:
+            entry["total"] = max(entry["total"] or 0, r["total_chunks"])
+    return files
+
+def db_chunk_stats(cursor) -> Dict[FileKey, Dict[str, Any]]:
+    """
+    One aggregate over codebase_embeddings. Chunk index arrays are only
+    sent back for files that are incomplete, so the result stays one
+    small row per file.
+    """
+    cursor.execute("""
+        SELECT project, file_path, count(*), count(DISTINCT idx), max(total),
+               CASE WHEN count(DISTINCT idx) < max(total)
+                    THEN array_agg(DISTINCT idx) FILTER (WHERE idx IS NOT NULL) END
+        FROM (
+            SELECT project, file_path,
+                   (metadata->>'chunk_index')::int AS idx,
+                   (metadata->>'total_chunks')::int AS total
+            FROM codebase_embeddings
+        ) e
+        GROUP BY project, file_path
+    """)
+    stats = {}
+    for project, path, rows, distinct, total, present in cursor.fetchall():
+        stats[(project, path)] = {
+            "rows": rows,
+            "distinct": distinct,
+            "total": total,
+            "chunks": set(present) if present is not None else None
+        }
+    return stats
+
+# ---------------------------------------------------------
+# AUDIT
+# ---------------------------------------------------------
+def missing_chunks(present: Optional[Set[int]], total: Optional[int]) -> list:
+    if present is None or not total:
+        return []
+    return sorted(set(range(total)) - present)
+
+def audit(all_files: list, local: Dict[FileKey, Dict[str, Any]],
+          db: Optional[Dict[FileKey, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Classifies every expected file against the local results and, when
+    given, the database aggregate. A file is partial when chunk indexes
+    below its total_chunks are absent; duplicates show up as DB rows
+    beyond the distinct chunk count.
+    """
+    omissions = []
+    projects: Dict[str, Dict[str, int]] = {}
+    for f in all_files:
+        key = (f["project"], f["rel_path"])
+        stats = projects.setdefault(f["project"], {
+            "total": 0, "missing": 0, "partial": 0, "db_missing": 0, "db_partial": 0, "db_duplicates": 0
+        })
+        stats["total"] += 1
+
+        entry = {**f, "status": []}
+        loc = local.get(key)
+        if loc is None:
+            entry["status"].append("missing")
+            stats["missing"] += 1
+        else:
+            gaps = missing_chunks(loc["chunks"], loc["total"])
+            if gaps:
+                entry["status"].append("partial")
+                entry["missing_chunks"] = gaps
+                stats["partial"] += 1
+
+        if db is not None:
+            remote = db.get(key)
+            if remote is None:
+                entry["status"].append("db_missing")
+                stats["db_missing"] += 1
+            else:
+                total = max(remote["total"] or 0, (loc or {}).get("total") or 0)
+                if remote["distinct"] < total:
+                    entry["status"].append("db_partial")
+                    # Only incomplete files come back with their indexes
+                    entry["db_missing_chunks"] = missing_chunks(remote["chunks"] or set(), total)
+                    stats["db_partial"] += 1
+                if remote["rows"] > remote["distinct"]:
+                    entry["status"].append("db_duplicates")
+                    stats["db_duplicates"] += 1
+
+        if entry["status"]:
+            omissions.append(entry)
+
+    expected = {(f["project"], f["rel_path"]) for f in all_files}
+    stale = sorted(k for k in (db or {}) if k not in expected and k[0] in projects)
+    return {"omissions": omissions, "projects": projects, "stale_db_files": stale}
 
 def main():
     print("="*60)
     print("🕵️ AUDITORIA DE OMISIONES")
     print("="*60)
-    
+
+    use_db = "--db" in sys.argv[1:]
     if not os.path.exists(MAP_FILE) or not os.path.exists(RESULTS_FILE):
         print("❌ Archivos de datos no encontrados.")
         return
 
-    # Load All Expected
+    start = time.time()
+    # Load All Expected (one small entry per file)
     with open(MAP_FILE, 'r', encoding='utf-8') as f:
         all_files = json.load(f)
-    
-    # Load Processed
-    with open(RESULTS_FILE, 'r', encoding='utf-8') as f:
-        processed_data = json.load(f)
-        
-    # Set of processed full_paths
-    processed_paths = set()
-    for item in processed_data:
-        p = item.get('full_path') or item.get('id')
-        if p:
-            processed_paths.add(p)
-            
-    # Calculate Missing
-    missing = []
-    
-    projects_stats = {}
-    
-    for f in all_files:
-        proj = f['project']
-        if proj not in projects_stats:
-            projects_stats[proj] = {"total": 0, "missing": 0}
-        
-        projects_stats[proj]["total"] += 1
-        
-        if f['full_path'] not in processed_paths:
-            missing.append(f)
-            projects_stats[proj]["missing"] += 1
 
-    # Report
+    # Stream Processed (path/chunk fields only)
+    local = collect_chunks(iter_chunk_records(RESULTS_FILE))
+    local_chunks = sum(len(e["chunks"]) for e in local.values())
     print(f"📉 Total Archivos Esperados: {len(all_files)}")
-    print(f"📈 Total Procesados (Embeddings): {len(processed_paths)} (archivos únicos)")
-    print(f"🚫 Total Omisiones: {len(missing)}")
+    print(f"📈 Total Procesados (Embeddings): {len(local)} archivos únicos, {local_chunks} fragmentos")
+
+    db = None
+    if use_db:
+        from db import connect_db
+        conn = connect_db()
+        if not conn:
+            sys.exit(1)
+        try:
+            db = db_chunk_stats(conn.cursor())
+        finally:
+            conn.close()
+        print(f"🗄️ Total en Base de Datos: {len(db)} archivos, {sum(s['rows'] for s in db.values())} filas")
+
+    result = audit(all_files, local, db)
+    omissions = result["omissions"]
+
+    # Report
+    print(f"🚫 Total Omisiones: {len(omissions)}")
     print("-" * 30)
-    
-    for proj, stats in projects_stats.items():
-        print(f"   📂 {proj}: {stats['total'] - stats['missing']}/{stats['total']} (Faltan {stats['missing']})")
-        
+    for proj, stats in result["projects"].items():
+        line = (f"   📂 {proj}: {stats['total'] - stats['missing']}/{stats['total']} "
+                f"(Faltan {stats['missing']}, parciales {stats['partial']})")
+        if db is not None:
+            line += (f" | DB: faltan {stats['db_missing']}, parciales {stats['db_partial']}, "
+                     f"duplicados {stats['db_duplicates']}")
+        print(line)
+    if result["stale_db_files"]:
+        print(f"   🗑️ {len(result['stale_db_files'])} archivos en la DB ya no existen en el mapa")
+
     print("-" * 30)
-    if missing:
+    if omissions:
         print("📝 Lista de Omisiones (Primeros 10):")
-        for m in missing[:10]:
-            print(f"   - {m['rel_path']}")
-        
-        if len(missing) > 10:
-            print(f"   ... y {len(missing) - 10} más.")
-            
+        for m in omissions[:10]:
+            detail = ", ".join(m["status"])
+            gaps = m.get("missing_chunks") or m.get("db_missing_chunks")
+            if gaps:
+                detail += f" (fragmentos {gaps[:5]}{'...' if len(gaps) > 5 else ''})"
+            print(f"   - {m['rel_path']}: {detail}")
+
+        if len(omissions) > 10:
+            print(f"   ... y {len(omissions) - 10} más.")
+
     # Save Omissions to file for "listing exactly"
-    with open("omissions_report.json", "w", encoding="utf-8") as f:
-        json.dump(missing, f, indent=2)
-    print("\n💾 Reporte detallado guardado en 'omissions_report.json'")
+    with open(REPORT_FILE, "w", encoding="utf-8") as f:
+        json.dump({"omissions": omissions, "stale_db_files": result["stale_db_files"]}, f, indent=2)
+    print(f"\n💾 Reporte detallado guardado en '{REPORT_FILE}' ({time.time() - start:.2f}s)")
 
 if __name__ == "__main__":
-    main()
+    from profiling import run_main  # --profile
+    run_main("audit_omissions", main)
@@ -0,0 +1,313 @@
+"""
+Latency regression benchmarks: p95 per stage against the last baseline.
+
+    python bench_latency.py [--db[=postgresql://...]] [--stub | --url=...]
+    python bench_latency.py --update-baseline      # after a verified-good change
+
+Exits 1 when a stage's p95 exceeds baseline * (1 + tolerance) + noise floor.
+"""
+
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+os.environ.setdefault("EMBEDDING_BACKEND", "fake")
+
+from generate_embeddings import get_batch_embeddings, recursive_split_text, MODEL_NAME, TARGET_CHUNK_SIZE
+from lexical_index import LexicalIndex, chunk_doc_id
+from scan_codebase import scan_directory
+
+# Configuration
+BASELINE_FILE = "latency_baseline.json"
+HISTORY_FILE = "latency_history.jsonl"
+TOLERANCE = 0.20            # p95 may grow 20% before it counts as a regression
+NOISE_FLOOR_MS = 0.5        # ...plus this much, so sub-millisecond stages don't flap
+CORPUS_FILES = 300
+CORPUS_SEED = 42
+SCAN_REPEATS = 40
+EMBED_BATCH = 5             # texts per Vertex request, as in generate_embeddings
+UPLOAD_BATCH = 25           # rows per insert, as in upload_embeddings
+HTTP_STAGES = [(3, 20.0), (5, 20.0)]
+QUERIES = ["order total price", "daily garment count", "prisma client connect", "shift status admin",
+           "next id generator", "logistics route date", "user role staff", "embedding batch upload"]
+
+# ---------------------------------------------------------
+# SYNTHETIC CORPUS
+# ---------------------------------------------------------
+WORDS = ("order customer garment price total status shift admin staff date route logistics "
+         "count plant home notes prisma client query select update insert delete config "
+         "embedding vector chunk index search token batch upload cache retry error").split()
+
+def build_corpus(root: str, files: int = CORPUS_FILES, seed: int = CORPUS_SEED):
+    """Deterministic source tree with a realistic size spread (some files span several chunks)."""
+    rng = random.Random(seed)
+    extensions = [".ts", ".tsx", ".py", ".js", ".md"]
+    for i in range(files):
+        directory = os.path.join(root, f"src/module_{i % 12}/part_{i % 5}")
+        os.makedirs(directory, exist_ok=True)
+        size = int(min(rng.lognormvariate(8.2, 0.9), 60000))
+        lines = []
+        length = 0
+        while length < size:
+            line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 12)))
+            if rng.random() < 0.1:
+                line += "\n"
+            lines.append(line)
+            length += len(line) + 1
+        with open(os.path.join(directory, f"file_{i}{extensions[i % len(extensions)]}"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+
+# ---------------------------------------------------------
+# MEASUREMENT
+# ---------------------------------------------------------
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+def stats(samples_ms: List[float]) -> Dict[str, float]:
+    return {
+        "n": len(samples_ms),
+        "p50_ms": percentile(samples_ms, 50),
+        "p95_ms": percentile(samples_ms, 95),
+        "mean_ms": sum(samples_ms) / len(samples_ms),
+        "max_ms": max(samples_ms)
+    }
+
+def time_each(operation: Callable[[Any], Any], items: List[Any]) -> List[float]:
+    samples = []
+    for item in items:
+        start = time.perf_counter()
+        operation(item)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+# ---------------------------------------------------------
+# STAGES
+# ---------------------------------------------------------
+def bench_pipeline(corpus: str) -> Dict[str, List[float]]:
+    results: Dict[str, List[float]] = {}
+
+    files: List[Dict[str, Any]] = []
+    def scan(_):
+        # scan_directory prints every directory; the terminal is not what we measure
+        with contextlib.redirect_stdout(io.StringIO()):
+            files[:] = scan_directory(corpus)
+    scan(None)   # warm the page cache so the first sample isn't an outlier
+    results["scan"] = time_each(scan, range(SCAN_REPEATS))
+
+    contents = []
+    for item in files:
+        with open(item["full_path"], "r", encoding="utf-8", errors="ignore") as f:
+            contents.append((item, f.read()))
+
+    chunks: List[Dict[str, Any]] = []
+    def chunk(entry):
+        item, content = entry
+        for i, text in enumerate(recursive_split_text(content, TARGET_CHUNK_SIZE)):
+            chunks.append({"project": item["project"], "path": item["rel_path"], "chunk_index": i, "content": text})
+    results["chunk"] = time_each(chunk, contents)
+
+    batches = [chunks[i:i + EMBED_BATCH] for i in range(0, len(chunks), EMBED_BATCH)]
+    def embed(batch):
+        for record, vector in zip(batch, get_batch_embeddings([r["content"] for r in batch])):
+            record["embedding"] = vector
+    results["embed"] = time_each(embed, batches)
+
+    index = LexicalIndex()
+    def add(record):
+        index.add(chunk_doc_id(record["project"], record["path"], record["chunk_index"]), record["content"],
+                  record["project"], record["path"], record["chunk_index"])
+    results["index"] = time_each(add, chunks)
+    results["search_lexical"] = time_each(lambda q: index.search(q, 20), QUERIES * 25)
+
+    results["_chunks"] = chunks  # handed to the DB stages
+    return results
+
+BENCH_SCHEMA = "bench_latency"
+
+def bench_database(chunks: List[Dict[str, Any]]) -> Dict[str, List[float]]:
+    """
+    Times the production write and read paths (store_embeddings, and
+    vector_search through match_codebase) against a scratch schema built by
+    init_db.create_schema. The scratch schema goes first in search_path, so
+    every unqualified codebase_embeddings / embedding_versions resolves to it;
+    it is dropped afterwards. Never touches public tables.
+    """
+    from db import connect_db
+    from embedding_versions import store_embeddings
+    from hybrid_search import vector_search
+    from init_db import create_schema
+    from partition_embeddings import ensure_ann_indexes, truncate_tables
+    from upload_embeddings import content_hash
+
+    conn = connect_db()
+    if conn is None:
+        return {}
+    cursor = conn.cursor()
+    results: Dict[str, List[float]] = {}
+    try:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE; CREATE SCHEMA {BENCH_SCHEMA};")
+        cursor.execute(f"SET search_path TO {BENCH_SCHEMA}, public;")
+        with contextlib.redirect_stdout(io.StringIO()):
+            create_schema(cursor)
+        conn.commit()
+
+        rows = [(r["project"], r["path"], r["content"], r["embedding"],
+                 json.dumps({"chunk_index": r["chunk_index"], "model": MODEL_NAME}),
+                 chunk_doc_id(r["project"], r["path"], r["chunk_index"]), content_hash(r["content"]))
+                for r in chunks]
+        # As upload_embeddings: ANN index dropped for the load, built on the loaded rows
+        truncate_tables(cursor, ["codebase_embeddings"])
+        conn.commit()
+        def upload(batch):
+            store_embeddings(cursor, batch)
+            conn.commit()
+        results["upload"] = time_each(upload, [rows[i:i + UPLOAD_BATCH] for i in range(0, len(rows), UPLOAD_BATCH)])
+
+        ensure_ann_indexes(cursor, ["codebase_embeddings"])
+        cursor.execute("ANALYZE codebase_embeddings;")
+        conn.commit()
+
+        query_vectors = get_batch_embeddings(QUERIES)
+        results["search_vector"] = time_each(lambda v: vector_search(cursor, v, -1.0, 20), query_vectors * 25)
+    finally:
+        conn.rollback()
+        cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE;")
+        cursor.execute("RESET search_path;")
+        conn.commit()
+        conn.close()
+    return results
+
+def bench_http(url: Optional[str], stub: bool) -> Dict[str, Dict[str, float]]:
+    """Per-endpoint percentiles from a short constant-rate run of load_test."""
+    from load_test import run_load_test
+    report = asyncio.run(run_load_test(url, HTTP_STAGES, stub=stub, poisson=False, seed=CORPUS_SEED))
+    results = {}
+    for name, s in report["endpoints"].items():
+        if s.get("count"):
+            results[f"http_{name}"] = {"n": s["count"], "p50_ms": s["p50_ms"], "p95_ms": s["p95_ms"],
+                                       "mean_ms": s["mean_ms"], "max_ms": s["max_ms"], "errors": s["errors"]}
+    return results
+
+# ---------------------------------------------------------
+# BASELINE
+# ---------------------------------------------------------
+def environment() -> Dict[str, str]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"machine": platform.node(), "platform": platform.platform(),
+            "python": platform.python_version(), "commit": commit}
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Any],
+            tolerance: float = TOLERANCE) -> List[Dict[str, Any]]:
+    rows = []
+    for stage, current in results.items():
+        previous = baseline.get("results", {}).get(stage)
+        if previous is None:
+            rows.append({"stage": stage, "p95_ms": current["p95_ms"], "baseline_ms": None, "status": "new"})
+            continue
+        limit = previous["p95_ms"] * (1 + tolerance) + NOISE_FLOOR_MS
+        change = (current["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] if previous["p95_ms"] else 0.0
+        rows.append({
+            "stage": stage, "p95_ms": current["p95_ms"], "baseline_ms": previous["p95_ms"],
+            "change": change, "status": "REGRESSION" if current["p95_ms"] > limit else "ok"
+        })
+    return rows
+
+def main():
+    print("="*60)
+    print("📏 LATENCY REGRESSION BENCHMARKS")
+    print("="*60)
+
+    args = sys.argv[1:]
+    options = {a.split("=", 1)[0]: a.split("=", 1)[1] if "=" in a else True
+               for a in args if a.startswith("--")}
+    tolerance = float(options.get("--tolerance", TOLERANCE))
+    baseline_file = options.get("--baseline", BASELINE_FILE)
+    db_url = options.get("--db") or os.environ.get("BENCH_DATABASE_URL")
+
+    corpus = options.get("--corpus")
+    scratch = None
+    if not corpus:
+        scratch = corpus = tempfile.mkdtemp(prefix="bench_corpus_")
+        build_corpus(corpus)
+
+    try:
+        print(f"📂 Corpus: {corpus}")
+        samples = bench_pipeline(corpus)
+        chunks = samples.pop("_chunks")
+        if db_url:
+            if isinstance(db_url, str):
+                import db
+                db.DB_URL = db_url   # bare --db uses DATABASE_URL; either way through db's pool
+            print(f"🗄️ Local Postgres: {len(chunks)} chunks")
+            samples.update(bench_database(chunks))
+        else:
+            print("   (upload / search_vector skipped: pass --db[=URL] or BENCH_DATABASE_URL)")
+    finally:
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    results = {stage: stats(values) for stage, values in samples.items()}
+    if options.get("--stub") or options.get("--url"):
+        results.update(bench_http(options.get("--url"), bool(options.get("--stub"))))
+
+    baseline = {}
+    if os.path.exists(baseline_file):
+        with open(baseline_file, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    env = environment()
+    if baseline and baseline.get("environment", {}).get("machine") != env["machine"]:
+        print(f"   ⚠️ Baseline recorded on {baseline['environment'].get('machine')}; numbers may not be comparable")
+
+    rows = compare(results, baseline, tolerance)
+    print(f"\n   {'stage':<20} {'n':>6} {'p50':>9} {'p95':>9} {'baseline':>9} {'change':>8}")
+    for row in rows:
+        s = results[row["stage"]]
+        base = f"{row['baseline_ms']:>9.2f}" if row["baseline_ms"] is not None else f"{'-':>9}"
+        change = f"{row['change'] * 100:>+7.1f}%" if "change" in row else f"{'new':>8}"
+        flag = "  ❌" if row["status"] == "REGRESSION" else ""
+        print(f"   {row['stage']:<20} {s['n']:>6} {s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {base} {change}{flag}")
+
+    regressions = [r for r in rows if r["status"] == "REGRESSION"]
+    run = {"timestamp": datetime.now().isoformat(), "environment": env, "results": results,
+           "baseline_version": baseline.get("version"), "regressions": [r["stage"] for r in regressions]}
+    with open(HISTORY_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(run) + "\n")
+
+    if options.get("--update-baseline"):
+        if regressions and not options.get("--force"):
+            print("\n❌ Not updating the baseline over regressions (use --force if they are intended)")
+            sys.exit(1)
+        merged = dict(baseline.get("results", {}))
+        merged.update(results)
+        with open(baseline_file, "w", encoding="utf-8") as f:
+            json.dump({"version": baseline.get("version", 0) + 1, "timestamp": run["timestamp"],
+                       "environment": env, "tolerance": tolerance, "results": merged}, f, indent=2)
+        print(f"\n💾 Baseline v{baseline.get('version', 0) + 1} saved to {baseline_file}")
+        return
+
+    if not baseline:
+        print(f"\nℹ️ No baseline yet: run with --update-baseline to record one")
+    elif regressions:
+        print(f"\n❌ {len(regressions)} stage(s) regressed beyond {tolerance:.0%} (p95)")
+        sys.exit(1)
+    else:
+        print(f"\n✅ Within {tolerance:.0%} of baseline v{baseline['version']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import json
+import sys
+
+from db import connect_db
+
+# The ANN index created by init_db.py / setup_vector_store.sql
+ANN_INDEX = "codebase_embeddings_embedding_idx"
+
+# Below this many rows the planner legitimately prefers a seq scan + sort,
+# so the "natural" plan is only asserted on a realistically sized table.
+MIN_ROWS_FOR_NATURAL_PLAN = 10000
+
+PROBES = 10
+
+# (label, acceptable indexes, filter_project, filter_path, filter_extension, filter_type)
+# A selective filter may legitimately be answered through its btree index
+# plus an exact sort instead of the ANN index. On the partitioned table the
+# primary key is (id, project), so it can serve the project filter as well.
+CASES = [
+    ("unfiltered", {ANN_INDEX}, None, None, None, None),
+    ("project", {ANN_INDEX, "codebase_embeddings_project_path_idx", "codebase_embeddings_project_chunk_key_idx",
+                 "codebase_embeddings_pkey"},
+     "lavaseco-app", None, None, None),
+]
+
+def plan_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+def indexes_used(plan):
+    return {
+        n["Index Name"] for n in plan_nodes(plan)
+        if n.get("Node Type") in ("Index Scan", "Index Only Scan", "Bitmap Index Scan")
+    }
+
+def canonical_indexes(cursor, names):
+    """
+    On the partitioned table (partition_embeddings.py) every partition has
+    its own copies: a partition's index counts as its parent index, and a
+    partition's ANN index as ANN_INDEX.
+    """
+    if not names:
+        return set()
+    cursor.execute("""
+        select c.relname, coalesce(p.relname, c.relname), am.amname
+        from pg_class c
+        join pg_am am on am.oid = c.relam
+        left join pg_inherits i on i.inhrelid = c.oid
+        left join pg_class p on p.oid = i.inhparent
+        where c.relname = any(%s);
+    """, (sorted(names),))
+    return {ANN_INDEX if method in ("ivfflat", "hnsw") else parent for _, parent, method in cursor.fetchall()}
+
+def relations_scanned(plan):
+    return {n["Relation Name"] for n in plan_nodes(plan) if "Relation Name" in n}
+
+def explain_search(cursor, filters, vector_literal: str):
+    """
+    EXPLAINs the exact statement match_codebase executes (as built by
+    match_codebase_sql), with the same parameters the function binds.
+    """
+    cursor.execute("select match_codebase_sql(%s, %s, %s, %s);", filters)
+    statement = cursor.fetchone()[0]
+
+    # Only this statement is replaced: a pooled connection keeps the ones
+    # execute_prepared made (conn.prepared) for later callers. One left
+    # behind by a check that failed half-way is dropped first.
+    cursor.execute("select exists (select 1 from pg_prepared_statements where name = 'match_stmt');")
+    if cursor.fetchone()[0]:
+        cursor.execute("deallocate match_stmt;")
+    cursor.execute(
+        "prepare match_stmt(vector, text, text, text, text, float, int) as " + statement
+    )
+    cursor.execute(
+        "explain (format json) execute match_stmt(%s::vector, %s, %s, %s, %s, %s, %s);",
+        (vector_literal, filters[0], filters[1], filters[2], filters[3], 0.5, 5)
+    )
+    plan = cursor.fetchone()[0][0]["Plan"]
+    cursor.execute("deallocate match_stmt;")
+    return plan
+
+def main():
+    print("="*60)
+    print("🔬 ANN INDEX USAGE CHECK (EXPLAIN match_codebase)")
+    print("="*60)
+
+    conn = connect_db()
+    if not conn:
+        sys.exit(1)
+
+    failures = 0
+    try:
+        cursor = conn.cursor()
+        cursor.execute("select count(*) from codebase_embeddings;")
+        row_count = cursor.fetchone()[0]
+        print(f"🧠 Rows: {row_count}")
+
+        from partition_embeddings import is_partitioned
+        partitioned = is_partitioned(cursor)
+        if partitioned:
+            print("🧩 Partitioned by project")
+
+        cursor.execute("select set_config('ivfflat.probes', %s, true);", (str(PROBES),))
+        from embedding_versions import versions
+        live = versions(cursor)
+        vector_literal = '[' + ','.join(['0.01'] * (live[0].dims if live else 768)) + ']'
+
+        for label, expected, *filters in CASES:
+            # 1. Shape check: with seq scans disabled the statement must be
+            #    servable by the ANN index at all (a distance predicate in
+            #    WHERE, or a missing LIMIT, would make that impossible).
+            cursor.execute("set local enable_seqscan = off;")
+            forced = explain_search(cursor, filters, vector_literal)
+            cursor.execute("set local enable_seqscan = on;")
+
+            used = canonical_indexes(cursor, indexes_used(forced)) & expected
+            if used:
+                print(f"   ✅ [{label}] statement is served by {', '.join(sorted(used))}")
+            else:
+                print(f"   ❌ [{label}] no index in {sorted(expected)} can serve this statement:")
+                print(json.dumps(forced, indent=2))
+                failures += 1
+                continue
+
+            # A project-scoped search must be pruned to that project's partition
+            if partitioned and filters[0] is not None:
+                scanned = relations_scanned(forced)
+                if len(scanned) == 1:
+                    print(f"   ✅ [{label}] scans one partition ({next(iter(scanned))})")
+                else:
+                    print(f"   ❌ [{label}] scans {len(scanned)} partitions: {', '.join(sorted(scanned))}")
+                    failures += 1
+
+            # 2. Natural plan, only meaningful once the table is large enough
+            natural = explain_search(cursor, filters, vector_literal)
+            used = canonical_indexes(cursor, indexes_used(natural)) & expected
+            if used:
+                print(f"   ✅ [{label}] planner picks {', '.join(sorted(used))} by itself")
+            elif row_count >= MIN_ROWS_FOR_NATURAL_PLAN:
+                print(f"   ❌ [{label}] planner chose a different plan on {row_count} rows:")
+                print(json.dumps(natural, indent=2))
+                failures += 1
+            else:
+                print(f"   ⚠️ [{label}] planner skips the index on a small table ({row_count} rows)")
+
+        conn.rollback()
+    except Exception as e:
+        print(f"❌ Check failed: {e}")
+        failures += 1
+    finally:
+        conn.close()
+
+    print("="*60)
+    print("✅ INDEX USAGE OK" if not failures else f"❌ {failures} CHECK(S) FAILED")
+    sys.exit(0 if not failures else 1)
+
+if __name__ == "__main__":
+    main()
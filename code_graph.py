@@ -0,0 +1,521 @@
+import ast
+import hashlib
+import json
+import os
+import posixpath
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from memory_graph import FILE_NODE_PREFIX, file_node_id
+
+# Configuration
+INPUT_FILE = "codebase_map.json"
+PARSE_EXTENSIONS = {'.py', '.ts', '.tsx', '.js', '.jsx'}
+TS_RESOLVE_SUFFIXES = ['', '.ts', '.tsx', '.js', '.jsx', '/index.ts', '/index.tsx', '/index.js', '/index.jsx']
+TS_PATH_ALIASES = {"@/": "src/"}  # tsconfig.json "paths"
+WORKER_CHUNKSIZE = 32
+UPSERT_PAGE_SIZE = 1000
+STDLIB_MODULES = set(getattr(sys, "stdlib_module_names", ()))  # not worth a graph node
+
+# Node types / relationships (RelationType in src/lib/brain/types.ts)
+FILE_NODE = "File"
+SYMBOL_NODE = "Symbol"
+MODULE_NODE = "Technology"
+IMPORTS = "DEPENDS_ON"
+DEFINES = "CONTAINS"
+CALLS = "USES"
+
+def symbol_node_id(project: str, path: str, name: str) -> str:
+    return f"sym:{project}/{path}#{name}"
+
+def module_node_id(name: str) -> str:
+    return f"module:{name}"
+
+def relation_id(source: str, relationship: str, target: str) -> str:
+    # Same shape as RemoteGraph.addRelation, without lowercasing (paths are case-sensitive)
+    return f"{source}_{relationship}_{target}"
+
+def file_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+# ---------------------------------------------------------
+# PARSERS (run in worker processes)
+# ---------------------------------------------------------
+# Every parser returns the same raw facts; resolution against the other
+# scanned files happens in the parent, which knows every path.
+#   imports: [{"module", "level", "names": [[imported, local]], "namespace"}]
+#   exports: [name]
+#   calls:   {"local" or "local.member": count}
+
+def parse_python(source: str) -> Dict[str, Any]:
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return {"imports": [], "exports": [], "calls": {}}
+
+    imports = []
+    exports = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            if not node.name.startswith("_"):
+                exports.append(node.name)
+        elif isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name) and not target.id.startswith("_"):
+                    exports.append(target.id)
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                # "import a.b" binds "a"; "import a.b as c" binds the full module
+                local = alias.asname or alias.name.split(".")[0]
+                module = alias.name if alias.asname else alias.name.split(".")[0]
+                imports.append({"module": module, "level": 0, "names": [], "namespace": local})
+        elif isinstance(node, ast.ImportFrom):
+            imports.append({
+                "module": node.module or "",
+                "level": node.level,
+                "names": [[a.name, a.asname or a.name] for a in node.names if a.name != "*"],
+                "namespace": None
+            })
+
+    calls = Counter()
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        func = node.func
+        if isinstance(func, ast.Name):
+            calls[func.id] += 1
+        elif isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name):
+            calls[f"{func.value.id}.{func.attr}"] += 1
+
+    return {"imports": imports, "exports": exports, "calls": dict(calls)}
+
+TS_COMMENT = re.compile(r"/\*[\s\S]*?\*/|(?<![:'\"\w\\])//[^\n]*")
+TS_IMPORT_FROM = re.compile(r"\bimport\s+(?:type\s+)?([\w*{}\s,$]+?)\s+from\s+['\"]([^'\"]+)['\"]")
+TS_IMPORT_BARE = re.compile(r"\bimport\s+['\"]([^'\"]+)['\"]")
+TS_IMPORT_CALL = re.compile(r"\b(?:require|import)\s*\(\s*['\"]([^'\"]+)['\"]\s*\)")
+TS_REQUIRE_BINDING = re.compile(r"\b(?:const|let|var)\s+(\{[^}]*\}|[\w$]+)\s*=\s*require\s*\(\s*['\"]([^'\"]+)['\"]\s*\)")
+TS_REEXPORT = re.compile(r"\bexport\s+(?:type\s+)?(\*(?:\s+as\s+[\w$]+)?|\{[^}]*\})\s*from\s+['\"]([^'\"]+)['\"]")
+TS_EXPORT_DECL = re.compile(
+    r"\bexport\s+(?:default\s+)?(?:declare\s+)?(?:abstract\s+)?(?:async\s+)?"
+    r"(?:function\s*\*?|class|const|let|var|interface|type|enum)\s+([A-Za-z_$][\w$]*)"
+)
+TS_EXPORT_LIST = re.compile(r"\bexport\s*(?:type\s+)?\{([^}]*)\}(?!\s*from)")
+TS_EXPORT_DEFAULT = re.compile(r"\bexport\s+default\b|\bmodule\.exports\s*=")
+TS_CJS_EXPORT = re.compile(r"\b(?:module\.)?exports\.([A-Za-z_$][\w$]*)\s*=")
+TS_CALL = re.compile(r"(?<![\w$.])([A-Za-z_$][\w$]*)(?:\s*\.\s*([A-Za-z_$][\w$]*))?\s*\(")
+TS_JSX = re.compile(r"<([A-Z][\w$]*)(?:\.([A-Za-z_$][\w$]*))?[\s/>]")
+
+def _ts_specifiers(clause: str) -> List[List[str]]:
+    """'{ a, b as c, type D }' -> [[a, a], [b, c], [D, D]]"""
+    names = []
+    for part in clause.strip().strip("{}").split(","):
+        part = re.sub(r"^\s*type\s+", "", part).strip()
+        if not part:
+            continue
+        imported, _, local = part.partition(" as ")
+        names.append([imported.strip(), (local or imported).strip()])
+    return names
+
+def parse_typescript(source: str) -> Dict[str, Any]:
+    code = TS_COMMENT.sub("", source)
+    imports = []
+    seen_modules = set()
+
+    for clause, module in TS_IMPORT_FROM.findall(code):
+        seen_modules.add(module)
+        names = []
+        namespace = None
+        # default, * as ns, { named } in any combination
+        braces = re.search(r"\{[^}]*\}", clause)
+        if braces:
+            names.extend(_ts_specifiers(braces.group(0)))
+            clause = clause.replace(braces.group(0), "")
+        for part in clause.split(","):
+            part = part.strip()
+            if part.startswith("*"):
+                namespace = part.split(" as ")[-1].strip()
+            elif part:
+                names.append(["default", part])
+        imports.append({"module": module, "level": 0, "names": names, "namespace": namespace})
+
+    for binding, module in TS_REQUIRE_BINDING.findall(code):
+        seen_modules.add(module)
+        if binding.startswith("{"):
+            names = [[a, b] for a, b in (_ts_specifiers(binding.replace(":", " as ")))]
+            imports.append({"module": module, "level": 0, "names": names, "namespace": None})
+        else:
+            imports.append({"module": module, "level": 0, "names": [], "namespace": binding})
+
+    exports = list(dict.fromkeys(TS_EXPORT_DECL.findall(code) + TS_CJS_EXPORT.findall(code)))
+    for clause in TS_EXPORT_LIST.findall(code):
+        exports.extend(local for _, local in _ts_specifiers(clause))
+    if TS_EXPORT_DEFAULT.search(code):
+        exports.append("default")  # what default imports bind to
+
+    for clause, module in TS_REEXPORT.findall(code):
+        seen_modules.add(module)
+        if clause.startswith("{"):
+            specifiers = _ts_specifiers(clause)
+            exports.extend(local for _, local in specifiers)
+            imports.append({"module": module, "level": 0, "names": specifiers, "namespace": None})
+        else:
+            imports.append({"module": module, "level": 0, "names": [], "namespace": None})
+
+    for module in TS_IMPORT_BARE.findall(code) + TS_IMPORT_CALL.findall(code):
+        if module not in seen_modules:
+            seen_modules.add(module)
+            imports.append({"module": module, "level": 0, "names": [], "namespace": None})
+
+    calls = Counter()
+    for pattern in (TS_CALL, TS_JSX):
+        for name, member in pattern.findall(code):
+            calls[f"{name}.{member}" if member else name] += 1
+
+    return {"imports": imports, "exports": list(dict.fromkeys(exports)), "calls": dict(calls)}
+
+def extract_file(task: Tuple[Dict[str, Any], Optional[str]]) -> Optional[Dict[str, Any]]:
+    """
+    Worker entry point: hashes the file and, when it differs from the
+    stored hash, parses it. Returns None for unreadable files.
+    """
+    item, stored_hash = task
+    try:
+        with open(item["full_path"], "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    result = {"project": item["project"], "path": item["rel_path"], "hash": file_hash(data)}
+    if result["hash"] == stored_hash:
+        result["unchanged"] = True
+        return result
+
+    source = data.decode("utf-8", errors="ignore")
+    if item["ext"] == ".py":
+        result.update(parse_python(source))
+    else:
+        result.update(parse_typescript(source))
+    return result
+
+# ---------------------------------------------------------
+# RESOLUTION (parent process)
+# ---------------------------------------------------------
+def package_name(module: str) -> str:
+    """'@supabase/ssr/x' -> '@supabase/ssr', 'next/server' -> 'next', 'a.b' -> 'a'."""
+    if module.startswith("@"):
+        return "/".join(module.split("/")[:2])
+    return re.split(r"[/.]", module)[0]
+
+def resolve_typescript(path: str, module: str, known: Set[str]) -> Optional[str]:
+    for alias, target in TS_PATH_ALIASES.items():
+        if module.startswith(alias):
+            base = target + module[len(alias):]
+            break
+    else:
+        if not module.startswith("."):
+            return None
+        base = posixpath.normpath(posixpath.join(posixpath.dirname(path), module))
+    for suffix in TS_RESOLVE_SUFFIXES:
+        if base + suffix in known:
+            return base + suffix
+    return None
+
+def resolve_python(path: str, module: str, level: int, known: Set[str]) -> Optional[str]:
+    if level:
+        base = posixpath.dirname(path)
+        for _ in range(level - 1):
+            base = posixpath.dirname(base)
+        roots = [base]
+    else:
+        # Absolute imports resolve from the project root or, for scripts run
+        # in place, from the importing file's directory
+        roots = ["", posixpath.dirname(path)]
+    rel = module.replace(".", "/")
+    for root in roots:
+        base = posixpath.join(root, rel) if rel else root
+        for candidate in (base + ".py", posixpath.join(base, "__init__.py")):
+            if candidate in known:
+                return candidate
+    return None
+
+def build_file_graph(facts: Dict[str, Any], known: Set[str]) -> Tuple[List[Tuple], List[Tuple]]:
+    """
+    Turns one file's raw facts into (nodes, relations):
+    nodes are (id, name, type, properties), relations are
+    (id, source, relationship, target, context).
+    """
+    project, path = facts["project"], facts["path"]
+    is_python = path.endswith(".py")
+    source = file_node_id(project, path)
+    nodes = []
+    relations = []
+
+    def relate(relationship: str, target: str):
+        relations.append((relation_id(source, relationship, target), source, relationship, target, source))
+
+    for name in facts["exports"]:
+        symbol = symbol_node_id(project, path, name)
+        nodes.append((symbol, name, SYMBOL_NODE, {"project": project, "file": path}))
+        relate(DEFINES, symbol)
+
+    bindings: Dict[str, Tuple[str, str]] = {}   # local name -> (file, imported name)
+    namespaces: Dict[str, str] = {}             # local alias -> file
+    for imp in facts["imports"]:
+        module, names = imp["module"], imp["names"]
+        if is_python:
+            target = resolve_python(path, module, imp["level"], known)
+        else:
+            target = resolve_typescript(path, module, known)
+
+        if target is None and not imp["level"] and not module.startswith("."):
+            external = package_name(module)
+            if module and external not in STDLIB_MODULES:
+                nodes.append((module_node_id(external), external, MODULE_NODE, {}))
+                relate(IMPORTS, module_node_id(external))
+            continue
+        if target is None:
+            continue
+
+        relate(IMPORTS, file_node_id(project, target))
+        if imp["namespace"]:
+            namespaces[imp["namespace"]] = target
+        for imported, local in names:
+            # "from pkg import module" binds a module, not a symbol
+            submodule = None
+            if is_python:
+                submodule = resolve_python(path, f"{module}.{imported}" if module else imported, imp["level"], known)
+            if submodule:
+                relate(IMPORTS, file_node_id(project, submodule))
+                namespaces[local] = submodule
+            else:
+                bindings[local] = (target, imported)
+
+    for call in facts["calls"]:
+        local, _, member = call.partition(".")
+        if member and local in namespaces:
+            relate(CALLS, symbol_node_id(project, namespaces[local], member))
+        elif not member and local in bindings:
+            target, imported = bindings[local]
+            relate(CALLS, symbol_node_id(project, target, imported))
+
+    nodes.append((source, posixpath.basename(path), FILE_NODE, {
+        "project": project, "path": path, "content_hash": facts["hash"],
+        "imports": len(facts["imports"]), "exports": facts["exports"]
+    }))
+    # Relations are unique per id; nodes per id, last one wins
+    relations = list({r[0]: r for r in relations}.values())
+    return nodes, relations
+
+# ---------------------------------------------------------
+# DATABASE
+# ---------------------------------------------------------
+def stored_file_hashes(cursor, projects: Iterable[str]) -> Dict[str, str]:
+    cursor.execute("""
+        SELECT id, properties->>'content_hash' FROM memory_nodes
+        WHERE type = %s AND properties->>'project' = ANY(%s)
+    """, (FILE_NODE, list(projects)))
+    return dict(cursor.fetchall())
+
+def dependent_files(cursor, file_ids: List[str]) -> Set[str]:
+    """
+    Files whose imports or calls point at these files or their symbols:
+    their relations were resolved against the old version, so an
+    incremental run parses them again.
+    """
+    symbol_prefixes = ["sym:" + file_id[len(FILE_NODE_PREFIX):] for file_id in file_ids]
+    cursor.execute("""
+        SELECT DISTINCT context FROM memory_relations
+        WHERE relationship IN (%s, %s)
+          AND (target = ANY(%s) OR split_part(target, '#', 1) = ANY(%s))
+    """, (IMPORTS, CALLS, file_ids, symbol_prefixes))
+    return {row[0] for row in cursor.fetchall()}
+
+def write_graph(conn, nodes: List[Tuple], relations: List[Tuple], touched: List[str], removed: List[str]) -> Dict[str, int]:
+    """
+    One transaction: upserts nodes (skipping identical rows so
+    MemoryGraph.refresh only sees real changes), inserts new relations and
+    deletes the relations and symbols the touched files no longer produce,
+    plus any relation whose target was one of those symbols or a removed
+    file. Relations are owned by the file in their context column.
+    """
+    from psycopg2.extras import execute_values
+
+    cursor = conn.cursor()
+    owners = touched + removed
+    stats = {"nodes": 0, "relations": 0, "stale_relations": 0, "stale_symbols": 0}
+    try:
+        cursor.execute("SELECT id FROM memory_relations WHERE context = ANY(%s)", (owners,))
+        stale_relations = {row[0] for row in cursor.fetchall()} - {r[0] for r in relations}
+
+        paths = [file_id[len(FILE_NODE_PREFIX):] for file_id in owners]
+        cursor.execute("""
+            SELECT id FROM memory_nodes
+            WHERE type = %s AND properties->>'project' || '/' || (properties->>'file') = ANY(%s)
+        """, (SYMBOL_NODE, paths))
+        stale_symbols = {row[0] for row in cursor.fetchall()} - {n[0] for n in nodes}
+
+        unique_nodes = list({n[0]: n for n in nodes}.values())
+        if unique_nodes:
+            execute_values(cursor, """
+                INSERT INTO memory_nodes (id, name, type, properties, created_at, updated_at)
+                VALUES %s
+                ON CONFLICT (id) DO UPDATE SET
+                    name = EXCLUDED.name,
+                    type = EXCLUDED.type,
+                    properties = EXCLUDED.properties,
+                    updated_at = now()
+                WHERE (memory_nodes.name, memory_nodes.type, memory_nodes.properties)
+                      IS DISTINCT FROM (EXCLUDED.name, EXCLUDED.type, EXCLUDED.properties)
+            """, [(n[0], n[1], n[2], json.dumps(n[3])) for n in unique_nodes],
+                template="(%s, %s, %s, %s::jsonb, now(), now())", page_size=UPSERT_PAGE_SIZE)
+        stats["nodes"] = len(unique_nodes)
+
+        if stale_relations:
+            cursor.execute("DELETE FROM memory_relations WHERE id = ANY(%s)", (list(stale_relations),))
+        if stale_symbols or removed:
+            cursor.execute("DELETE FROM memory_nodes WHERE id = ANY(%s)", (list(stale_symbols) + removed,))
+        stats["stale_relations"] = len(stale_relations)
+        stats["stale_symbols"] = len(stale_symbols)
+
+        if relations:
+            # Existing ids keep their created_at, so refresh() doesn't re-add them
+            execute_values(cursor, """
+                INSERT INTO memory_relations (id, source, relationship, target, context, confidence, created_at)
+                VALUES %s
+                ON CONFLICT (id) DO NOTHING
+            """, relations, template="(%s, %s, %s, %s, %s, 1.0, now())", page_size=UPSERT_PAGE_SIZE)
+        stats["relations"] = len(relations)
+
+        # Whatever still points at a deleted symbol or file (a call resolved
+        # to a name the other file no longer exports) would dangle
+        gone = list(stale_symbols) + removed
+        if gone:
+            cursor.execute("DELETE FROM memory_relations WHERE target = ANY(%s)", (gone,))
+            stats["stale_relations"] += cursor.rowcount
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return stats
+
+# ---------------------------------------------------------
+# PIPELINE
+# ---------------------------------------------------------
+def extract_graph(files_map: List[Dict[str, Any]], stored: Dict[str, str],
+                  workers: Optional[int] = None,
+                  dependents: Optional[Callable[[List[str]], Set[str]]] = None) -> Dict[str, Any]:
+    """
+    Parses the changed files in parallel and resolves them into nodes and
+    relations. `stored` maps file node ids to their last extracted hash.
+    `dependents` (dependent_files) names the unchanged files that depend on
+    the changed or removed ones; they are parsed again too, so no relation
+    keeps pointing at a symbol or file that is gone. (An import that only
+    resolves because a new file appeared is picked up by --full.)
+    """
+    items = [item for item in files_map if item["ext"] in PARSE_EXTENSIONS]
+    known_by_project: Dict[str, Set[str]] = {}
+    for item in files_map:
+        known_by_project.setdefault(item["project"], set()).add(item["rel_path"])
+
+    tasks = [(item, stored.get(file_node_id(item["project"], item["rel_path"]))) for item in items]
+    nodes: List[Tuple] = []
+    relations: List[Tuple] = []
+    touched: List[str] = []
+    unchanged = 0
+    current = {file_node_id(item["project"], item["rel_path"]) for item in items}
+    removed = sorted(set(stored) - current)
+
+    def parse(tasks) -> int:
+        skipped = 0
+        for facts in pool.map(extract_file, tasks, chunksize=WORKER_CHUNKSIZE):
+            if facts is None:
+                continue
+            if facts.get("unchanged"):
+                skipped += 1
+                continue
+            file_nodes, file_relations = build_file_graph(facts, known_by_project[facts["project"]])
+            nodes.extend(file_nodes)
+            relations.extend(file_relations)
+            touched.append(file_node_id(facts["project"], facts["path"]))
+        return skipped
+
+    redone = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        unchanged = parse(tasks)
+        if dependents and (touched or removed):
+            again = (dependents(touched + removed) & current) - set(touched)
+            redone = len(again)
+            unchanged -= redone
+            parse([(item, None) for item in items if file_node_id(item["project"], item["rel_path"]) in again])
+
+    return {"nodes": nodes, "relations": relations, "touched": touched, "removed": removed,
+            "unchanged": unchanged, "dependents": redone, "files": len(items)}
+
+def main():
+    print("="*60)
+    print("🕸️ CODE GRAPH EXTRACTION (IMPORTS / EXPORTS / CALLS)")
+    print("="*60)
+
+    args = sys.argv[1:]
+    dry_run = "--dry-run" in args
+    full = "--full" in args
+    workers = next((int(a.split("=", 1)[1]) for a in args if a.startswith("--workers=")), None)
+
+    if not os.path.exists(INPUT_FILE):
+        print(f"❌ Map not found: {INPUT_FILE} (run scan_codebase.py first)")
+        return
+    with open(INPUT_FILE, "r", encoding="utf-8") as f:
+        files_map = json.load(f)
+    projects = sorted({item["project"] for item in files_map})
+
+    conn = None
+    stored: Dict[str, str] = {}
+    if not dry_run:
+        from db import connect_db
+        conn = connect_db()
+        if not conn:
+            sys.exit(1)
+        if not full:
+            stored = stored_file_hashes(conn.cursor(), projects)
+            conn.rollback()
+
+    try:
+        start = time.time()
+        dependents = None
+        if stored:
+            def dependents(file_ids):
+                found = dependent_files(conn.cursor(), file_ids)
+                conn.rollback()
+                return found
+        result = extract_graph(files_map, stored, workers, dependents)
+        print(f"📂 {result['files']} files: {len(result['touched'])} parsed "
+              f"({result['dependents']} for changed dependencies), "
+              f"{result['unchanged']} unchanged, {len(result['removed'])} removed "
+              f"({time.time() - start:.2f}s)")
+        print(f"   -> {len(result['nodes'])} nodes / {len(result['relations'])} relations")
+
+        if dry_run:
+            by_type = Counter(r[2] for r in result["relations"])
+            for relationship, count in by_type.most_common():
+                print(f"   {relationship}: {count}")
+            return
+
+        start = time.time()
+        stats = write_graph(conn, result["nodes"], result["relations"], result["touched"], result["removed"])
+        print(f"💾 {stats['nodes']} nodes, {stats['relations']} relations upserted; "
+              f"{stats['stale_relations']} stale relations and {stats['stale_symbols']} symbols removed "
+              f"({time.time() - start:.2f}s)")
+    finally:
+        if conn:
+            conn.close()
+
+if __name__ == "__main__":
+    from profiling import run_main  # --profile
+    run_main("code_graph", main)
@@ -0,0 +1,302 @@
+"""
+🥶 COLD-START PROFILER
+
+Forces a fresh instance on every run and times the first request,
+splitting it into client-side phases (DNS, TCP, TLS, time to first
+byte) and the server-side phases /api/health reports (process boot,
+route load, DB connect, DB query). Many runs give a distribution
+instead of one lucky number.
+
+    python cold_start.py cloudrun --runs=10 [--service=lavaseco-app] [--region=us-central1]
+    python cold_start.py docker --runs=20 [--image=lavaseco-app] [--build] [--env-file=.env]
+"""
+
+import json
+import socket
+import ssl
+import subprocess
+import sys
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+# Configuration (same service as deploy.sh)
+SERVICE_NAME = "lavaseco-app"
+REGION = "us-central1"
+LOCAL_IMAGE = "lavaseco-app"
+CONTAINER_PORT = 8080
+HEALTH_PATH = "/api/health"
+READY_TIMEOUT = 120.0       # seconds to wait for a local container to answer
+POLL_INTERVAL = 0.05
+REQUEST_TIMEOUT = 60.0
+RESULTS_FILE = "cold_start_results.json"
+
+# ---------------------------------------------------------
+# TIMED REQUEST
+# ---------------------------------------------------------
+def _decode_chunked(body: bytes) -> bytes:
+    out = bytearray()
+    while body:
+        size_line, _, body = body.partition(b"\r\n")
+        size = int(size_line.split(b";")[0].strip() or b"0", 16)
+        if size == 0:
+            break
+        out += body[:size]
+        body = body[size + 2:]
+    return bytes(out)
+
+def timed_request(url: str, timeout: float = REQUEST_TIMEOUT) -> Dict[str, Any]:
+    """
+    One GET on a fresh connection with every client-side phase timed:
+    dns_ms, connect_ms, tls_ms, ttfb_ms (request sent -> first byte) and
+    total_ms. Returns the status and the decoded JSON body, if any.
+    """
+    parts = urlsplit(url)
+    https = parts.scheme == "https"
+    port = parts.port or (443 if https else 80)
+    path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+    timings: Dict[str, Any] = {}
+
+    start = time.perf_counter()
+    family, socktype, proto, _, address = socket.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)[0]
+    resolved = time.perf_counter()
+    timings["dns_ms"] = (resolved - start) * 1000
+
+    sock = socket.socket(family, socktype, proto)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(address)
+        connected = time.perf_counter()
+        timings["connect_ms"] = (connected - resolved) * 1000
+        if https:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=parts.hostname)
+        handshaken = time.perf_counter()
+        timings["tls_ms"] = (handshaken - connected) * 1000
+
+        sock.sendall((f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+                      "Accept: application/json\r\nConnection: close\r\n\r\n").encode("latin-1"))
+        first = sock.recv(1)
+        timings["ttfb_ms"] = (time.perf_counter() - handshaken) * 1000
+        head, body, headers = _read_response(sock, bytearray(first))
+        timings["total_ms"] = (time.perf_counter() - start) * 1000
+    finally:
+        sock.close()
+
+    lines = head.split("\r\n")
+    timings["status"] = int(lines[0].split()[1]) if lines and len(lines[0].split()) > 1 else 0
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        body = _decode_chunked(body)
+    try:
+        timings["body"] = json.loads(body) if body else None
+    except ValueError:
+        timings["body"] = None
+    return timings
+
+def _read_response(sock, data: bytearray):
+    """Reads one response: up to Content-Length, the last chunk, or EOF."""
+    headers: Dict[str, str] = {}
+    head = None
+    while True:
+        if head is None and b"\r\n\r\n" in data:
+            raw, _, rest = bytes(data).partition(b"\r\n\r\n")
+            head = raw.decode("latin-1")
+            headers = {k.strip().lower(): v.strip() for k, _, v in
+                       (line.partition(":") for line in head.split("\r\n")[1:])}
+            data = bytearray(rest)
+        if head is not None:
+            if "content-length" in headers and len(data) >= int(headers["content-length"]):
+                break
+            if "chunked" in headers.get("transfer-encoding", "").lower() and data.endswith(b"0\r\n\r\n"):
+                break
+        block = sock.recv(65536)
+        if not block:
+            break
+        data += block
+    return head or "", bytes(data), headers
+
+def run_record(timings: Dict[str, Any], **extra) -> Dict[str, Any]:
+    """Flattens client timings and the server's phases into one record."""
+    body = timings.get("body") or {}
+    record = {k: v for k, v in timings.items() if k != "body"}
+    record.update(extra)
+    instance = body.get("instance") or {}
+    record["cold"] = instance.get("cold")
+    record["instance"] = instance.get("id")
+    for phase, value in (body.get("phases") or {}).items():
+        record[f"server_{phase}"] = value
+    return record
+
+# ---------------------------------------------------------
+# CLOUD RUN: a new revision per run
+# ---------------------------------------------------------
+def gcloud(*args: str) -> str:
+    # shell=True so gcloud.cmd resolves on Windows
+    command = "gcloud " + " ".join(args)
+    result = subprocess.run(command, shell=True, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{command} failed: {result.stderr.strip()}")
+    return result.stdout.strip()
+
+def cloud_run_cold_start(service: str, region: str) -> Dict[str, Any]:
+    """
+    Rolling an env var creates a new revision with no instances, so the
+    next request is guaranteed to start one (with min-instances=0).
+    """
+    start = time.perf_counter()
+    gcloud("run", "services", "update", service, f"--region={region}",
+           f"--update-env-vars=COLD_START_NONCE={uuid.uuid4().hex}", "--quiet")
+    deploy_s = time.perf_counter() - start
+    url = gcloud("run", "services", "describe", service, f"--region={region}", '--format="value(status.url)"')
+    return run_record(timed_request(url + HEALTH_PATH), deploy_s=deploy_s)
+
+def cloud_run_min_instances(service: str, region: str) -> Optional[str]:
+    try:
+        return gcloud("run", "services", "describe", service, f"--region={region}",
+                      '--format="value(spec.template.metadata.annotations.\'autoscaling.knative.dev/minScale\')"') or "0"
+    except RuntimeError:
+        return None
+
+# ---------------------------------------------------------
+# DOCKER: a fresh local container per run
+# ---------------------------------------------------------
+def docker(*args: str) -> str:
+    result = subprocess.run(["docker", *args], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"docker {' '.join(args[:2])} failed: {result.stderr.strip()}")
+    return result.stdout.strip()
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def docker_cold_start(image: str, env_file: Optional[str] = None) -> Dict[str, Any]:
+    """
+    container_start_ms: `docker run` until the container is running;
+    ready_ms: `docker run` until the first successful /api/health, which
+    is what a user behind a cold instance waits for.
+    """
+    port = free_port()
+    args = ["run", "-d", "--rm", "-p", f"127.0.0.1:{port}:{CONTAINER_PORT}"]
+    if env_file:
+        args += ["--env-file", env_file]
+
+    start = time.perf_counter()
+    container = docker(*args, image)
+    started = time.perf_counter()
+    try:
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                timings = timed_request(f"http://127.0.0.1:{port}{HEALTH_PATH}", timeout=READY_TIMEOUT)
+                if timings["status"]:
+                    break
+            except OSError:
+                pass
+            if time.perf_counter() - start > READY_TIMEOUT:
+                raise RuntimeError(f"container not ready after {READY_TIMEOUT:.0f}s")
+            time.sleep(POLL_INTERVAL)
+        ready = time.perf_counter()
+        return run_record(timings, container_start_ms=(started - start) * 1000,
+                          ready_ms=(ready - start) * 1000, attempts=attempts)
+    finally:
+        subprocess.run(["docker", "rm", "-f", container], capture_output=True)
+
+def docker_image_size_mb(image: str) -> Optional[float]:
+    try:
+        return int(docker("image", "inspect", image, "--format", "{{.Size}}")) / 1e6
+    except (RuntimeError, ValueError):
+        return None
+
+# ---------------------------------------------------------
+# DISTRIBUTION
+# ---------------------------------------------------------
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile; exact for the small samples cold starts give."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    metrics = sorted({k for r in runs for k, v in r.items()
+                      if isinstance(v, (int, float)) and not isinstance(v, bool) and k != "status"})
+    summary = {}
+    for metric in metrics:
+        values = [r[metric] for r in runs if isinstance(r.get(metric), (int, float))]
+        if values:
+            summary[metric] = {
+                "n": len(values), "min": min(values), "p50": percentile(values, 50),
+                "p90": percentile(values, 90), "p95": percentile(values, 95),
+                "max": max(values), "mean": sum(values) / len(values)
+            }
+    return summary
+
+def print_summary(summary: Dict[str, Dict[str, float]]):
+    print(f"\n   {'phase':<28} {'n':>3} {'min':>9} {'p50':>9} {'p90':>9} {'p95':>9} {'max':>9}")
+    for metric, s in summary.items():
+        print(f"   {metric:<28} {s['n']:>3} " +
+              " ".join(f"{s[k]:>9.1f}" for k in ("min", "p50", "p90", "p95", "max")))
+
+def main():
+    print("="*60)
+    print("🥶 COLD-START PROFILER")
+    print("="*60)
+
+    args = sys.argv[1:]
+    options = {a.split("=", 1)[0]: a.split("=", 1)[1] if "=" in a else True
+               for a in args if a.startswith("--")}
+    mode = next((a for a in args if not a.startswith("--")), None)
+    runs = int(options.get("--runs", 10))
+    if mode not in ("cloudrun", "docker"):
+        print(__doc__)
+        return
+
+    results: List[Dict[str, Any]] = []
+    meta: Dict[str, Any] = {"mode": mode, "runs": runs}
+    if mode == "cloudrun":
+        service = options.get("--service", SERVICE_NAME)
+        region = options.get("--region", REGION)
+        meta.update(service=service, region=region, min_instances=cloud_run_min_instances(service, region))
+        measure = lambda: cloud_run_cold_start(service, region)
+    else:
+        image = options.get("--image", LOCAL_IMAGE)
+        if options.get("--build"):
+            print(f"🐳 Building {image}...")
+            start = time.perf_counter()
+            subprocess.run(["docker", "build", "-t", image, "."], check=True)
+            meta["build_s"] = time.perf_counter() - start
+        meta.update(image=image, image_size_mb=docker_image_size_mb(image))
+        env_file = options.get("--env-file")
+        measure = lambda: docker_cold_start(image, env_file)
+
+    for i in range(runs):
+        try:
+            record = measure()
+        except Exception as e:
+            print(f"   [{i + 1}/{runs}] ❌ {e}")
+            results.append({"error": str(e)})
+            continue
+        results.append(record)
+        headline = record.get("ready_ms", record.get("total_ms"))
+        cold = {True: "cold", False: "⚠️ warm", None: "?"}[record.get("cold")]
+        print(f"   [{i + 1}/{runs}] {headline:.0f}ms ({cold}, status {record.get('status')})")
+
+    ok = [r for r in results if "error" not in r]
+    summary = summarize(ok)
+    if summary:
+        print_summary(summary)
+    warm = sum(1 for r in ok if r.get("cold") is False)
+    if warm:
+        print(f"\n   ⚠️ {warm} run(s) reached an already-warm instance (min-instances > 0?)")
+    for key in ("image_size_mb", "min_instances"):
+        if meta.get(key) is not None:
+            print(f"   {key}: {meta[key]}")
+
+    with open(RESULTS_FILE, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "summary": summary, "runs": results}, f, indent=2)
+    print(f"\n💾 Results saved to {RESULTS_FILE}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+from typing import Any, Dict, List, Optional
+
+# ~4 characters per token, the same ratio TARGET_CHUNK_SIZE assumes
+CHARS_PER_TOKEN = 4
+DEFAULT_TOKEN_BUDGET = 6000
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def hit_score(hit: Dict[str, Any]) -> float:
+    for field in ("graph_score", "rrf_score", "similarity", "bm25"):
+        if hit.get(field) is not None:
+            return hit[field]
+    return 0.0
+
+def _merge_ranges(chunks: Dict[int, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Joins consecutive chunk indexes of one file into ranges."""
+    ranges = []
+    for index in sorted(chunks):
+        chunk = chunks[index]
+        if index >= 0 and ranges and ranges[-1]["start"] >= 0 and ranges[-1]["end"] == index - 1:
+            current = ranges[-1]
+            current["end"] = index
+            current["parts"].append(chunk["content"])
+            current["score"] = max(current["score"], chunk["score"])
+        else:
+            ranges.append({"start": index, "end": index, "parts": [chunk["content"]], "score": chunk["score"]})
+
+    for r in ranges:
+        r["content"] = "\n".join(r.pop("parts"))
+        r["tokens"] = estimate_tokens(r["content"])
+    return ranges
+
+def assemble_context(hits: List[Dict[str, Any]], token_budget: int = DEFAULT_TOKEN_BUDGET,
+                     max_files: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Turns ranked chunk hits into file-level hits in a single pass:
+    hits are grouped by (project, file_path), duplicate chunks are dropped,
+    consecutive chunk indexes are merged into ranges, and files are packed
+    best-first until `token_budget` is spent. No extra queries are made;
+    only the chunks that were retrieved end up in the pack.
+    """
+    files: Dict[Any, Dict[str, Any]] = {}
+    for hit in hits:
+        key = (hit["project"], hit["file_path"])
+        entry = files.get(key)
+        if entry is None:
+            entry = files[key] = {
+                "project": hit["project"],
+                "file_path": hit["file_path"],
+                "score": hit_score(hit),
+                "total_chunks": hit.get("total_chunks"),
+                "chunks": {},
+                "seen_content": set()
+            }
+
+        # Chunks without an index (older rows) are de-duplicated by content
+        content = hit["content"]
+        if content in entry["seen_content"]:
+            continue
+        entry["seen_content"].add(content)
+
+        index = hit.get("chunk_index")
+        if index is None:
+            index = -1 - len(entry["chunks"])
+        if index not in entry["chunks"]:
+            entry["chunks"][index] = {"content": content, "score": hit_score(hit)}
+        if entry["total_chunks"] is None:
+            entry["total_chunks"] = hit.get("total_chunks")
+
+    ordered = list(files.values())  # insertion order is rank order
+    if max_files is not None:
+        ordered = ordered[:max_files]
+
+    pack_files = []
+    used = 0
+    truncated = False
+    for entry in ordered:
+        ranges = _merge_ranges(entry["chunks"])
+        ranges.sort(key=lambda r: r["score"], reverse=True)
+
+        kept = []
+        for r in ranges:
+            remaining = token_budget - used
+            if remaining <= 0:
+                truncated = True
+                break
+            if r["tokens"] > remaining:
+                r["content"] = r["content"][:remaining * CHARS_PER_TOKEN]
+                r["tokens"] = remaining
+                r["truncated"] = True
+                truncated = True
+            kept.append(r)
+            used += r["tokens"]
+
+        if not kept:
+            break
+
+        kept.sort(key=lambda r: r["start"])
+        total = entry["total_chunks"]
+        covered = sum(r["end"] - r["start"] + 1 for r in kept if r["start"] >= 0)
+        pack_files.append({
+            "project": entry["project"],
+            "file_path": entry["file_path"],
+            "score": entry["score"],
+            "total_chunks": total,
+            "complete": bool(total) and covered == total and not any(r.get("truncated") for r in kept),
+            "ranges": kept
+        })
+
+    return {"files": pack_files, "tokens": used, "budget": token_budget, "truncated": truncated}
+
+def describe_range(r: Dict[str, Any], total_chunks: Optional[int]) -> str:
+    if r["start"] < 0:
+        return "chunk"
+    span = f"chunk {r['start']}" if r["start"] == r["end"] else f"chunks {r['start']}-{r['end']}"
+    return f"{span} of {total_chunks}" if total_chunks else span
+
+def render_context(pack: Dict[str, Any]) -> str:
+    """Formats a pack as one prompt-ready text block."""
+    blocks = []
+    for f in pack["files"]:
+        header = f"### [{f['project']}] {f['file_path']}"
+        if f["complete"]:
+            header += " (complete)"
+        blocks.append(header)
+        for r in f["ranges"]:
+            blocks.append(f"--- {describe_range(r, f['total_chunks'])}")
+            blocks.append(r["content"])
+    return "\n".join(blocks)
@@ -1,24 +1,4 @@
-import os
-import psycopg2
-
-# Configuration from .env
-ENV_PATH = r'c:\Users\rmend\Desktop\LAVASECO ORQUIDEAS\lavaseco-app\.env'
-
-def load_env(path: str):
-    env = {}
-    if os.path.exists(path):
-        with open(path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                if '=' in line:
-                    k, v = line.split('=', 1)
-                    env[k.strip()] = v.strip().strip('"').strip("'")
-    return env
-
-config = load_env(ENV_PATH)
-DB_URL = config.get('DATABASE_URL')
+from db import connect_db
 
 def main():
     print("="*60)
@@ -26,44 +6,129 @@ def main():
     print("="*60)
     
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = connect_db()
+        if conn is None:
+            return
         cursor = conn.cursor()
         
-        print("⚡ Creating function 'match_codebase'...")
+        print("⚡ Creating functions 'match_codebase_sql' and 'match_codebase'...")
         # Use existing SQL
+        # Older signatures would otherwise stay as ambiguous overloads
+        cursor.execute("""
+            -- Drops every existing overload: the argument list and the result
+            -- columns have changed over time and "create or replace" cannot do either.
+            do $$
+            declare
+              fn regprocedure;
+            begin
+              for fn in select oid::regprocedure from pg_proc where proname in ('match_codebase', 'match_codebase_sql') loop
+                execute 'drop function ' || fn;
+              end loop;
+            end;
+            $$;
+        """)
+
         func_sql = """
+            -- Builds the statement match_codebase executes. Kept separate so
+            -- check_index_usage.py can EXPLAIN exactly the same SQL.
+            create or replace function match_codebase_sql (
+              filter_project text default null,
+              filter_path text default null,
+              filter_extension text default null,
+              filter_type text default null,
+              vector_column text default 'embedding'  -- another model's column (embedding_versions.py)
+            )
+            returns text
+            language plpgsql
+            immutable
+            as $$
+            declare
+              vec text := 'e.' || quote_ident(vector_column);
+              predicates text := vec || ' is not null';
+            begin
+              -- Only the active filters are added to the statement, so each one is a
+              -- plain indexable predicate instead of an "(param is null or ...)" branch.
+              if filter_project is not null then
+                predicates := predicates || ' and e.project = $2';
+              end if;
+              if filter_path is not null then
+                predicates := predicates || ' and e.file_path like $3';
+              end if;
+              if filter_extension is not null then
+                predicates := predicates || ' and e.file_ext = $4';
+              end if;
+              if filter_type is not null then
+                predicates := predicates || ' and e.metadata->>''type'' = $5';
+              end if;
+
+              -- The inner query is a bare "order by distance limit n", which the ANN
+              -- index serves directly; the similarity threshold is applied afterwards
+              -- to those n candidates only, instead of computing it for every row.
+              return
+                'select top.id, top.project, top.file_path, top.content, top.metadata, top.similarity
+                 from (
+                   select e.id, e.project, e.file_path, e.content, e.metadata,
+                          1 - (' || vec || ' <=> $1) as similarity
+                   from codebase_embeddings e
+                   where ' || predicates || '
+                   order by ' || vec || ' <=> $1
+                   limit $7
+                 ) top
+                 where top.similarity > $6
+                 order by top.similarity desc';
+            end;
+            $$;
+
             create or replace function match_codebase (
-              query_embedding vector(768),
+              query_embedding vector,              -- any dimensions: each model version has its own
               match_threshold float,
-              match_count int
+              match_count int,
+              filter_project text default null,    -- e.g. 'hydra-web'
+              filter_path text default null,       -- LIKE pattern, e.g. 'src/lib/billing/%'
+              filter_extension text default null,  -- e.g. '.ts'
+              filter_type text default null,       -- metadata->>'type', e.g. 'conversation_memory'
+              probes int default 10,               -- ivfflat lists visited (recall vs. speed)
+              ef_search int default 40,            -- hnsw candidate list size, if an hnsw index is used
+              query_model text default null        -- model that embedded the query; null = the `embedding` column
             )
             returns table (
               id bigint,
               project text,
               file_path text,
               content text,
+              metadata jsonb,
               similarity float
             )
             language plpgsql
             as $$
+            declare
+              vector_column text := 'embedding';
             begin
-              return query
-              select
-                codebase_embeddings.id,
-                codebase_embeddings.project,
-                codebase_embeddings.file_path,
-                codebase_embeddings.content,
-                1 - (codebase_embeddings.embedding <=> query_embedding) as similarity
-              from codebase_embeddings
-              where 1 - (codebase_embeddings.embedding <=> query_embedding) > match_threshold
-              order by codebase_embeddings.embedding <=> query_embedding
-              limit match_count;
+              -- Transaction-local, so each call can pick its own recall/latency trade-off
+              perform set_config('ivfflat.probes', probes::text, true);
+              perform set_config('hnsw.ef_search', ef_search::text, true);
+
+              if query_model is not null and to_regclass('embedding_versions') is not null then
+                -- Locks the table before the lookup: a flip renames the columns, and
+                -- has to wait until this search is done with the one it looked up.
+                perform 1 from codebase_embeddings where false;
+                select v.column_name into vector_column
+                from embedding_versions v
+                where v.model = query_model and v.status <> 'dropped';
+                if not found then
+                  raise exception 'No queryable vectors for embedding model %', query_model;
+                end if;
+              end if;
+
+              return query execute match_codebase_sql(filter_project, filter_path, filter_extension, filter_type, vector_column)
+              using query_embedding, filter_project, filter_path, lower(filter_extension), filter_type,
+                    match_threshold, match_count;
             end;
             $$;
         """
         cursor.execute(func_sql)
         conn.commit()
-        print("✅ Function created successfully.")
+        print("✅ Functions created successfully.")
         
     except Exception as e:
         print(f"❌ Error creating function: {e}")
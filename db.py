@@ -0,0 +1,260 @@
+"""
+Shared settings (environment, then .env) and the process-wide connection pool:
+
+    conn = connect_db()          # pooled, health-checked, with a statement timeout
+    ...
+    conn.close()                 # back to the pool
+"""
+
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+try:
+    import psycopg2
+    import psycopg2.extensions
+    import psycopg2.pool
+    HAS_PSYCOPG2 = True
+except ImportError:
+    HAS_PSYCOPG2 = False
+    print("⚠️ psycopg2 not found. Install it for faster direct DB access: pip install psycopg2-binary")
+
+# Configuration
+ENV_PATH = os.environ.get("LAVASECO_ENV_FILE") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+
+def load_env(path: str) -> Dict[str, str]:
+    env = {}
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                if '=' in line:
+                    k, v = line.split('=', 1)
+                    env[k.strip()] = v.strip().strip('"').strip("'")
+    return env
+
+config = load_env(ENV_PATH)
+
+def setting(name: str, default: Optional[str] = None) -> Optional[str]:
+    """The environment variable if set, else the .env value, else default."""
+    return os.environ.get(name) or config.get(name) or default
+
+DB_URL = setting("DATABASE_URL")
+POOL_MIN = int(setting("DB_POOL_MIN", "1"))
+POOL_MAX = int(setting("DB_POOL_MAX", "8"))
+POOL_WAIT_S = float(setting("DB_POOL_WAIT_S", "30"))            # checkout blocks this long when all are in use
+STATEMENT_TIMEOUT_MS = int(setting("DB_STATEMENT_TIMEOUT_MS", "60000"))  # 0 disables it
+HEALTH_CHECK_IDLE_S = float(setting("DB_HEALTH_CHECK_IDLE_S", "30"))     # ping connections idle longer than this
+FETCH_SIZE = int(setting("DB_FETCH_SIZE", "2000"))      # rows per round trip of a server-side cursor
+# PgBouncer / Supavisor in transaction mode (port 6543) cannot keep
+# session-level prepared statements; set DB_PREPARED_STATEMENTS=0 there.
+PREPARED_STATEMENTS = setting("DB_PREPARED_STATEMENTS", "1") not in ("0", "false", "no")
+
+# ---------------------------------------------------------
+# POOL
+# ---------------------------------------------------------
+if HAS_PSYCOPG2:
+    class PooledConnection(psycopg2.extensions.connection):
+        """A psycopg2 connection that remembers its pool and its prepared statements."""
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.owner: Optional["ConnectionPool"] = None   # set while checked out
+            self.prepared = set()
+            self.last_used = time.monotonic()
+            self.configured = False
+
+        def close(self):
+            """Returns the connection to its pool; closes it when it has none."""
+            owner, self.owner = self.owner, None
+            if owner is not None:
+                owner.release(self)
+            else:
+                super().close()
+
+class ConnectionPool:
+    """
+    psycopg2's ThreadedConnectionPool plus what it leaves out: checkout
+    waits for a free connection instead of failing, dead connections are
+    replaced, and each new connection gets the session settings.
+    """
+
+    def __init__(self, dsn: str, minconn: int = POOL_MIN, maxconn: int = POOL_MAX):
+        self.maxconn = maxconn
+        self.slots = threading.BoundedSemaphore(maxconn)
+        self.pool = psycopg2.pool.ThreadedConnectionPool(minconn, maxconn, dsn,
+                                                         connection_factory=PooledConnection)
+        self.lock = threading.Lock()
+        self.in_use = 0
+        self.replaced = 0
+
+    def checkout(self) -> "PooledConnection":
+        if not self.slots.acquire(timeout=POOL_WAIT_S):
+            raise psycopg2.pool.PoolError(f"No free connection after {POOL_WAIT_S:.0f}s ({self.maxconn} in use)")
+        try:
+            conn = self._healthy_connection()
+        except Exception:
+            self.slots.release()
+            raise
+        conn.owner = self
+        with self.lock:
+            self.in_use += 1
+        return conn
+
+    def _healthy_connection(self) -> "PooledConnection":
+        # One replacement per slot at most: after that the server itself is down
+        for _ in range(self.maxconn + 1):
+            conn = self.pool.getconn()
+            if not conn.closed and (time.monotonic() - conn.last_used < HEALTH_CHECK_IDLE_S or ping(conn)):
+                if not conn.configured:
+                    configure(conn)
+                return conn
+            self.pool.putconn(conn, close=True)
+            with self.lock:
+                self.replaced += 1
+        raise psycopg2.OperationalError("Could not get a working database connection")
+
+    def release(self, conn: "PooledConnection"):
+        """Ends any open transaction so the next user starts clean."""
+        conn.last_used = time.monotonic()
+        broken = bool(conn.closed)
+        if not broken and conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        self.pool.putconn(conn, close=broken)
+        with self.lock:
+            self.in_use -= 1
+        self.slots.release()
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {"in_use": self.in_use, "max": self.maxconn, "replaced": self.replaced}
+
+    def close(self):
+        self.pool.closeall()
+
+_POOL: Optional[ConnectionPool] = None
+_POOL_LOCK = threading.Lock()
+
+def configure(conn):
+    """Session settings, applied once per physical connection."""
+    if STATEMENT_TIMEOUT_MS:
+        cursor = conn.cursor()
+        cursor.execute("SET statement_timeout = %s;", (STATEMENT_TIMEOUT_MS,))
+        cursor.close()
+        conn.commit()
+    conn.configured = True
+
+def ping(conn) -> bool:
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1;")
+        cursor.close()
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def get_pool() -> ConnectionPool:
+    """The process-wide pool, opened on first use."""
+    global _POOL
+    if not HAS_PSYCOPG2:
+        raise RuntimeError("psycopg2 is not installed")
+    if not DB_URL:
+        raise RuntimeError(f"DATABASE_URL is not set (environment or {ENV_PATH})")
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ConnectionPool(DB_URL)
+        return _POOL
+
+def connect_db():
+    """A pooled connection, or None (with the reason printed) if the DB is unreachable."""
+    if not HAS_PSYCOPG2:
+        return None
+    try:
+        return get_pool().checkout()
+    except Exception as e:
+        print(f"❌ DB Connection failed: {e}")
+        return None
+
+def close_pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.close()
+            _POOL = None
+
+def health_check() -> Dict[str, Any]:
+    """Round trip through a pooled connection, for /health and the CLI tools."""
+    start = time.perf_counter()
+    try:
+        pool = get_pool()
+        conn = pool.checkout()
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+    try:
+        ok = ping(conn)
+        return {"ok": ok, "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+                "server_version": conn.server_version, **pool.stats()}
+    finally:
+        conn.close()
+
+# ---------------------------------------------------------
+# STREAMING READS
+# ---------------------------------------------------------
+def stream_batches(conn, query: str, params: Optional[Sequence[Any]] = None, name: str = "stream",
+                   fetch_size: int = FETCH_SIZE) -> Iterator[List[tuple]]:
+    """
+    The rows of `query` in lists of up to fetch_size, read through a named
+    (server-side) cursor: the result set stays in Postgres and only one
+    batch is in client memory at a time. The connection must stay in its
+    transaction until the generator is exhausted or closed.
+    """
+    cursor = conn.cursor(name=name)
+    cursor.itersize = fetch_size
+    try:
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                return
+            yield rows
+    finally:
+        cursor.close()
+
+def stream(conn, query: str, params: Optional[Sequence[Any]] = None, name: str = "stream",
+           fetch_size: int = FETCH_SIZE) -> Iterator[tuple]:
+    """Row by row over stream_batches()."""
+    for rows in stream_batches(conn, query, params, name, fetch_size):
+        yield from rows
+
+# ---------------------------------------------------------
+# PREPARED STATEMENTS
+# ---------------------------------------------------------
+_PARAM = re.compile(r"\$(\d+)")
+
+def execute_prepared(cursor, name: str, sql: str, params: Sequence[Any]):
+    """
+    Runs `sql` (written with $1, $2, ... placeholders) as the prepared
+    statement `name`, preparing it on first use on each connection, so
+    repeated queries skip parsing and planning. Falls back to a plain
+    execute when prepared statements are off or the connection is not
+    from the pool.
+    """
+    conn = cursor.connection
+    if not (PREPARED_STATEMENTS and hasattr(conn, "prepared")):
+        # Same statement with psycopg2 placeholders; %(pN)s allows reusing $N
+        plain = _PARAM.sub(r"%(p\1)s", sql.replace("%", "%%"))
+        cursor.execute(plain, {f"p{i}": value for i, value in enumerate(params, 1)})
+        return
+    if name not in conn.prepared:
+        cursor.execute(f"PREPARE {name} AS {sql}")
+        conn.prepared.add(name)
+    placeholders = ", ".join(["%s"] * len(params))
+    cursor.execute(f"EXECUTE {name} ({placeholders})" if params else f"EXECUTE {name}", params)
@@ -0,0 +1,198 @@
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from generate_embeddings import (
+    recursive_split_text, TARGET_CHUNK_SIZE, MODEL_NAME, EMBEDDING_DIMENSIONS, INPUT_FILE, WORKLIST_FILE
+)
+from lexical_index import chunk_doc_id
+from upload_embeddings import content_hash
+
+# Configuration
+FETCH_SIZE = 10000        # rows per round trip of the server-side cursor
+WORKER_CHUNKSIZE = 16
+
+# ---------------------------------------------------------
+# DISK SIDE (worker processes)
+# ---------------------------------------------------------
+def hash_file_chunks(item: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Tuple[str, str]]]:
+    """Chunks a file exactly as generate_embeddings does and hashes every chunk."""
+    try:
+        with open(item["full_path"], "r", encoding="utf-8", errors="ignore") as f:
+            content = f.read()
+    except OSError:
+        return item, []
+    if not content.strip():
+        return item, []
+    chunks = recursive_split_text(content, TARGET_CHUNK_SIZE)
+    return item, [(chunk_doc_id(item["project"], item["rel_path"], i), content_hash(chunk))
+                  for i, chunk in enumerate(chunks)]
+
+# ---------------------------------------------------------
+# DATABASE SIDE
+# ---------------------------------------------------------
+def stream_stored_chunks(conn, projects: List[str]):
+    """
+    Streams one small row per chunk through a server-side cursor. Norms
+    and dimensions are computed in Postgres, so no vector leaves the
+    database.
+    """
+    from db import stream
+    return stream(conn, """
+        SELECT chunk_key, content_hash, metadata->>'model',
+               vector_dims(embedding), vector_norm(embedding)
+        FROM codebase_embeddings
+        WHERE project = ANY(%s)
+    """, (projects,), name="drift_check", fetch_size=FETCH_SIZE)
+
+def vector_problem(dims: Optional[int], norm: Optional[float],
+                   expected_dims: int = EMBEDDING_DIMENSIONS) -> Optional[str]:
+    if dims is None:
+        return "missing_vector"
+    if dims != expected_dims:
+        return "dimension"
+    if norm is None or not math.isfinite(norm):
+        return "nan_vector"
+    if norm == 0:
+        return "zero_norm"
+    return None
+
+# ---------------------------------------------------------
+# CHECK
+# ---------------------------------------------------------
+def check_drift(conn, files_map: List[Dict[str, Any]], workers: Optional[int] = None,
+                strict_model: bool = False) -> Dict[str, Any]:
+    """
+    Hashes the files on disk in a process pool while the stored chunks
+    stream in, then compares them by chunk_key. Returns per-reason counts,
+    the files to re-embed (with their reasons) and the chunk keys that no
+    longer exist on disk.
+    """
+    projects = sorted({item["project"] for item in files_map})
+    # The active model and its dimensions come from the registry (embedding_versions.py)
+    from embedding_versions import activated_models, versions
+    cursor = conn.cursor()
+    live = versions(cursor)
+    model_names = set(activated_models(cursor)) or {MODEL_NAME}
+    conn.rollback()
+    expected_dims = live[0].dims if live else EMBEDDING_DIMENSIONS
+    counts = {"stored": 0, "stale": 0, "missing": 0, "orphan": 0, "model": 0,
+              "unknown_model": 0, "dimension": 0, "nan_vector": 0, "zero_norm": 0,
+              "missing_vector": 0, "no_chunk_key": 0}
+    flagged: Dict[str, set] = {}   # chunk_key -> reasons (vector / model problems)
+    stored_hashes: Dict[str, Optional[str]] = {}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Disk hashing runs in the workers while this process streams the DB
+        disk_results = pool.map(hash_file_chunks, files_map, chunksize=WORKER_CHUNKSIZE)
+
+        for chunk_key, stored_hash, model_name, dims, norm in stream_stored_chunks(conn, projects):
+            counts["stored"] += 1
+            if chunk_key is None:
+                counts["no_chunk_key"] += 1
+                continue
+            stored_hashes[chunk_key] = stored_hash
+            reasons = set()
+            problem = vector_problem(dims, norm, expected_dims)
+            if problem:
+                reasons.add(problem)
+            if model_name is None:
+                counts["unknown_model"] += 1
+                if strict_model:
+                    reasons.add("model")
+            elif model_name not in model_names:
+                reasons.add("model")
+            for reason in reasons:
+                counts[reason] += 1
+            if reasons:
+                flagged[chunk_key] = reasons
+        conn.rollback()
+
+        worklist: Dict[str, Dict[str, Any]] = {}
+        for item, chunks in disk_results:
+            reasons = set()
+            for chunk_key, disk_hash in chunks:
+                if chunk_key not in stored_hashes:
+                    reasons.add("missing")
+                    counts["missing"] += 1
+                    continue
+                stored_hash = stored_hashes.pop(chunk_key)
+                if stored_hash != disk_hash:
+                    reasons.add("stale")
+                    counts["stale"] += 1
+                reasons |= flagged.pop(chunk_key, set())
+            if reasons:
+                worklist[item["full_path"]] = {**item, "reasons": sorted(reasons)}
+
+    # Whatever is left in the store has no counterpart on disk
+    orphans = sorted(stored_hashes)
+    counts["orphan"] = len(orphans)
+    return {"counts": counts, "files": list(worklist.values()), "delete_chunk_keys": orphans}
+
+def delete_orphans(conn, chunk_keys: List[str]) -> int:
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM codebase_embeddings WHERE chunk_key = ANY(%s)", (chunk_keys,))
+        deleted = cursor.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return deleted
+
+def main():
+    print("="*60)
+    print("🧪 EMBEDDING DRIFT CHECK (CONTENT / MODEL / VECTORS)")
+    print("="*60)
+
+    args = sys.argv[1:]
+    strict_model = "--strict-model" in args
+    workers = next((int(a.split("=", 1)[1]) for a in args if a.startswith("--workers=")), None)
+
+    if not os.path.exists(INPUT_FILE):
+        print(f"❌ Map not found: {INPUT_FILE}")
+        return
+    with open(INPUT_FILE, "r", encoding="utf-8") as f:
+        files_map = json.load(f)
+
+    from db import connect_db
+    conn = connect_db()
+    if not conn:
+        sys.exit(1)
+
+    try:
+        start = time.time()
+        result = check_drift(conn, files_map, workers, strict_model)
+        counts = result["counts"]
+        print(f"📂 {len(files_map)} archivos en disco, {counts['stored']} fragmentos en la DB "
+              f"({time.time() - start:.2f}s)")
+        for reason in ("stale", "missing", "orphan", "model", "dimension", "nan_vector",
+                       "zero_norm", "missing_vector", "unknown_model", "no_chunk_key"):
+            if counts[reason]:
+                print(f"   ⚠️ {reason}: {counts[reason]}")
+
+        with open(WORKLIST_FILE, "w", encoding="utf-8") as f:
+            json.dump({
+                "generated_at": datetime.now().isoformat(),
+                "model": MODEL_NAME,
+                "counts": counts,
+                "files": result["files"],
+                "delete_chunk_keys": result["delete_chunk_keys"]
+            }, f, indent=2)
+        print(f"📝 {len(result['files'])} archivos a re-vectorizar -> {WORKLIST_FILE}")
+        print("   Re-embed with: python generate_embeddings.py --worklist")
+
+        if result["delete_chunk_keys"] and "--delete-orphans" in args:
+            deleted = delete_orphans(conn, result["delete_chunk_keys"])
+            print(f"🗑️ {deleted} fragmentos huérfanos eliminados")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    from profiling import run_main  # --profile
+    run_main("drift_check", main)
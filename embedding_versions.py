@@ -0,0 +1,543 @@
+"""
+Embedding model versions: each model gets its own vector column; the active
+one is always `embedding`.
+
+    python embedding_versions.py status
+    python embedding_versions.py add text-embedding-005 [--dims=768]
+    python embedding_versions.py backfill [--rpm=25] [--flip]
+    python embedding_versions.py flip [--force]
+    python embedding_versions.py drop <version>
+"""
+
+import json
+import sys
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+try:
+    import psycopg2
+    import psycopg2.extensions
+    from psycopg2 import sql
+    HAS_PSYCOPG2 = True
+except ImportError:
+    HAS_PSYCOPG2 = False  # db.py reports it; only active_model() works without it
+
+from db import STATEMENT_TIMEOUT_MS, connect_db
+from generate_embeddings import MODEL_NAME, MODEL_DIMENSIONS, RPM_LIMIT, RateLimiter, get_batch_embeddings
+from partition_embeddings import TABLE, ann_lists, is_partitioned, partitions
+from vector_codec import EMBEDDING_COLUMNS, copy_binary, upsert_embeddings
+
+# Configuration
+REGISTRY = "embedding_versions"
+ACTIVE_COLUMN = "embedding"
+VERSION_STAGE = "embedding_version_stage"
+EMBED_BATCH_SIZE = 5          # texts per Vertex request, as in generate_embeddings
+BACKFILL_RPM = RPM_LIMIT // 2 # leaves half of the quota to pipeline / watch runs
+MAX_ANN_DIMS = 2000           # ivfflat / hnsw limit for vector columns
+FLIP_LOCK_TIMEOUT = "5s"      # per attempt; writers and searches queue behind a waiting flip
+FLIP_ATTEMPTS = 10
+ACTIVE_MODEL_TTL_S = 30       # how long active_model() trusts its last answer
+
+class Version(NamedTuple):
+    version: int
+    model: str
+    dims: int
+    column: str
+    status: str               # building | active | retired | dropped
+
+# ---------------------------------------------------------
+# REGISTRY
+# ---------------------------------------------------------
+def ensure_registry(cursor):
+    """Creates the registry; the first version is whatever model filled `embedding` so far."""
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {REGISTRY} (
+          version int primary key,
+          model text not null,
+          dims int not null,
+          column_name text not null,
+          status text not null check (status in ('building', 'active', 'retired', 'dropped')),
+          created_at timestamptz default now(),
+          activated_at timestamptz
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS {REGISTRY}_model_idx ON {REGISTRY} (model) WHERE status <> 'dropped';
+        -- At most one active and one building version
+        CREATE UNIQUE INDEX IF NOT EXISTS {REGISTRY}_status_idx ON {REGISTRY} (status)
+        WHERE status IN ('active', 'building');
+    """)
+    cursor.execute(f"SELECT count(*) FROM {REGISTRY};")
+    if cursor.fetchone()[0]:
+        return
+    # pgvector keeps the dimensions as the column's typmod
+    cursor.execute("SELECT atttypmod FROM pg_attribute WHERE attrelid = to_regclass(%s) AND attname = %s;",
+                   (TABLE, ACTIVE_COLUMN))
+    row = cursor.fetchone()
+    dims = row[0] if row and row[0] > 0 else MODEL_DIMENSIONS.get(MODEL_NAME)
+    cursor.execute(f"""
+        INSERT INTO {REGISTRY} (version, model, dims, column_name, status, activated_at)
+        VALUES (1, %s, %s, %s, 'active', now());
+    """, (MODEL_NAME, dims, ACTIVE_COLUMN))
+
+def versions(cursor, lock: bool = False) -> List[Version]:
+    """
+    Live versions, active first; [] before init_db.py created the registry.
+    lock=True holds the table against a flip until the transaction ends,
+    so the versions returned stay valid for the writes that follow.
+    """
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (REGISTRY,))
+    if not cursor.fetchone()[0]:
+        return []
+    if lock:
+        # Conflicts only with the flip's ACCESS EXCLUSIVE lock. Taken before
+        # the read, so a flip that committed first is already visible.
+        cursor.execute(sql.SQL("LOCK TABLE {} IN ROW EXCLUSIVE MODE;").format(sql.Identifier(TABLE)))
+    cursor.execute(f"""
+        SELECT version, model, dims, column_name, status FROM {REGISTRY}
+        WHERE status <> 'dropped'
+        ORDER BY status = 'active' DESC, status = 'building' DESC, version DESC;
+    """)
+    return [Version(*row) for row in cursor.fetchall()]
+
+def activated_models(cursor) -> List[str]:
+    """Every model that has been active: rows labelled with an older one were re-embedded at its flip."""
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (REGISTRY,))
+    if not cursor.fetchone()[0]:
+        return []
+    cursor.execute(f"SELECT model FROM {REGISTRY} WHERE activated_at IS NOT NULL ORDER BY version;")
+    return [row[0] for row in cursor.fetchall()]
+
+def building_version(live: List[Version]) -> Optional[Version]:
+    return next((v for v in live if v.status == "building"), None)
+
+_active = {"model": None, "checked_at": 0.0}
+
+def active_model(cursor=None) -> str:
+    """
+    The model new vectors and queries should be embedded with, cached for
+    ACTIVE_MODEL_TTL_S. MODEL_NAME without a registry (or a database);
+    match_codebase then searches the `embedding` column as before.
+    """
+    if _active["model"] and time.time() - _active["checked_at"] < ACTIVE_MODEL_TTL_S:
+        return _active["model"]
+    if not HAS_PSYCOPG2:
+        return MODEL_NAME
+    model = MODEL_NAME
+    conn = None
+    try:
+        if cursor is None:
+            conn = connect_db()
+            cursor = conn.cursor() if conn else None
+        if cursor is not None:
+            live = versions(cursor)
+            if live and live[0].status == "active":
+                model = live[0].model
+    except psycopg2.Error:
+        if cursor is not None:
+            cursor.connection.rollback()
+    finally:
+        if conn is not None:
+            conn.rollback()
+            conn.close()
+    _active.update(model=model, checked_at=time.time())
+    return model
+
+def vector_column(cursor, model: Optional[str]) -> str:
+    """The column holding `model`'s vectors; the table stays locked against a flip until commit."""
+    if model is None:
+        return ACTIVE_COLUMN
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (REGISTRY,))
+    if not cursor.fetchone()[0]:
+        return ACTIVE_COLUMN
+    cursor.execute(sql.SQL("LOCK TABLE {} IN ACCESS SHARE MODE;").format(sql.Identifier(TABLE)))
+    cursor.execute(f"SELECT column_name FROM {REGISTRY} WHERE model = %s AND status <> 'dropped';", (model,))
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError(f"No queryable vectors for embedding model {model!r}")
+    return row[0]
+
+# ---------------------------------------------------------
+# WRITES
+# ---------------------------------------------------------
+def embed_texts(texts: List[str], model: str, rate_limiter: Optional[RateLimiter] = None) -> List[List[float]]:
+    vectors = []
+    for i in range(0, len(texts), EMBED_BATCH_SIZE):
+        batch = texts[i:i + EMBED_BATCH_SIZE]
+        result = get_batch_embeddings(batch, model, rate_limiter)
+        if len(result) != len(batch):
+            raise RuntimeError(f"Fallo al generar embeddings con {model}")
+        vectors.extend(result)
+    return vectors
+
+def write_version(cursor, version: Version, rows: List[Sequence[Any]]) -> int:
+    """
+    Stores (project, chunk_key, content_hash, vector) rows in the version's
+    column. A row whose content changed in the meantime is left alone: its
+    writer fills it in for the new content. Returns the rows written.
+    """
+    cursor.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS {VERSION_STAGE} (
+          project text, chunk_key text, content_hash text, embedding vector
+        ) ON COMMIT DELETE ROWS;
+        TRUNCATE {VERSION_STAGE};
+    """)
+    copy_binary(cursor, VERSION_STAGE, ("project", "chunk_key", "content_hash", "embedding"),
+                ("text", "text", "text", "vector"), rows)
+    cursor.execute(sql.SQL("""
+        UPDATE {table} t SET {column} = s.embedding
+        FROM {stage} s
+        WHERE t.project = s.project AND t.chunk_key = s.chunk_key
+          AND t.content_hash IS NOT DISTINCT FROM s.content_hash;
+    """).format(table=sql.Identifier(TABLE), column=sql.Identifier(version.column),
+                stage=sql.Identifier(VERSION_STAGE)))
+    return cursor.rowcount
+
+def store_embeddings(cursor, rows: List[Sequence[Any]], on_conflict: str = "update",
+                     binary: bool = True, table: str = TABLE):
+    """
+    upsert_embeddings() that keeps every live version in step: rows whose
+    metadata names another model than the active one (a flip happened
+    after they were embedded) are re-embedded first, and a version being
+    built gets its own vectors for the same rows. Writes in the caller's
+    transaction.
+
+    Vertex is called before the table lock: a slow request must not hold
+    up a flip, with every search queued behind the flip. Under the lock the
+    versions are read again, and a write that is missing vectors for a
+    version added or flipped in between raises, to be retried. That keeps
+    every row written while a version builds complete, which is what lets
+    flip() check completeness before it takes its lock.
+    """
+    conn = cursor.connection
+    idle = conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    live = versions(cursor)
+    if idle:
+        conn.rollback()   # no transaction stays open while waiting on Vertex
+    if not live:
+        upsert_embeddings(cursor, rows, on_conflict, binary, table)
+        return
+
+    columns = {name: i for i, name in enumerate(EMBEDDING_COLUMNS)}
+    rows = [list(row) for row in rows]
+    contents = [row[columns["content"]] for row in rows]
+    # model -> {row index: vector}, for the models the rows were not embedded with
+    embedded: Dict[str, Dict[int, List[float]]] = {}
+    active = live[0]
+    stale = [i for i, row in enumerate(rows) if _row_model(row[columns["metadata"]]) not in (None, active.model)]
+    if stale:
+        embedded[active.model] = dict(zip(stale, embed_texts([contents[i] for i in stale], active.model)))
+    building = building_version(live)
+    if building is not None and rows:
+        embedded[building.model] = dict(enumerate(embed_texts(contents, building.model)))
+
+    live = versions(cursor, lock=True)
+    if not live:
+        upsert_embeddings(cursor, rows, on_conflict, binary, table)
+        return
+    active = live[0]
+    for i, row in enumerate(rows):
+        if _row_model(row[columns["metadata"]]) in (None, active.model):
+            continue
+        vector = embedded.get(active.model, {}).get(i)
+        if vector is None:
+            raise RuntimeError(f"The active embedding model changed to {active.model} during the write; retry")
+        row[columns["embedding"]] = vector
+        row[columns["metadata"]] = json.dumps({**json.loads(row[columns["metadata"]]), "model": active.model})
+    upsert_embeddings(cursor, rows, on_conflict, binary, table)
+
+    building = building_version(live)
+    if building is not None and rows:
+        vectors = embedded.get(building.model)
+        if vectors is None:
+            raise RuntimeError(f"{building.model} started building during the write; retry")
+        write_version(cursor, building, [
+            (rows[i][columns["project"]], rows[i][columns["chunk_key"]], rows[i][columns["content_hash"]], vector)
+            for i, vector in vectors.items()
+        ])
+
+def _row_model(metadata: Any) -> Optional[str]:
+    if isinstance(metadata, str):
+        metadata = json.loads(metadata)
+    return (metadata or {}).get("model")
+
+# ---------------------------------------------------------
+# ANN INDEXES
+# ---------------------------------------------------------
+def index_tables(cursor) -> List[str]:
+    """Where ANN indexes live: the table itself, or each of its partitions."""
+    return sorted(partitions(cursor).values()) if is_partitioned(cursor) else [TABLE]
+
+def ann_indexes_on(cursor, table: str, column: str) -> List[str]:
+    """ANN indexes on one column; more than one if an older script added a duplicate."""
+    cursor.execute("""
+        SELECT i.relname
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        JOIN pg_am am ON am.oid = i.relam
+        JOIN pg_attribute a ON a.attrelid = x.indrelid AND a.attnum = x.indkey[0]
+        WHERE x.indrelid = to_regclass(%s) AND a.attname = %s AND am.amname IN ('ivfflat', 'hnsw')
+        ORDER BY i.relname;
+    """, (table, column))
+    return [row[0] for row in cursor.fetchall()]
+
+def rename_indexes(cursor, indexes: List[str], name: str):
+    """The first index becomes `name`, any duplicates `name`1, `name`2, ..."""
+    for n, index in enumerate(indexes):
+        target = name if n == 0 else f"{name}{n}"
+        if index != target:
+            cursor.execute(sql.SQL("ALTER INDEX {} RENAME TO {};").format(sql.Identifier(index), sql.Identifier(target)))
+
+def create_version_indexes(conn, version: Version) -> Dict[str, int]:
+    """
+    IVFFlat indexes on the version's column, built CONCURRENTLY so writers
+    keep going. Empty partitions get none, as in partition_embeddings.
+    """
+    if version.dims > MAX_ANN_DIMS:
+        print(f"   ⚠️ {version.dims} dimensions: too many for an ivfflat index, searches will scan")
+        return {}
+    cursor = conn.cursor()
+    tables = index_tables(cursor)
+    conn.rollback()
+    created = {}
+    conn.autocommit = True   # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    try:
+        cursor.execute("SET statement_timeout = 0;")
+        for table in tables:
+            if ann_indexes_on(cursor, table, version.column):
+                continue
+            cursor.execute(sql.SQL("SELECT count(*) FROM {};").format(sql.Identifier(table)))
+            rows = cursor.fetchone()[0]
+            if not rows:
+                continue
+            lists = ann_lists(rows)
+            cursor.execute(sql.SQL("""
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS {index} ON {table}
+                USING ivfflat ({column} vector_cosine_ops) WITH (lists = {lists});
+            """).format(index=sql.Identifier(f"{table}_{version.column}_idx"), table=sql.Identifier(table),
+                        column=sql.Identifier(version.column), lists=sql.Literal(lists)))
+            created[table] = lists
+    finally:
+        cursor.execute("SET statement_timeout = %s;", (STATEMENT_TIMEOUT_MS,))
+        conn.autocommit = False
+    return created
+
+# ---------------------------------------------------------
+# COMMANDS
+# ---------------------------------------------------------
+def add(conn, model: str, dims: Optional[int] = None) -> Version:
+    """Registers a new model as 'building', with an empty column of its own (no table rewrite)."""
+    dims = dims or MODEL_DIMENSIONS.get(model)
+    if not dims:
+        raise ValueError(f"Unknown dimensions for {model}: pass --dims=")
+    cursor = conn.cursor()
+    ensure_registry(cursor)
+    live = versions(cursor)
+    if any(v.model == model for v in live):
+        raise ValueError(f"{model} is already registered")
+    if building_version(live):
+        raise ValueError(f"{building_version(live).model} is still building (flip or drop it first)")
+
+    cursor.execute(f"SELECT coalesce(max(version), 0) + 1 FROM {REGISTRY};")
+    number = cursor.fetchone()[0]
+    version = Version(number, model, dims, f"{ACTIVE_COLUMN}_v{number}", "building")
+    cursor.execute(sql.SQL("ALTER TABLE {} ADD COLUMN {} vector({});").format(
+        sql.Identifier(TABLE), sql.Identifier(version.column), sql.Literal(dims)))
+    cursor.execute(f"""
+        INSERT INTO {REGISTRY} (version, model, dims, column_name, status)
+        VALUES (%s, %s, %s, %s, 'building');
+    """, (version.version, model, dims, version.column))
+    conn.commit()
+    return version
+
+def backfill(conn, rpm: int = BACKFILL_RPM, limit: Optional[int] = None) -> int:
+    """
+    Embeds the rows the building version has no vector for yet, in id
+    order, one committed batch at a time. No transaction stays open while
+    waiting on the API. Returns the rows filled in.
+    """
+    cursor = conn.cursor()
+    version = building_version(versions(cursor))
+    if version is None:
+        conn.rollback()
+        print("✅ No version is building")
+        return 0
+    column = sql.Identifier(version.column)
+    cursor.execute(sql.SQL("SELECT count(*) FROM {} WHERE {} IS NULL;").format(sql.Identifier(TABLE), column))
+    remaining = cursor.fetchone()[0]
+    conn.rollback()
+    print(f"🔁 v{version.version} {version.model}: {remaining} rows to embed at {rpm} requests/min")
+
+    rate_limiter = RateLimiter(rpm)
+    last_id = 0
+    filled = 0
+    start = time.time()
+    while limit is None or filled < limit:
+        cursor.execute(sql.SQL("""
+            SELECT id, project, chunk_key, content_hash, content FROM {table}
+            WHERE {column} IS NULL AND chunk_key IS NOT NULL AND id > %s
+            ORDER BY id LIMIT %s;
+        """).format(table=sql.Identifier(TABLE), column=column), (last_id, EMBED_BATCH_SIZE))
+        rows = cursor.fetchall()
+        conn.rollback()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        vectors = embed_texts([r[4] for r in rows], version.model, rate_limiter)
+        filled += write_version(cursor, version, [(r[1], r[2], r[3], v) for r, v in zip(rows, vectors)])
+        conn.commit()
+        elapsed = time.time() - start
+        print(f"   {filled}/{remaining} rows ({filled / elapsed if elapsed else 0:.1f}/s)...", end="\r")
+    print(f"\n✅ {filled} rows embedded with {version.model}")
+    return filled
+
+def flip(conn, force: bool = False) -> Version:
+    """
+    Makes the building version active: its column becomes `embedding` and
+    the old one `embedding_v<n>`, ANN indexes renamed along, registry
+    updated. Refuses while rows are missing vectors unless force=True
+    (those rows drop out of vector search).
+
+    Everything that scans the table runs before the lock: the indexes are
+    built CONCURRENTLY and completeness is checked unlocked (store_embeddings
+    completes every row written while the version builds). The ACCESS
+    EXCLUSIVE section only renames and updates the registry, so reads wait
+    for catalog changes, not for a table scan or an index build.
+    """
+    cursor = conn.cursor()
+    live = versions(cursor)
+    conn.rollback()
+    version = building_version(live)
+    if version is None:
+        raise ValueError("No version is building (run `add` first)")
+    active = live[0]
+
+    cursor.execute(sql.SQL("SELECT count(*) FROM {} WHERE {} IS NULL;").format(
+        sql.Identifier(TABLE), sql.Identifier(version.column)))
+    missing = cursor.fetchone()[0]
+    conn.rollback()
+    if missing and not force:
+        raise ValueError(f"{missing} rows have no {version.model} vector yet (run backfill, or flip --force)")
+    for table, lists in create_version_indexes(conn, version).items():
+        print(f"   ⚡ {table}: ivfflat ({version.column}) lists = {lists}")
+
+    for attempt in range(1, FLIP_ATTEMPTS + 1):
+        try:
+            cursor.execute("SET LOCAL lock_timeout = %s;", (FLIP_LOCK_TIMEOUT,))
+            cursor.execute(sql.SQL("LOCK TABLE {} IN ACCESS EXCLUSIVE MODE;").format(sql.Identifier(TABLE)))
+            break
+        except psycopg2.errors.LockNotAvailable:
+            conn.rollback()
+            print(f"   ⏳ Table busy, retrying ({attempt}/{FLIP_ATTEMPTS})...")
+    else:
+        raise RuntimeError(f"Could not lock {TABLE} for the flip")
+
+    # A flip or drop that got in first
+    current = versions(cursor)
+    if building_version(current) != version or current[0] != active:
+        conn.rollback()
+        raise RuntimeError("The versions changed while preparing the flip; run it again")
+
+    retired_column = f"{ACTIVE_COLUMN}_v{active.version}"
+    for table in index_tables(cursor):
+        # Catalog lookups only; old names first, so `<table>_embedding_idx` is free
+        old_indexes = ann_indexes_on(cursor, table, ACTIVE_COLUMN)
+        new_indexes = ann_indexes_on(cursor, table, version.column)
+        rename_indexes(cursor, old_indexes, f"{table}_{retired_column}_idx")
+        rename_indexes(cursor, new_indexes, f"{table}_{ACTIVE_COLUMN}_idx")
+    cursor.execute(sql.SQL("ALTER TABLE {table} RENAME COLUMN {active} TO {retired};").format(
+        table=sql.Identifier(TABLE), active=sql.Identifier(ACTIVE_COLUMN), retired=sql.Identifier(retired_column)))
+    cursor.execute(sql.SQL("ALTER TABLE {table} RENAME COLUMN {column} TO {active};").format(
+        table=sql.Identifier(TABLE), column=sql.Identifier(version.column), active=sql.Identifier(ACTIVE_COLUMN)))
+    cursor.execute(f"UPDATE {REGISTRY} SET status = 'retired', column_name = %s WHERE version = %s;",
+                   (retired_column, active.version))
+    cursor.execute(f"""
+        UPDATE {REGISTRY} SET status = 'active', column_name = %s, activated_at = now()
+        WHERE version = %s;
+    """, (ACTIVE_COLUMN, version.version))
+    conn.commit()
+    _active.update(model=None, checked_at=0.0)
+    flipped = version._replace(column=ACTIVE_COLUMN, status="active")
+
+    # Partitions that got rows after the indexes were built, indexed now without the lock
+    for table, lists in create_version_indexes(conn, flipped).items():
+        print(f"   ⚡ {table}: ivfflat ({ACTIVE_COLUMN}) lists = {lists}")
+    return flipped
+
+def drop(conn, number: int):
+    """Drops a retired version's column (and its indexes), or abandons a building one."""
+    cursor = conn.cursor()
+    version = next((v for v in versions(cursor) if v.version == number), None)
+    if version is None or version.status == "active":
+        conn.rollback()
+        raise ValueError(f"v{number} is not a retired or building version")
+    cursor.execute("SET LOCAL lock_timeout = %s;", (FLIP_LOCK_TIMEOUT,))
+    cursor.execute(sql.SQL("ALTER TABLE {} DROP COLUMN IF EXISTS {};").format(
+        sql.Identifier(TABLE), sql.Identifier(version.column)))
+    cursor.execute(f"UPDATE {REGISTRY} SET status = 'dropped' WHERE version = %s;", (number,))
+    conn.commit()
+
+def status(conn):
+    cursor = conn.cursor()
+    ensure_registry(cursor)
+    conn.commit()
+    cursor.execute(f"""
+        SELECT version, model, dims, column_name, status, activated_at FROM {REGISTRY} ORDER BY version;
+    """)
+    rows = cursor.fetchall()
+    cursor.execute(sql.SQL("SELECT count(*) FROM {};").format(sql.Identifier(TABLE)))
+    total = cursor.fetchone()[0]
+    print(f"   {'ver':<4} {'model':<34} {'dims':>5}  {'column':<16} {'status':<9} {'filled':>15}")
+    for number, model, dims, column, state, activated_at in rows:
+        filled = ""
+        if state != "dropped":
+            cursor.execute(sql.SQL("SELECT count({}) FROM {};").format(sql.Identifier(column), sql.Identifier(TABLE)))
+            filled = f"{cursor.fetchone()[0]}/{total}"
+        print(f"   v{number:<3} {model:<34} {dims:>5}  {column:<16} {state:<9} {filled:>15}")
+    conn.rollback()
+
+def main():
+    print("="*60)
+    print("🔁 EMBEDDING MODEL VERSIONS")
+    print("="*60)
+
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    options = {a.split("=", 1)[0]: a.split("=", 1)[1] for a in sys.argv[1:] if a.startswith("--") and "=" in a}
+    flags = set(a for a in sys.argv[1:] if a.startswith("--"))
+    command = args[0] if args else "status"
+    if command in ("add", "drop") and len(args) < 2:
+        print(f"Usage: python embedding_versions.py {command} <{'model' if command == 'add' else 'version'}>")
+        sys.exit(2)
+
+    conn = connect_db()
+    if not conn:
+        sys.exit(1)
+    try:
+        if command == "status":
+            status(conn)
+        elif command == "add":
+            version = add(conn, args[1], int(options["--dims"]) if "--dims" in options else None)
+            print(f"✅ v{version.version} {version.model} ({version.dims} dims) -> column {version.column}")
+            print("   Fill it with: python embedding_versions.py backfill")
+        elif command == "backfill":
+            backfill(conn, int(options.get("--rpm", BACKFILL_RPM)))
+            if "--flip" in flags:
+                version = flip(conn)
+                print(f"✅ {version.model} is now the active model")
+        elif command == "flip":
+            version = flip(conn, force="--force" in flags)
+            print(f"✅ {version.model} is now the active model")
+        elif command == "drop":
+            drop(conn, int(args[1].lstrip("v")))
+            print(f"🗑️ v{args[1].lstrip('v')} dropped")
+        else:
+            print(__doc__)
+            sys.exit(2)
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    from profiling import run_main  # --profile
+    run_main("embedding_versions", main)
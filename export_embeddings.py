@@ -0,0 +1,119 @@
+"""
+📤 STREAMING READS OF codebase_embeddings
+
+Pulls the table through a server-side cursor, FETCH_SIZE rows per round
+trip, with each vector sent in pgvector's binary form (vector_send)
+instead of its text literal: nothing parses 768 floats out of a string,
+and client memory stays at one batch however large the table is.
+
+    for rows, vectors in iter_embeddings(conn, projects=["hydra-web"]):
+        ...   # rows: tuples of COLUMNS, vectors: float32 array (len(rows), dims)
+
+    python export_embeddings.py [--project=hydra-web] [--out=codebase_export] [--fetch-size=2000] [--content]
+
+writes <out>.npy (float32 matrix, written through a memory map) and
+<out>.jsonl (one line per row, same order) from one consistent snapshot.
+"""
+
+import json
+import sys
+import time
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+
+from db import FETCH_SIZE, connect_db, stream_batches
+from vector_codec import HAS_NUMPY, decode_vector, decode_vectors
+
+if HAS_NUMPY:
+    import numpy as np
+
+# Configuration
+COLUMNS = ("id", "project", "file_path", "chunk_key", "content_hash", "metadata")
+OUTPUT_PREFIX = "codebase_export"
+
+def _where(projects: Optional[List[str]]) -> Tuple[str, tuple]:
+    if projects:
+        return "embedding IS NOT NULL AND project = ANY(%s)", (projects,)
+    return "embedding IS NOT NULL", ()
+
+def iter_embeddings(conn, projects: Optional[List[str]] = None, columns: Sequence[str] = COLUMNS,
+                    fetch_size: int = FETCH_SIZE) -> Iterator[Tuple[List[tuple], Any]]:
+    """
+    (rows, vectors) per round trip, in id order. `vectors` is a float32
+    matrix aligned with `rows`, or a list of array('f') without NumPy.
+    Runs inside the connection's current transaction.
+    """
+    where, params = _where(projects)
+    query = f"""
+        SELECT {', '.join(columns)}, vector_send(embedding)
+        FROM codebase_embeddings
+        WHERE {where}
+        ORDER BY id
+    """
+    for rows in stream_batches(conn, query, params, name="export_embeddings", fetch_size=fetch_size):
+        bufs = [r[-1] for r in rows]
+        vectors = decode_vectors(bufs) if HAS_NUMPY else [decode_vector(b) for b in bufs]
+        yield [r[:-1] for r in rows], vectors
+
+# ---------------------------------------------------------
+# EXPORT
+# ---------------------------------------------------------
+def export(conn, prefix: str, projects: Optional[List[str]] = None, with_content: bool = False,
+           fetch_size: int = FETCH_SIZE) -> int:
+    """Writes <prefix>.npy and <prefix>.jsonl; returns the number of rows."""
+    columns = COLUMNS + (("content",) if with_content else ())
+    where, params = _where(projects)
+
+    cursor = conn.cursor()
+    # Count, dimensions and rows all come from the same snapshot
+    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY;")
+    cursor.execute(f"SELECT count(*) FROM codebase_embeddings WHERE {where};", params)
+    total = cursor.fetchone()[0]
+    cursor.execute(f"SELECT vector_dims(embedding) FROM codebase_embeddings WHERE {where} LIMIT 1;", params)
+    first = cursor.fetchone()
+    cursor.close()
+    dims = first[0] if first else 0
+
+    matrix = np.lib.format.open_memmap(f"{prefix}.npy", mode="w+", dtype=np.float32, shape=(total, dims))
+    written = 0
+    with open(f"{prefix}.jsonl", "w", encoding="utf-8") as f:
+        for rows, vectors in iter_embeddings(conn, projects, columns, fetch_size):
+            matrix[written:written + len(rows)] = vectors
+            for row in rows:
+                f.write(json.dumps(dict(zip(columns, row)), default=str, ensure_ascii=False) + "\n")
+            written += len(rows)
+            print(f"   {written}/{total} rows...", end="\r")
+    matrix.flush()
+    del matrix
+    conn.rollback()
+    return written
+
+def main():
+    print("="*60)
+    print("📤 STREAMING EXPORT OF codebase_embeddings")
+    print("="*60)
+
+    if not HAS_NUMPY:
+        print("❌ numpy is required for the .npy export: pip install numpy")
+        sys.exit(1)
+
+    args = sys.argv[1:]
+    options = {a.split("=", 1)[0]: a.split("=", 1)[1] for a in args if a.startswith("--") and "=" in a}
+    prefix = options.get("--out", OUTPUT_PREFIX)
+    projects = options["--project"].split(",") if "--project" in options else None
+    fetch_size = int(options.get("--fetch-size", FETCH_SIZE))
+
+    conn = connect_db()
+    if not conn:
+        sys.exit(1)
+    try:
+        start = time.time()
+        rows = export(conn, prefix, projects, "--content" in args, fetch_size)
+        elapsed = time.time() - start
+        print(f"\n✅ {rows} rows -> {prefix}.npy + {prefix}.jsonl in {elapsed:.2f}s "
+              f"({rows / elapsed if elapsed else 0:.0f} rows/s, {fetch_size} per round trip)")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    from profiling import run_main  # --profile
+    run_main("export_embeddings", main)
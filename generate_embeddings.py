@@ -1,33 +1,43 @@
+import hashlib
 import json
 import os
 import time
 import sys
 import gc
-from typing import List, Dict, Any
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 from datetime import datetime
 
-# Google Cloud Imports
-from google.oauth2 import service_account
-from google.cloud import aiplatform
-from vertexai.language_models import TextEmbeddingModel
+import threading
 
-print("="*60)
-print("🛡️ GENERADOR DE EMBEDDINGS (MISSION CONTROL: RESILIENT SYNC)")
-print("="*60)
+import metrics
+from db import setting
+from lexical_index import LexicalIndex, chunk_doc_id, INDEX_FILE
 
-# Settings
-KEY_PATH = r'c:\Users\rmend\Desktop\LAVASECO ORQUIDEAS\lavaseco-app\gcloud_key.json'
-PROJECT_ID = "mystic-bank-485003-j0"
-REGION = "us-central1"
-MODEL_NAME = "text-embedding-004"
+# Settings (environment or .env, see db.setting)
+KEY_PATH = setting("GCLOUD_KEY_PATH", r'c:\Users\rmend\Desktop\LAVASECO ORQUIDEAS\lavaseco-app\gcloud_key.json')
+PROJECT_ID = setting("GCLOUD_PROJECT_ID", "mystic-bank-485003-j0")
+REGION = setting("GCLOUD_REGION", "us-central1")
+MODEL_NAME = "text-embedding-004"   # version 1 in embedding_versions; later versions come from the registry
+EMBEDDING_DIMENSIONS = 768  # vector(768) in codebase_embeddings
+MODEL_DIMENSIONS = {        # output size per model, for `embedding_versions.py add`
+    "text-embedding-004": 768,
+    "text-embedding-005": 768,
+    "text-multilingual-embedding-002": 768,
+}
 INPUT_FILE = "codebase_map.json"
 OUTPUT_FILE = "codebase_embeddings.json"
 LOG_FILE = "sync_log.json"
+WORKLIST_FILE = "reembed_worklist.json"  # written by drift_check.py
 
 # Safety Settings
 RPM_LIMIT = 50  # Requests per minute (Strict)
 INTER_CHUNK_DELAY = 2.0 # Seconds between chunks
 TARGET_CHUNK_SIZE = 8000 # ~2000 tokens
+CHUNK_TASK_FILES = 8          # files per task sent to a chunking process
+CHUNK_WINDOW_PER_WORKER = 4  # tasks read ahead per chunking process (bounds memory)
 
 # ---------------------------------------------------------
 # LOGGING SYSTEM
@@ -41,19 +51,21 @@ def log_sync_event(filename: str, status: str, code: str):
         "timestamp": datetime.now().isoformat()
     }
     
-    # Read existing or create new
-    logs = []
-    if os.path.exists(LOG_FILE):
-        try:
-            with open(LOG_FILE, 'r', encoding='utf-8') as f:
-                logs = json.load(f)
-        except:
-            pass # corrupted log, start fresh
-            
-    logs.append(entry)
-    
-    with open(LOG_FILE, 'w', encoding='utf-8') as f:
-        json.dump(logs, f, indent=2)
+    with metrics.timer("sync_log_write"):
+        # Read existing or create new
+        logs = []
+        if os.path.exists(LOG_FILE):
+            try:
+                with open(LOG_FILE, 'r', encoding='utf-8') as f:
+                    logs = json.load(f)
+            except:
+                pass # corrupted log, start fresh
+                
+        logs.append(entry)
+        
+        with open(LOG_FILE, 'w', encoding='utf-8') as f:
+            json.dump(logs, f, indent=2)
+    metrics.count("sync_events", status=status)
 
 # ---------------------------------------------------------
 # RATE LIMITER
@@ -62,39 +74,105 @@ class RateLimiter:
     def __init__(self, rpm):
         self.interval = 60.0 / rpm
         self.last_request_time = 0
+        self.lock = threading.Lock()  # shared by the search service's worker threads
 
     def wait(self):
-        now = time.time()
-        elapsed = now - self.last_request_time
-        if elapsed < self.interval:
-            sleep_time = self.interval - elapsed
-            # print(f"   ⏳ Throttling: sleeping {sleep_time:.2f}s")
-            time.sleep(sleep_time)
-        self.last_request_time = time.time()
+        with self.lock:
+            now = time.time()
+            elapsed = now - self.last_request_time
+            if elapsed < self.interval:
+                sleep_time = self.interval - elapsed
+                # print(f"   ⏳ Throttling: sleeping {sleep_time:.2f}s")
+                time.sleep(sleep_time)
+            self.last_request_time = time.time()
 
 limiter = RateLimiter(RPM_LIMIT)
 
 # ---------------------------------------------------------
 # INIT VERTEX AI
 # ---------------------------------------------------------
-try:
-    print(f"🔑 Cargando credenciales...")
-    creds = service_account.Credentials.from_service_account_file(KEY_PATH)
-    
-    print(f"☁️ Inicializando Vertex AI...")
-    aiplatform.init(
-        project=PROJECT_ID,
-        location=REGION,
-        credentials=creds
-    )
-    
-    model = TextEmbeddingModel.from_pretrained(MODEL_NAME)
-    print(f"✅ Modelo cargado: {MODEL_NAME}")
+# Models are loaded on first use, so importing this module (for
+# recursive_split_text, or from the search service) stays cheap. During a
+# model migration (embedding_versions.py) two of them are loaded at once.
+model = None                       # MODEL_NAME's model
+models: Dict[str, Any] = {}        # model name -> loaded model
+_vertex_ready = False
+_model_lock = threading.Lock()
+
+class _FakeEmbedding:
+    def __init__(self, values: List[float]):
+        self.values = values
+
+class FakeEmbeddingModel:
+    """
+    Offline stand-in for TextEmbeddingModel (EMBEDDING_BACKEND=fake):
+    deterministic unit vectors derived from the text's sha256, no network,
+    no rate limit. Used by benchmarks and local runs without credentials.
+    Each model name gives different vectors, of that model's dimensions.
+    """
+    rate_limited = False
+
+    def __init__(self, model_name: str = MODEL_NAME):
+        self.salt = b"" if model_name == MODEL_NAME else model_name.encode("utf-8") + b"\0"
+        self.dims = MODEL_DIMENSIONS.get(model_name, EMBEDDING_DIMENSIONS)
+
+    def get_embeddings(self, texts: List[str]) -> List[_FakeEmbedding]:
+        embeddings = []
+        for text in texts:
+            seed = hashlib.sha256(self.salt + text.encode("utf-8")).digest()
+            raw = []
+            counter = 0
+            while len(raw) < self.dims:
+                block = hashlib.sha256(seed + counter.to_bytes(4, "little")).digest()
+                raw.extend(b - 127.5 for b in block)
+                counter += 1
+            raw = raw[:self.dims]
+            norm = sum(v * v for v in raw) ** 0.5
+            embeddings.append(_FakeEmbedding([v / norm for v in raw]))
+        return embeddings
+
+def init_model(model_name: Optional[str] = None):
+    global model, _vertex_ready
+    model_name = model_name or MODEL_NAME
+    with _model_lock:
+        if model_name in models:
+            return models[model_name]
+
+        if os.environ.get("EMBEDDING_BACKEND") == "fake":
+            models[model_name] = FakeEmbeddingModel(model_name)
+            if model_name == MODEL_NAME:
+                model = models[model_name]
+            return models[model_name]
+
+        # Google Cloud Imports
+        from google.oauth2 import service_account
+        from google.cloud import aiplatform
+        from vertexai.language_models import TextEmbeddingModel
+
+        try:
+            if not _vertex_ready:
+                print(f"🔑 Cargando credenciales...")
+                creds = service_account.Credentials.from_service_account_file(KEY_PATH)
+
+                print(f"☁️ Inicializando Vertex AI...")
+                aiplatform.init(
+                    project=PROJECT_ID,
+                    location=REGION,
+                    credentials=creds
+                )
+                _vertex_ready = True
+
+            models[model_name] = TextEmbeddingModel.from_pretrained(model_name)
+            if model_name == MODEL_NAME:
+                model = models[model_name]
+            print(f"✅ Modelo cargado: {model_name}")
+
+        except Exception as e:
+            print(f"❌ Error de inicialización: {e}")
+            log_sync_event("SYSTEM_INIT", "FAIL", str(e))
+            raise
 
-except Exception as e:
-    print(f"❌ Error de inicialización: {e}")
-    log_sync_event("SYSTEM_INIT", "FAIL", str(e))
-    sys.exit(1)
+        return models[model_name]
 
 # ---------------------------------------------------------
 # LOGIC
@@ -150,19 +228,74 @@ def recursive_split_text(text: str, target_size: int = 8000) -> List[str]:
     # Fallback
     return [text[i:i+target_size] for i in range(0, len(text), target_size)]
 
-def get_batch_embeddings(texts: List[str]) -> List[List[float]]:
+def chunk_file(file_item: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[List[str]], Optional[str]]:
+    """
+    Reads and splits one file (runs in a worker process). Returns the
+    chunks, [] for an empty file, or None and the error text.
+    """
+    try:
+        with open(file_item['full_path'], "r", encoding="utf-8", errors="ignore") as f:
+            content = f.read()
+    except Exception as e:
+        return file_item, None, str(e)
+    if not content.strip():
+        return file_item, [], None
+    return file_item, recursive_split_text(content, TARGET_CHUNK_SIZE), None
+
+def _chunk_files(file_items: List[Dict[str, Any]]):
+    return [chunk_file(item) for item in file_items]
+
+def iter_chunked_files(files: Iterable[Dict[str, Any]], workers: Optional[int] = None
+                       ) -> Iterator[Tuple[Dict[str, Any], Optional[List[str]], Optional[str]]]:
+    """
+    chunk_file over a process pool, yielded in input order. Files go to
+    the workers CHUNK_TASK_FILES at a time, and at most
+    CHUNK_WINDOW_PER_WORKER tasks per worker are in flight, so a slow
+    consumer (the rate-limited API) never makes the chunks pile up.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        yield from map(chunk_file, files)
+        return
+
+    window = workers * CHUNK_WINDOW_PER_WORKER
+    pending = deque()
+    files = iter(files)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            task = list(islice(files, CHUNK_TASK_FILES))
+            if task:
+                pending.append(pool.submit(_chunk_files, task))
+            if pending and (len(pending) >= window or not task):
+                yield from pending.popleft().result()
+            elif not task:
+                return
+
+def get_batch_embeddings(texts: List[str], model_name: Optional[str] = None,
+                         rate_limiter: Optional[RateLimiter] = None) -> List[List[float]]:
+    """
+    Vectors for texts from model_name (MODEL_NAME by default). Requests wait
+    on rate_limiter, or on the module's RPM_LIMIT limiter.
+    """
     if not texts:
         return []
 
+    embedding_model = init_model(model_name)
+
     # Retry Strategy: 1s, 4s, 10s
     delays = [1, 4, 10]
     
     for attempt, delay in enumerate(delays):
-        limiter.wait() # Enforce 50 RPM limit
+        if getattr(embedding_model, "rate_limited", True):
+            with metrics.timer("limiter_wait"):
+                (rate_limiter or limiter).wait() # Enforce 50 RPM limit
         
         try:
-            embeddings = model.get_embeddings(texts)
+            with metrics.timer("embed_api"):
+                embeddings = embedding_model.get_embeddings(texts)
             # Success
+            metrics.count("embed_requests", outcome="ok")
+            metrics.count("embedded_texts", len(texts))
             return [emb.values for emb in embeddings]
         
         except Exception as e:
@@ -170,20 +303,38 @@ def get_batch_embeddings(texts: List[str]) -> List[List[float]]:
             print(f"   ⚠️ Error attempt {attempt+1}: {e}")
             
             if "429" in error_str or "quota" in error_str:
+                metrics.count("embed_requests", outcome="quota")
                 print(f"   ⏳ Quota hit. Waiting {delay}s...")
                 time.sleep(delay)
             elif "400" in error_str:
+                metrics.count("embed_requests", outcome="bad_request")
                 print(f"   ❌ Error 400 (Bad Request). Chunk likely too big.")
                 # We raise to handle logic outside or just fail this batch
                 raise e 
             else:
                 # Other transient errors
+                metrics.count("embed_requests", outcome="error")
                 time.sleep(delay)
     
     print("   ❌ Failed after max retries")
     return []
 
 def main():
+    print("="*60)
+    print("🛡️ GENERADOR DE EMBEDDINGS (MISSION CONTROL: RESILIENT SYNC)")
+    print("="*60)
+    metrics.enable_from_args()
+
+    # The registry's active model (MODEL_NAME without one): after a flip the
+    # records must be embedded with, and labelled as, the model searches use
+    from embedding_versions import active_model
+    model_name = active_model()
+    try:
+        init_model(model_name)
+    except Exception:
+        sys.exit(1)
+    print(f"🧬 Modelo: {model_name}")
+
     if not os.path.exists(INPUT_FILE):
         print(f"❌ Map not found: {INPUT_FILE}")
         return
@@ -209,8 +360,29 @@ def main():
         except:
             print("⚠️ Output corrupt, starting fresh.")
 
+    # Lexical (BM25) index is grown alongside the embeddings
+    lexical = LexicalIndex.load(INDEX_FILE)
+
     # Sort files for consistency
     files_to_process = [f for f in files_map if f['full_path'] not in processed_paths]
+
+    # Re-embed work list: those files are redone even if already processed
+    if "--worklist" in sys.argv[1:]:
+        if not os.path.exists(WORKLIST_FILE):
+            print(f"❌ Work list not found: {WORKLIST_FILE} (run drift_check.py first)")
+            return
+        with open(WORKLIST_FILE, "r", encoding="utf-8") as f:
+            worklist = json.load(f)
+        files_to_process = worklist["files"]
+        redo = {item['full_path'] for item in files_to_process}
+        # Orphans (deleted files, chunks past a file's new end) leave the output
+        # and the BM25 index too, or they stay searchable and get re-uploaded
+        orphans = set(worklist.get("delete_chunk_keys", []))
+        results = [r for r in results if r['full_path'] not in redo
+                   and chunk_doc_id(r['project'], r['path'], r['chunk_index']) not in orphans]
+        removed = sum(lexical.remove(key) for key in orphans)
+        print(f"🔁 Work list: {len(files_to_process)} archivos a re-vectorizar, "
+              f"{removed} fragmentos huérfanos quitados del índice léxico")
     
     # Process Loop
     # We process 1 by 1 (or small batch) to ensure granular logging
@@ -226,19 +398,23 @@ def main():
     current_batch_meta = []
     
     total = len(files_to_process)
+    chunk_workers = next((int(a.split("=", 1)[1]) for a in sys.argv[1:] if a.startswith("--chunk-workers=")), None)
     
-    for idx, file_item in enumerate(files_to_process):
+    # Reading and splitting run in worker processes, ahead of the API calls
+    # chunk_wait: time this loop spends waiting on the chunking processes
+    chunked = metrics.timed_iter("chunk_wait", iter_chunked_files(files_to_process, chunk_workers))
+    for idx, (file_item, chunks, read_error) in enumerate(chunked):
         rel_path = file_item['rel_path']
         
         try:
-            with open(file_item['full_path'], "r", encoding="utf-8", errors="ignore") as f:
-                content = f.read()
+            if read_error is not None:
+                raise OSError(read_error)
             
-            if not content.strip():
+            if not chunks:
                 log_sync_event(rel_path, "EXCLUDED", "EMPTY")
                 continue
-                
-            chunks = recursive_split_text(content, TARGET_CHUNK_SIZE)
+            metrics.count("files_chunked")
+            metrics.count("chunks", len(chunks))
             
             # Add chunks to batch
             for i, chunk in enumerate(chunks):
@@ -250,7 +426,8 @@ def main():
                     "path": rel_path,
                     "content": chunk,
                     "chunk_index": i,
-                    "total_chunks": len(chunks)
+                    "total_chunks": len(chunks),
+                    "model": model_name
                 })
                 
                 # If batch full, execute
@@ -258,17 +435,21 @@ def main():
                     print(f"[{idx+1}/{total}] Syncing Batch ({len(current_batch_texts)} chunks)...")
                     
                     try:
-                        vectors = get_batch_embeddings(current_batch_texts)
+                        vectors = get_batch_embeddings(current_batch_texts, model_name)
                         if vectors:
                             for j, meta in enumerate(current_batch_meta):
                                 meta['embedding'] = vectors[j]
                                 results.append(meta)
+                                lexical.add(chunk_doc_id(meta['project'], meta['path'], meta['chunk_index']),
+                                            meta['content'], meta['project'], meta['path'], meta['chunk_index'],
+                                            {"total_chunks": meta['total_chunks']})
                                 log_sync_event(meta['path'], "SUCCESS", f"CHUNK_{meta['chunk_index']}")
                             
                             # Explicit Delay as requested "Retraso de 2 segundos entre fragmentos"
                             # This might mean between *files* or *requests*. 
                             # Adding it here is safe.
-                            time.sleep(INTER_CHUNK_DELAY)
+                            with metrics.timer("inter_chunk_delay"):
+                                time.sleep(INTER_CHUNK_DELAY)
                             
                         else:
                             # Log failures
@@ -284,8 +465,11 @@ def main():
                     
                     # Periodic Save
                     if len(results) % 25 == 0:
-                        with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-                            json.dump(results, f, indent=2)
+                        with metrics.timer("json_save"):
+                            with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
+                                json.dump(results, f, indent=2)
+                        with metrics.timer("index_save"):
+                            lexical.save(INDEX_FILE)
 
         except Exception as e:
             log_sync_event(rel_path, "FAIL", f"READ_ERROR: {e}")
@@ -293,20 +477,28 @@ def main():
     # Final Batch
     if current_batch_texts:
         try:
-            vectors = get_batch_embeddings(current_batch_texts)
+            vectors = get_batch_embeddings(current_batch_texts, model_name)
             if vectors:
                 for j, meta in enumerate(current_batch_meta):
                     meta['embedding'] = vectors[j]
                     results.append(meta)
+                    lexical.add(chunk_doc_id(meta['project'], meta['path'], meta['chunk_index']),
+                                meta['content'], meta['project'], meta['path'], meta['chunk_index'],
+                                {"total_chunks": meta['total_chunks']})
                     log_sync_event(meta['path'], "SUCCESS", f"CHUNK_{meta['chunk_index']}")
         except Exception as e:
              for meta in current_batch_meta:
                 log_sync_event(meta['path'], "FAIL", str(e))
 
     # Final Save
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=2)
+    with metrics.timer("json_save"):
+        with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    with metrics.timer("index_save"):
+        lexical.save(INDEX_FILE)
     print("✅ Sync Complete.")
+    metrics.finish("generate_embeddings")
 
 if __name__ == "__main__":
-    main()
+    from profiling import run_main  # --profile
+    run_main("generate_embeddings", main)
@@ -0,0 +1,335 @@
+import fnmatch
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from memory_graph import MemoryGraph, BOTH, file_node_id, parse_file_node_id
+from hybrid_search import vector_search, normalize_extension, path_filter_to_like
+from lexical_index import split_path_pattern
+
+# Configuration
+SEED_HITS = 10              # vector hits used as seeds
+EXPANSION_HOPS = 2
+MAX_SUBGRAPH_NODES = 500    # bound on the expanded neighborhood
+PPR_DAMPING = 0.85
+PPR_ITERATIONS = 30
+PPR_TOLERANCE = 1e-6
+SEED_WEIGHT = 0.5           # final = SEED_WEIGHT * similarity + (1 - SEED_WEIGHT) * normalized ppr
+LATENCY_BUDGET_MS = 300
+
+Edge = Tuple[str, str, str, float]  # (source, relationship, target, confidence)
+
+class Deadline:
+    def __init__(self, budget_ms: float):
+        self.expires = time.perf_counter() + budget_ms / 1000
+
+    def remaining_ms(self) -> float:
+        return max(0.0, (self.expires - time.perf_counter()) * 1000)
+
+    def expired(self) -> bool:
+        return time.perf_counter() >= self.expires
+
+def set_statement_timeout(cursor, deadline: Deadline):
+    """Caps the next queries at what is left of the budget (at least 1ms)."""
+    cursor.execute("SELECT set_config('statement_timeout', %s, true);",
+                   (f"{max(1, int(deadline.remaining_ms()))}ms",))
+
+# ---------------------------------------------------------
+# NEIGHBORHOOD EXPANSION
+# ---------------------------------------------------------
+def neighborhood_from_graph(graph: MemoryGraph, seeds: List[str], hops: int = EXPANSION_HOPS,
+                            max_nodes: int = MAX_SUBGRAPH_NODES, deadline: Optional[Deadline] = None) -> List[Edge]:
+    """Bounded BFS over an in-process MemoryGraph (both directions)."""
+    seen = {s for s in seeds if s in graph.node_index}
+    frontier = list(seen)
+    edges: List[Edge] = []
+    for _ in range(hops):
+        next_frontier = []
+        for node in frontier:
+            for other, relationship, confidence in graph.neighbors(node, direction=BOTH):
+                edges.append((node, relationship, other, confidence))
+                if other not in seen and len(seen) < max_nodes:
+                    seen.add(other)
+                    next_frontier.append(other)
+            if deadline is not None and deadline.expired():
+                return edges
+        frontier = next_frontier
+    return edges
+
+def neighborhood_from_db(cursor, seeds: List[str], hops: int = EXPANSION_HOPS,
+                         max_nodes: int = MAX_SUBGRAPH_NODES, deadline: Optional[Deadline] = None) -> List[Edge]:
+    """Bounded BFS against memory_relations: one batched query per hop."""
+    seen = set(seeds)
+    frontier = list(seeds)
+    edges: List[Edge] = []
+    for _ in range(hops):
+        if not frontier or (deadline is not None and deadline.expired()):
+            break
+        if deadline is not None:
+            set_statement_timeout(cursor, deadline)
+        cursor.execute("""
+            SELECT source, relationship, target, coalesce(confidence, 1.0)
+            FROM memory_relations
+            WHERE source = ANY(%s) OR target = ANY(%s)
+            LIMIT %s
+        """, (frontier, frontier, max_nodes * 20))
+
+        next_frontier = []
+        for source, relationship, target, confidence in cursor.fetchall():
+            edges.append((source, relationship, target, confidence))
+            for node in (source, target):
+                if node not in seen and len(seen) < max_nodes:
+                    seen.add(node)
+                    next_frontier.append(node)
+        frontier = next_frontier
+    return edges
+
+# ---------------------------------------------------------
+# PERSONALIZED PAGERANK
+# ---------------------------------------------------------
+def personalized_pagerank(edges: List[Edge], seeds: Dict[str, float], damping: float = PPR_DAMPING,
+                          iterations: int = PPR_ITERATIONS, tolerance: float = PPR_TOLERANCE) -> Dict[str, float]:
+    """
+    Power iteration on the (undirected, confidence-weighted) subgraph,
+    restarting at the seeds in proportion to their scores.
+    """
+    total_seed = sum(seeds.values())
+    if total_seed <= 0:
+        return {}
+    teleport = {node: score / total_seed for node, score in seeds.items()}
+
+    adjacency: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    for source, _, target, confidence in edges:
+        if source == target or confidence <= 0:
+            continue
+        adjacency[source][target] += confidence
+        adjacency[target][source] += confidence
+    out_weight = {node: sum(nbrs.values()) for node, nbrs in adjacency.items()}
+
+    nodes = set(adjacency) | set(teleport)
+    rank = dict.fromkeys(nodes, 0.0)
+    rank.update(teleport)
+    for _ in range(iterations):
+        nxt = {node: (1 - damping) * teleport.get(node, 0.0) for node in nodes}
+        dangling = 0.0
+        for node, value in rank.items():
+            if not value:
+                continue
+            weight = out_weight.get(node)
+            if not weight:
+                dangling += value
+                continue
+            share = damping * value / weight
+            for other, w in adjacency[node].items():
+                nxt[other] += share * w
+        if dangling:
+            for node, t in teleport.items():
+                nxt[node] += damping * dangling * t
+        delta = sum(abs(nxt[n] - rank[n]) for n in nodes)
+        rank = nxt
+        if delta < tolerance:
+            break
+    return rank
+
+# ---------------------------------------------------------
+# PIPELINE
+# ---------------------------------------------------------
+def file_in_scope(key: Tuple[str, str], project: Optional[str] = None, path: Optional[str] = None,
+                  extension: Optional[str] = None) -> bool:
+    """The project / path / extension filters, checked on a (project, file_path) graph node."""
+    file_project, file_path = key
+    if project is not None and file_project != project:
+        return False
+    if extension is not None and os.path.splitext(file_path)[1].lower() != normalize_extension(extension):
+        return False
+    if path is not None:
+        prefix, glob = split_path_pattern(path)
+        if not file_path.startswith(prefix) or (glob is not None and not fnmatch.fnmatchcase(file_path, glob)):
+            return False
+    return True
+
+def fetch_best_chunks(cursor, vector: List[float], files: List[Tuple[str, str]],
+                      model: Optional[str] = None, project: Optional[str] = None,
+                      path: Optional[str] = None, extension: Optional[str] = None,
+                      doc_type: Optional[str] = None) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """
+    One query: the chunk most similar to the query for each file (in
+    `model`'s column), restricted by the same filters as the seed search.
+    """
+    if not files:
+        return {}
+    from psycopg2 import sql
+    from embedding_versions import vector_column
+    column = sql.Identifier(vector_column(cursor, model))
+
+    predicates = [sql.SQL("(project, file_path) IN (SELECT * FROM unnest(%s::text[], %s::text[]))")]
+    params = [[f[0] for f in files], [f[1] for f in files]]
+    if project is not None:
+        predicates.append(sql.SQL("project = %s"))
+        params.append(project)
+    if path is not None:
+        predicates.append(sql.SQL("file_path LIKE %s"))
+        params.append(path_filter_to_like(path))
+    if extension is not None:
+        predicates.append(sql.SQL("file_ext = %s"))
+        params.append(normalize_extension(extension))
+    if doc_type is not None:
+        predicates.append(sql.SQL("metadata->>'type' = %s"))
+        params.append(doc_type)
+
+    cursor.execute(sql.SQL("""
+        SELECT DISTINCT ON (project, file_path)
+               id, project, file_path, content, metadata, 1 - ({column} <=> %s::vector) AS similarity
+        FROM codebase_embeddings
+        WHERE {column} IS NOT NULL AND {predicates}
+        ORDER BY project, file_path, {column} <=> %s::vector
+    """).format(column=column, predicates=sql.SQL(" AND ").join(predicates)), [vector, *params, vector])
+
+    chunks = {}
+    for r in cursor.fetchall():
+        metadata = r[4] or {}
+        chunks[(r[1], r[2])] = {
+            "id": r[0], "project": r[1], "file_path": r[2], "content": r[3],
+            "chunk_index": metadata.get("chunk_index"), "total_chunks": metadata.get("total_chunks"),
+            "similarity": r[5]
+        }
+    return chunks
+
+def graph_rag_search(cursor, vector: List[float], graph: Optional[MemoryGraph] = None,
+                     match_count: int = 5, match_threshold: float = 0.3,
+                     budget_ms: float = LATENCY_BUDGET_MS, model: Optional[str] = None,
+                     **filters) -> Dict[str, Any]:
+    """
+    Vector hits -> file nodes -> bounded expansion through memory_relations
+    -> personalized PageRank -> re-ranked file hits. Uses the in-process
+    graph when given, otherwise one batched query per hop. Stages that
+    would overrun `budget_ms` are skipped and the best ranking so far is
+    returned. `model` is the one that embedded `vector`.
+    """
+    deadline = Deadline(budget_ms)
+    timings = {}
+
+    start = time.perf_counter()
+    hits = vector_search(cursor, vector, match_threshold, SEED_HITS, model=model, **filters)
+    timings["vector_ms"] = (time.perf_counter() - start) * 1000
+
+    best_hit: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for hit in hits:
+        key = (hit["project"], hit["file_path"])
+        if key not in best_hit:
+            best_hit[key] = hit
+    seeds = {file_node_id(*key): max(hit["similarity"], 1e-6) for key, hit in best_hit.items()}
+
+    edges: List[Edge] = []
+    if seeds and not deadline.expired():
+        start = time.perf_counter()
+        if graph is not None:
+            edges = neighborhood_from_graph(graph, list(seeds), deadline=deadline)
+        else:
+            edges = neighborhood_from_db(cursor, list(seeds), deadline=deadline)
+        timings["expand_ms"] = (time.perf_counter() - start) * 1000
+
+    ranks = personalized_pagerank(edges, seeds) if edges else {}
+    top_rank = max(ranks.values(), default=0.0) or 1.0
+
+    # Score every file node that was reached; non-file nodes are returned as concepts
+    file_scores: Dict[Tuple[str, str], float] = {}
+    concepts = []
+    for node, rank in ranks.items():
+        parsed = parse_file_node_id(node)
+        if parsed is None:
+            concepts.append((node, rank / top_rank))
+            continue
+        similarity = best_hit[parsed]["similarity"] if parsed in best_hit else 0.0
+        file_scores[parsed] = SEED_WEIGHT * similarity + (1 - SEED_WEIGHT) * rank / top_rank
+    for key, hit in best_hit.items():
+        file_scores.setdefault(key, SEED_WEIGHT * hit["similarity"])
+
+    # Expansion can walk into other projects / paths: only files the filters
+    # allow are ranked (doc_type is only known per chunk, so fetch_best_chunks checks it)
+    file_scores = {key: score for key, score in file_scores.items()
+                   if key in best_hit or file_in_scope(key, filters.get("project"), filters.get("path"),
+                                                       filters.get("extension"))}
+
+    ranked = sorted(file_scores.items(), key=lambda item: item[1], reverse=True)[:match_count]
+
+    # Files reached only through the graph need their best chunk: one batched query
+    missing = [key for key, _ in ranked if key not in best_hit]
+    if missing and not deadline.expired():
+        start = time.perf_counter()
+        set_statement_timeout(cursor, deadline)
+        try:
+            best_hit.update(fetch_best_chunks(cursor, vector, missing, model, **filters))
+        except Exception as e:
+            print(f"   ⚠️ Skipped graph-only files: {e}")
+            cursor.connection.rollback()
+        timings["fetch_ms"] = (time.perf_counter() - start) * 1000
+
+    seeded = {(h["project"], h["file_path"]) for h in hits}
+    results = []
+    for key, score in ranked:
+        if key in best_hit:
+            hit = dict(best_hit[key])
+            hit["graph_score"] = score
+            hit["via_graph"] = key not in seeded
+            results.append(hit)
+
+    concepts.sort(key=lambda item: item[1], reverse=True)
+    return {
+        "hits": results,
+        "concepts": concepts[:10],
+        "subgraph_edges": len(edges),
+        "timings": timings,
+        "budget_exceeded": deadline.expired()
+    }
+
+def main():
+    print("="*60)
+    print("🕸️ GRAPHRAG SEARCH (VECTOR + MEMORY GRAPH)")
+    print("="*60)
+
+    args = sys.argv[1:]
+    query = " ".join(a for a in args if not a.startswith("--"))
+    if not query:
+        print("Usage: python graph_rag.py [--in-memory] <query>")
+        return
+
+    from generate_embeddings import get_batch_embeddings
+    from db import connect_db
+    from embedding_versions import active_model
+
+    conn = connect_db()
+    if not conn:
+        sys.exit(1)
+
+    try:
+        graph = None
+        if "--in-memory" in args:
+            graph = MemoryGraph()
+            graph.load(conn)
+            print(f"📥 Graph loaded: {graph.node_count} nodes / {graph.edge_count} relations")
+
+        cursor = conn.cursor()
+        model = active_model(cursor)
+        vectors = get_batch_embeddings([query], model)
+        if not vectors:
+            print(f"❌ No embedding for the query ({model}); check the Vertex credentials / quota")
+            sys.exit(1)
+        vector = vectors[0]
+        start = time.perf_counter()
+        result = graph_rag_search(cursor, vector, graph, model=model)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        print(f"\n❓ {query} ({elapsed_ms:.1f}ms, {result['subgraph_edges']} edges expanded)")
+        for hit in result["hits"]:
+            origin = "🕸️" if hit["via_graph"] else "🎯"
+            print(f"   {origin} ({hit['graph_score']:.4f}) [{hit['project']}] {hit['file_path']}")
+        if result["concepts"]:
+            print("   💡 Related: " + ", ".join(node for node, _ in result["concepts"]))
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+🔌 KEEP-ALIVE HTTP CLIENT WITH PER-PHASE TIMINGS
+
+Synchronous client for the smoke tests: one persistent connection is
+reused across requests, and every response reports how long was spent
+setting the connection up (TCP + TLS, zero when reused) separately from
+the time the server took to answer (request sent -> response headers).
+
+HTTP/1.1 uses the standard library. HTTP/2 is optional and needs
+`pip install httpx[http2]`.
+
+    with make_client("https://lavaseco-app-xxxxx-uc.a.run.app", http2=True) as client:
+        r = client.get("/api/health")
+        print(r["setup_ms"], r["server_ms"], r["total_ms"])
+"""
+
+import http.client
+import json
+import socket
+import ssl
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+try:
+    import httpx
+    HAS_HTTPX = True
+except ImportError:
+    HAS_HTTPX = False
+
+# Configuration
+REQUEST_TIMEOUT = 30.0
+USER_AGENT = "lavaseco-smoke/1.0"
+
+def _decode_body(data: bytes) -> Any:
+    try:
+        return json.loads(data) if data else None
+    except ValueError:
+        return None
+
+def _result(status: int, body: bytes, version: str, reused: bool,
+            connect_ms: float, tls_ms: float, server_ms: float, total_ms: float) -> Dict[str, Any]:
+    return {
+        "status": status,
+        "body": _decode_body(body),
+        "http_version": version,
+        "reused": reused,
+        "connect_ms": connect_ms,
+        "tls_ms": tls_ms,
+        "setup_ms": connect_ms + tls_ms,
+        "server_ms": server_ms,
+        "total_ms": total_ms
+    }
+
+# ---------------------------------------------------------
+# HTTP/1.1 (standard library)
+# ---------------------------------------------------------
+class KeepAliveClient:
+    """
+    One persistent HTTP/1.1 connection. It is opened by hand so TCP and
+    TLS can be timed, and only reopened when the server closes it.
+    """
+
+    http_version = "HTTP/1.1"
+
+    def __init__(self, base_url: str, timeout: float = REQUEST_TIMEOUT):
+        parts = urlsplit(base_url)
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.https else 80)
+        self.host_header = parts.netloc
+        self.base_path = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.ssl = ssl.create_default_context() if self.https else None
+        self.conn: Optional[http.client.HTTPConnection] = None
+        self.connects = 0
+
+    def _connect(self):
+        start = time.perf_counter()
+        sock = socket.create_connection((self.host, self.port), self.timeout)
+        connected = time.perf_counter()
+        if self.ssl:
+            sock = self.ssl.wrap_socket(sock, server_hostname=self.host)
+        handshaken = time.perf_counter()
+
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        conn.sock = sock
+        self.conn = conn
+        self.connects += 1
+        return (connected - start) * 1000, (handshaken - connected) * 1000
+
+    def _exchange(self, method: str, path: str, body: Optional[bytes]):
+        headers = {"Host": self.host_header, "User-Agent": USER_AGENT,
+                   "Accept": "application/json", "Connection": "keep-alive"}
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+        sent = time.perf_counter()
+        self.conn.request(method, self.base_path + path, body=body, headers=headers)
+        response = self.conn.getresponse()
+        server_ms = (time.perf_counter() - sent) * 1000
+        data = response.read()
+        if response.will_close:
+            self.close()
+        return response.status, data, server_ms
+
+    def request(self, method: str, path: str, payload: Any = None) -> Dict[str, Any]:
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        start = time.perf_counter()
+        connect_ms = tls_ms = 0.0
+        reused = self.conn is not None and self.conn.sock is not None
+        if not reused:
+            connect_ms, tls_ms = self._connect()
+        try:
+            status, data, server_ms = self._exchange(method, path, body)
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            if not reused:
+                raise
+            # The server dropped the idle connection (keep-alive timeout): retry once on a new one
+            self.close()
+            reused = False
+            connect_ms, tls_ms = self._connect()
+            status, data, server_ms = self._exchange(method, path, body)
+        except BaseException:
+            self.close()
+            raise
+        total_ms = (time.perf_counter() - start) * 1000
+        return _result(status, data, self.http_version, reused, connect_ms, tls_ms, server_ms, total_ms)
+
+    def get(self, path: str) -> Dict[str, Any]:
+        return self.request("GET", path)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ---------------------------------------------------------
+# HTTP/2 (optional: httpx + h2)
+# ---------------------------------------------------------
+class Http2Client:
+    """
+    httpx client with HTTP/2 negotiated over ALPN. Phases come from
+    httpcore's trace events, so a reused connection shows no setup.
+    """
+
+    def __init__(self, base_url: str, timeout: float = REQUEST_TIMEOUT):
+        self.client = httpx.Client(base_url=base_url.rstrip("/"), http2=True, timeout=timeout,
+                                   headers={"User-Agent": USER_AGENT, "Accept": "application/json"})
+        self.connects = 0
+
+    def request(self, method: str, path: str, payload: Any = None) -> Dict[str, Any]:
+        events: Dict[str, float] = {}
+
+        def trace(name: str, info: Dict[str, Any]):
+            events[name] = time.perf_counter()
+
+        start = time.perf_counter()
+        response = self.client.request(method, path, json=payload, extensions={"trace": trace})
+        total_ms = (time.perf_counter() - start) * 1000
+
+        def span(begin: str, end: str) -> float:
+            if begin in events and end in events:
+                return (events[end] - events[begin]) * 1000
+            return 0.0
+
+        reused = "connection.connect_tcp.started" not in events
+        if not reused:
+            self.connects += 1
+        prefix = "http2" if response.http_version == "HTTP/2" else "http11"
+        return _result(
+            response.status_code, response.content, response.http_version, reused,
+            span("connection.connect_tcp.started", "connection.connect_tcp.complete"),
+            span("connection.start_tls.started", "connection.start_tls.complete"),
+            span(f"{prefix}.send_request_headers.started", f"{prefix}.receive_response_headers.complete"),
+            total_ms
+        )
+
+    def get(self, path: str) -> Dict[str, Any]:
+        return self.request("GET", path)
+
+    def close(self):
+        self.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def make_client(base_url: str, http2: bool = False, timeout: float = REQUEST_TIMEOUT):
+    """HTTP/2 when asked for and available, otherwise keep-alive HTTP/1.1."""
+    if http2:
+        if not HAS_HTTPX:
+            print("⚠️ httpx no instalado (pip install httpx[http2]); usando HTTP/1.1 keep-alive")
+        else:
+            try:
+                return Http2Client(base_url, timeout)
+            except ImportError:
+                print("⚠️ Paquete h2 no instalado (pip install httpx[http2]); usando HTTP/1.1 keep-alive")
+    return KeepAliveClient(base_url, timeout)
@@ -0,0 +1,212 @@
+import fnmatch
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import metrics
+from lexical_index import LexicalIndex, INDEX_FILE, split_path_pattern
+from context_pack import assemble_context, render_context
+
+# Reciprocal Rank Fusion constant (Cormack et al. use 60)
+RRF_K = 60
+CANDIDATES_PER_RANKER = 20
+
+# ANN recall knobs forwarded to match_codebase (pgvector defaults: 1 / 40)
+IVFFLAT_PROBES = 10
+HNSW_EF_SEARCH = 40
+
+def normalize_extension(extension: Optional[str]) -> Optional[str]:
+    if not extension:
+        return None
+    extension = extension.lower()
+    return extension if extension.startswith(".") else "." + extension
+
+def path_filter_to_like(pattern: Optional[str]) -> Optional[str]:
+    """
+    Converts a path prefix (`src/lib/billing/`) or glob (`src/**/*.tsx`) to
+    a LIKE pattern. Bracket classes are not expressible in LIKE, so for
+    those only the literal prefix is sent and the caller re-checks the glob.
+    """
+    if not pattern:
+        return None
+    prefix, glob = split_path_pattern(pattern)
+    if glob is None or "[" in glob:
+        glob = prefix + "*"
+
+    like = []
+    for ch in glob:
+        if ch in "\\%_":
+            like.append("\\" + ch)
+        elif ch == "*":
+            if not like or like[-1] != "%":
+                like.append("%")
+        elif ch == "?":
+            like.append("_")
+        else:
+            like.append(ch)
+    return "".join(like)
+
+def vector_search(cursor, vector: List[float], match_threshold: float = 0.3,
+                  match_count: int = CANDIDATES_PER_RANKER, project: Optional[str] = None,
+                  path: Optional[str] = None, extension: Optional[str] = None,
+                  doc_type: Optional[str] = None, probes: int = IVFFLAT_PROBES,
+                  ef_search: int = HNSW_EF_SEARCH, model: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Runs the `match_codebase` RPC and returns the rows as dicts. Filters are
+    evaluated inside the function, against the filter indexes; `probes` /
+    `ef_search` trade recall for latency on the ANN index. `model` is the
+    one that embedded `vector` (embedding_versions.active_model), so the
+    search uses that model's column.
+    """
+    from db import execute_prepared
+    # Prepared once per pooled connection; later searches skip parse/plan
+    execute_prepared(cursor, "hybrid_match_codebase", """
+        select id, project, file_path, content, metadata, similarity
+        from match_codebase($1::vector, $2, $3, $4, $5, $6, $7, $8, $9, $10)
+    """, (vector, match_threshold, match_count, project, path_filter_to_like(path),
+          normalize_extension(extension), doc_type, probes, ef_search, model))
+
+    hits = []
+    for r in cursor.fetchall():
+        metadata = r[4] or {}
+        hits.append({
+            "id": r[0],
+            "project": r[1],
+            "file_path": r[2],
+            "content": r[3],
+            "chunk_index": metadata.get("chunk_index"),
+            "total_chunks": metadata.get("total_chunks"),
+            "similarity": r[5]
+        })
+    if path and "[" in path:
+        hits = [h for h in hits if fnmatch.fnmatchcase(h["file_path"], path)]
+    return hits
+
+def lexical_search(index: LexicalIndex, query: str, limit: int = CANDIDATES_PER_RANKER,
+                   project: Optional[str] = None, path: Optional[str] = None,
+                   extension: Optional[str] = None, doc_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": doc["id"],
+            "project": doc["project"],
+            "file_path": doc["path"],
+            "content": doc["content"],
+            "chunk_index": doc["chunk_index"],
+            "total_chunks": doc["metadata"].get("total_chunks"),
+            "bm25": score
+        }
+        for doc, score in index.search(query, limit, project, path, normalize_extension(extension), doc_type)
+    ]
+
+def hit_key(hit: Dict[str, Any]):
+    # DB ids and index ids live in different spaces, so a chunk is identified
+    # by where it came from and what it contains.
+    return (hit["project"], hit["file_path"], hit["content"])
+
+def reciprocal_rank_fusion(rankings: Iterable[List[Dict[str, Any]]], k: int = RRF_K,
+                           key: Callable[[Dict[str, Any]], Any] = hit_key) -> List[Dict[str, Any]]:
+    """
+    Merges several ranked lists: score(d) = sum(1 / (k + rank_i(d))).
+    Fields from every list a hit appears in are merged into one dict.
+    """
+    scores: Dict[Any, float] = defaultdict(float)
+    merged: Dict[Any, Dict[str, Any]] = {}
+
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking, start=1):
+            hit_id = key(hit)
+            scores[hit_id] += 1.0 / (k + rank)
+            if hit_id in merged:
+                merged[hit_id].update({f: v for f, v in hit.items() if f not in merged[hit_id]})
+            else:
+                merged[hit_id] = dict(hit)
+
+    fused = []
+    for hit_id, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+        hit = merged[hit_id]
+        hit["rrf_score"] = score
+        fused.append(hit)
+    return fused
+
+def hybrid_search(query: str, index: LexicalIndex, cursor=None, vector: Optional[List[float]] = None,
+                  match_count: int = 5, match_threshold: float = 0.3,
+                  candidates: int = CANDIDATES_PER_RANKER, model: Optional[str] = None,
+                  **filters) -> List[Dict[str, Any]]:
+    """
+    BM25 + vector retrieval fused with RRF. Without a cursor/vector it
+    degrades to lexical-only search, which needs neither Vertex nor the DB.
+    `filters` (project, path, extension, doc_type) scope both rankers.
+    """
+    with metrics.timer("search_lexical"):
+        rankings = [lexical_search(index, query, candidates, **filters)]
+    if cursor is not None and vector is not None:
+        with metrics.timer("search_vector"):
+            rankings.append(vector_search(cursor, vector, match_threshold, candidates, model=model, **filters))
+    with metrics.timer("search_fusion"):
+        return reciprocal_rank_fusion(rankings)[:match_count]
+
+def parse_filter_args(args: List[str]) -> Dict[str, str]:
+    """Reads --project=, --path=, --ext= and --type= from the command line."""
+    names = {"--project": "project", "--path": "path", "--ext": "extension", "--type": "doc_type"}
+    filters = {}
+    for arg in args:
+        flag, _, value = arg.partition("=")
+        if flag in names and value:
+            filters[names[flag]] = value
+    return filters
+
+def main():
+    print("="*60)
+    print("🔀 HYBRID SEARCH (BM25 + VECTOR)")
+    print("="*60)
+
+    args = sys.argv[1:]
+    lexical_only = "--lexical-only" in args
+    filters = parse_filter_args(args)
+    query = " ".join(a for a in args if not a.startswith("--"))
+    if not query:
+        print("Usage: python hybrid_search.py [--lexical-only] [--context] [--project=] [--path=] [--ext=] [--type=] <query>")
+        return
+
+    index = LexicalIndex.load(INDEX_FILE)
+    print(f"📚 Lexical index: {len(index)} chunks")
+
+    conn = None
+    cursor = None
+    vector = None
+    model = None
+    if not lexical_only:
+        try:
+            from generate_embeddings import get_batch_embeddings
+            from db import connect_db
+            from embedding_versions import active_model
+            conn = connect_db()
+            cursor = conn.cursor() if conn else None
+            model = active_model(cursor) if cursor else None
+            vectors = get_batch_embeddings([query], model)
+            vector = vectors[0] if vectors else None
+        except Exception as e:
+            print(f"⚠️ Vector search unavailable, using lexical only: {e}")
+
+    try:
+        start = time.perf_counter()
+        match_count = 20 if "--context" in args else 5
+        hits = hybrid_search(query, index, cursor, vector, match_count, model=model, **filters)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        print(f"\n❓ {query} ({elapsed_ms:.1f}ms)")
+        if "--context" in args:
+            print(render_context(assemble_context(hits)))
+            return
+        for hit in hits:
+            print(f"   👉 ({hit['rrf_score']:.4f}) [{hit['project']}] {hit['file_path']}")
+            snippet = hit['content'][:200].replace('\n', ' ')
+            print(f"      Context: {snippet}...")
+    finally:
+        if conn:
+            conn.close()
+
+if __name__ == "__main__":
+    from profiling import run_main  # --profile
+    run_main("hybrid_search", main)
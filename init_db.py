@@ -1,24 +1,120 @@
-import os
-import psycopg2
+import sys
 
-# Configuration from .env
-ENV_PATH = r'c:\Users\rmend\Desktop\LAVASECO ORQUIDEAS\lavaseco-app\.env'
+from db import connect_db
 
-def load_env(path: str):
-    env = {}
-    if os.path.exists(path):
-        with open(path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                if '=' in line:
-                    k, v = line.split('=', 1)
-                    env[k.strip()] = v.strip().strip('"').strip("'")
-    return env
+def create_schema(cursor, partitioned: bool = False):
+    """Create (or migrate) codebase_embeddings, its indexes and the model registry.
+
+    Unqualified names resolve through the session search_path, so bench_latency.py
+    builds the same schema inside a scratch schema."""
+    # 2. Create Table
+    print("🏗️ Creating table 'codebase_embeddings'...")
+    create_table_sql = """
+    CREATE TABLE IF NOT EXISTS codebase_embeddings (
+      id bigint primary key generated always as identity,
+      project text not null,
+      file_path text not null,
+      content text not null,
+      embedding vector(768),
+      metadata jsonb,
+      created_at timestamptz default now(),
+      file_ext text generated always as (lower(substring(file_path from '\\.[^./]+$'))) stored,
+      chunk_key text,
+      content_hash text
+    );
+    """
+    # --partitioned: a fresh database starts with one partition per project (partition_embeddings.py)
+    from partition_embeddings import create_parent_indexes, create_partitioned_table, ensure_ann_indexes, is_partitioned
+    cursor.execute("SELECT to_regclass('codebase_embeddings') IS NULL;")
+    if cursor.fetchone()[0] and partitioned:
+        create_partitioned_table(cursor)
+    else:
+        cursor.execute(create_table_sql)
+    partitioned = is_partitioned(cursor)
+
+    # Tables created before file_ext existed
+    cursor.execute("""
+        ALTER TABLE codebase_embeddings
+        ADD COLUMN IF NOT EXISTS file_ext text
+        GENERATED ALWAYS AS (lower(substring(file_path from '\\.[^./]+$'))) STORED;
+    """)
+
+
+    # Stable identity per chunk (project/path#chunk_index) + sha256 of its
+    # content, so re-ingestion can upsert and skip unchanged chunks.
+    print("🔑 Adding chunk_key / content_hash...")
+    cursor.execute("""
+        ALTER TABLE codebase_embeddings
+        ADD COLUMN IF NOT EXISTS chunk_key text,
+        ADD COLUMN IF NOT EXISTS content_hash text;
+    """)
+    # Rows written before the key existed: drop re-run duplicates (keep the
+    # oldest), then backfill both columns.
+    cursor.execute("""
+        DELETE FROM codebase_embeddings a
+        USING codebase_embeddings b
+        WHERE a.chunk_key IS NULL AND b.chunk_key IS NULL
+          AND a.project = b.project
+          AND a.file_path = b.file_path
+          AND coalesce(a.metadata->>'chunk_index', '0') = coalesce(b.metadata->>'chunk_index', '0')
+          AND a.id > b.id;
+    """)
+    cursor.execute("""
+        UPDATE codebase_embeddings
+        SET chunk_key = project || '/' || file_path || '#' || coalesce(metadata->>'chunk_index', '0'),
+            content_hash = encode(sha256(convert_to(content, 'UTF8')), 'hex')
+        WHERE chunk_key IS NULL;
+    """)
+    if partitioned:
+        # Unique indexes must include the partition key; ANN indexes live on each partition
+        print("⚡ Creating indexes (per partition)...")
+        create_parent_indexes(cursor)
+        for partition, lists in ensure_ann_indexes(cursor).items():
+            print(f"   {partition}: ivfflat lists = {lists}")
+    else:
+        # Arbiter for ON CONFLICT (project, chunk_key), the same key the partitioned
+        # layout uses (chunk_key starts with the project, so it is unique on its own too)
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS codebase_embeddings_project_chunk_key_idx
+            ON codebase_embeddings (project, chunk_key);
+        """)
+    
+        # 3. Create Index (IVFFlat)
+        print("⚡ Creating index...")
+        # Check if index exists or just create if not exists using duplicate safe syntax?
+        # Standard SQL doesn't have CREATE INDEX IF NOT EXISTS in all versions, but PG supports it.
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS codebase_embeddings_embedding_idx 
+            ON codebase_embeddings 
+            USING ivfflat (embedding vector_cosine_ops)
+            WITH (lists = 100);
+        """)
+
+        # 4. Filter Indexes (scoped searches by project / path prefix / extension / type)
+        print("🗂️ Creating filter indexes...")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS codebase_embeddings_project_path_idx
+            ON codebase_embeddings (project, file_path text_pattern_ops);
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS codebase_embeddings_path_idx
+            ON codebase_embeddings (file_path text_pattern_ops);
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS codebase_embeddings_ext_idx
+            ON codebase_embeddings (file_ext);
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS codebase_embeddings_type_idx
+            ON codebase_embeddings ((metadata->>'type'));
+        """)
+    
+
+    # 5. Model registry (embedding_versions.py): the current model becomes version 1
+    print("🔁 Registering embedding model versions...")
+    from embedding_versions import ensure_registry
+    ensure_registry(cursor)
 
-config = load_env(ENV_PATH)
-DB_URL = config.get('DATABASE_URL')
 
 def main():
     print("="*60)
@@ -26,7 +122,9 @@ def main():
     print("="*60)
     
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = connect_db()
+        if conn is None:
+            return
         cursor = conn.cursor()
         
         # 1. Enable Vector Extension (might fail if no permissions, but usually enabled)
@@ -36,33 +134,12 @@ def main():
         except Exception as e:
             print(f"   ⚠️ Could not create extension (might already exist): {e}")
             conn.rollback()
+
+        # Index builds on a full table can outlast the pool's statement timeout
+        cursor.execute("SET LOCAL statement_timeout = 0;")
         
-        # 2. Create Table
-        print("🏗️ Creating table 'codebase_embeddings'...")
-        create_table_sql = """
-        CREATE TABLE IF NOT EXISTS codebase_embeddings (
-          id bigint primary key generated always as identity,
-          project text not null,
-          file_path text not null,
-          content text not null,
-          embedding vector(768),
-          metadata jsonb,
-          created_at timestamptz default now()
-        );
-        """
-        cursor.execute(create_table_sql)
-        
-        # 3. Create Index (IVFFlat)
-        print("⚡ Creating index...")
-        # Check if index exists or just create if not exists using duplicate safe syntax?
-        # Standard SQL doesn't have CREATE INDEX IF NOT EXISTS in all versions, but PG supports it.
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS codebase_embeddings_embedding_idx 
-            ON codebase_embeddings 
-            USING ivfflat (embedding vector_cosine_ops)
-            WITH (lists = 100);
-        """)
-        
+        create_schema(cursor, "--partitioned" in sys.argv[1:])
+
         conn.commit()
         print("✅ Database initialized successfully.")
         
@@ -0,0 +1,359 @@
+import bisect
+import fnmatch
+import heapq
+import itertools
+import json
+import math
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Configuration
+INDEX_FILE = "codebase_lexical_index.json"
+EMBEDDINGS_FILE = "codebase_embeddings.json"
+
+# BM25 parameters (standard Okapi defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+MIN_TOKEN_LEN = 2
+
+# ---------------------------------------------------------
+# CODE-AWARE TOKENIZER
+# ---------------------------------------------------------
+_IDENTIFIER_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits code into lowercase terms. Every identifier is kept whole
+    (`ticketNumber` -> `ticketnumber`) and also broken into its
+    camelCase / snake_case parts (`ticket`, `number`), so exact identifier
+    queries score higher than documents that only share the words.
+    """
+    tokens = []
+    for ident in _IDENTIFIER_RE.findall(text):
+        whole = ident.strip('_').lower()
+        if len(whole) >= MIN_TOKEN_LEN:
+            tokens.append(whole)
+
+        parts = []
+        for piece in ident.split('_'):
+            if piece:
+                parts.extend(_CAMEL_RE.findall(piece))
+        if len(parts) > 1:
+            for part in parts:
+                part = part.lower()
+                if len(part) >= MIN_TOKEN_LEN:
+                    tokens.append(part)
+    return tokens
+
+def chunk_doc_id(project: str, path: str, chunk_index: int) -> str:
+    return f"{project}/{path}#{chunk_index}"
+
+# ---------------------------------------------------------
+# BM25 INVERTED INDEX
+# ---------------------------------------------------------
+def split_path_pattern(pattern: str) -> Tuple[str, Optional[str]]:
+    """
+    Turns a path filter into (literal_prefix, glob). A pattern without
+    wildcards is a plain prefix (`src/lib/billing/`); otherwise the
+    literal part before the first wildcard narrows the range and the
+    full glob is matched on what is left.
+    """
+    cut = len(pattern)
+    for ch in "*?[":
+        pos = pattern.find(ch)
+        if pos != -1:
+            cut = min(cut, pos)
+    if cut == len(pattern):
+        return pattern, None
+    return pattern[:cut], pattern
+
+class _Shard:
+    """Postings and filter partitions for a single project."""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)  # term -> {slot: tf}
+        self.by_ext: Dict[str, Set[int]] = defaultdict(set)
+        self.by_type: Dict[str, Set[int]] = defaultdict(set)
+        self.paths: List[Tuple[str, int]] = []  # sorted (path, slot)
+
+    def slots_with_path(self, pattern: str) -> Set[int]:
+        prefix, glob = split_path_pattern(pattern)
+        start = bisect.bisect_left(self.paths, (prefix, -1))
+        found = set()
+        for path, slot in itertools.islice(self.paths, start, None):
+            if not path.startswith(prefix):
+                break
+            if glob is None or fnmatch.fnmatchcase(path, glob):
+                found.add(slot)
+        return found
+
+class LexicalIndex:
+    """
+    In-memory BM25 index over chunk content. Documents can be added,
+    replaced or removed one at a time, so the index grows together with
+    the embedding store instead of being rebuilt from scratch.
+
+    Postings are sharded by project and each shard keeps extension, type
+    and sorted-path partitions, so filtered searches only touch the
+    slots that can match.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.docs: List[Optional[Dict]] = []       # slot -> document (None when removed)
+        self.doc_lens: List[int] = []
+        self.doc_slots: Dict[str, int] = {}        # doc_id -> slot
+        self.free_slots: List[int] = []
+        self.shards: Dict[str, _Shard] = {}
+        self.total_len = 0
+
+    def __len__(self):
+        return len(self.doc_slots)
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(set().union(*(shard.postings.keys() for shard in self.shards.values())))
+
+    def add(self, doc_id: str, content: str, project: str = "", path: str = "",
+            chunk_index: int = 0, metadata: Optional[Dict] = None, tf: Optional[Dict[str, int]] = None):
+        """Adds (or replaces) one chunk."""
+        shard, slot = self._insert(doc_id, content, project, path, chunk_index, metadata, tf)
+        bisect.insort(shard.paths, (path, slot))
+
+    def _insert(self, doc_id: str, content: str, project: str, path: str, chunk_index: int,
+                metadata: Optional[Dict], tf: Optional[Dict[str, int]]) -> Tuple[_Shard, int]:
+        """Everything add() does except placing the path in the shard's sorted list."""
+        if doc_id in self.doc_slots:
+            self.remove(doc_id)
+
+        if tf is None:
+            tf = defaultdict(int)
+            for term in tokenize(content):
+                tf[term] += 1
+
+        metadata = metadata or {}
+        doc = {
+            "id": doc_id,
+            "project": project,
+            "path": path,
+            "chunk_index": chunk_index,
+            "content": content,
+            "metadata": metadata,
+            "tf": dict(tf)
+        }
+        length = sum(tf.values())
+
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.docs[slot] = doc
+            self.doc_lens[slot] = length
+        else:
+            slot = len(self.docs)
+            self.docs.append(doc)
+            self.doc_lens.append(length)
+
+        self.doc_slots[doc_id] = slot
+        self.total_len += length
+
+        shard = self.shards.get(project)
+        if shard is None:
+            shard = self.shards[project] = _Shard()
+        for term, freq in tf.items():
+            shard.postings[term][slot] = freq
+        shard.by_ext[os.path.splitext(path)[1].lower()].add(slot)
+        shard.by_type[metadata.get("type", "")].add(slot)
+        return shard, slot
+
+    def remove(self, doc_id: str) -> bool:
+        slot = self.doc_slots.pop(doc_id, None)
+        if slot is None:
+            return False
+
+        doc = self.docs[slot]
+        shard = self.shards[doc["project"]]
+        for term in doc["tf"]:
+            posting = shard.postings.get(term)
+            if posting is not None:
+                posting.pop(slot, None)
+                if not posting:
+                    del shard.postings[term]
+        shard.by_ext[os.path.splitext(doc["path"])[1].lower()].discard(slot)
+        shard.by_type[doc["metadata"].get("type", "")].discard(slot)
+        pos = bisect.bisect_left(shard.paths, (doc["path"], slot))
+        if pos < len(shard.paths) and shard.paths[pos] == (doc["path"], slot):
+            del shard.paths[pos]
+
+        self.total_len -= self.doc_lens[slot]
+        self.docs[slot] = None
+        self.doc_lens[slot] = 0
+        self.free_slots.append(slot)
+        return True
+
+    def _allowed_slots(self, shard: _Shard, path: Optional[str], extension: Optional[str],
+                       doc_type: Optional[str]) -> Optional[Set[int]]:
+        """Intersects the filter partitions of a shard; None means unfiltered."""
+        partitions = []
+        if extension is not None:
+            ext = extension.lower()
+            partitions.append(shard.by_ext.get(ext if ext.startswith(".") else "." + ext, set()))
+        if doc_type is not None:
+            partitions.append(shard.by_type.get(doc_type, set()))
+        if path is not None:
+            partitions.append(shard.slots_with_path(path))
+        if not partitions:
+            return None
+
+        partitions.sort(key=len)
+        allowed = set(partitions[0])
+        for other in partitions[1:]:
+            allowed &= other
+        return allowed
+
+    def search(self, query: str, limit: int = 10, project: Optional[str] = None,
+               path: Optional[str] = None, extension: Optional[str] = None,
+               doc_type: Optional[str] = None) -> List[Tuple[Dict, float]]:
+        """
+        Returns up to `limit` (document, bm25_score) pairs, best first.
+        `path` is a prefix or glob, `extension` e.g. ".ts", `doc_type` the
+        metadata type (e.g. "conversation_memory").
+        """
+        n_docs = len(self.doc_slots)
+        if not n_docs:
+            return []
+
+        if project is not None:
+            shards = [self.shards[project]] if project in self.shards else []
+        else:
+            shards = list(self.shards.values())
+
+        # Collection statistics stay global so scores are comparable across scopes
+        avg_len = self.total_len / n_docs
+        k1 = self.k1
+        b = self.b
+        doc_lens = self.doc_lens
+        terms = set(tokenize(query))
+        idfs = {}
+        for term in terms:
+            df = sum(len(shard.postings.get(term, ())) for shard in self.shards.values())
+            if df:
+                idfs[term] = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+        scores: Dict[int, float] = defaultdict(float)
+        for shard in shards:
+            allowed = self._allowed_slots(shard, path, extension, doc_type)
+            if allowed is not None and not allowed:
+                continue
+            for term, idf in idfs.items():
+                posting = shard.postings.get(term)
+                if not posting:
+                    continue
+                if allowed is None:
+                    matches = posting.items()
+                elif len(allowed) < len(posting):
+                    matches = ((slot, posting[slot]) for slot in allowed if slot in posting)
+                else:
+                    matches = ((slot, freq) for slot, freq in posting.items() if slot in allowed)
+                for slot, freq in matches:
+                    norm = k1 * (1 - b + b * doc_lens[slot] / avg_len)
+                    scores[slot] += idf * freq * (k1 + 1) / (freq + norm)
+
+        if not scores:
+            return []
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(self.docs[slot], score) for slot, score in best]
+
+    # -----------------------------------------------------
+    # PERSISTENCE
+    # -----------------------------------------------------
+    def save(self, path: str = INDEX_FILE):
+        data = {
+            "k1": self.k1,
+            "b": self.b,
+            "docs": [doc for doc in self.docs if doc is not None]
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = INDEX_FILE) -> "LexicalIndex":
+        if not os.path.exists(path):
+            return cls()
+
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        index = cls(data.get("k1", BM25_K1), data.get("b", BM25_B))
+        # Paths are sorted once per shard at the end; insort per document is O(n^2)
+        for doc in data.get("docs", []):
+            path = doc.get("path", "")
+            shard, slot = index._insert(doc["id"], doc["content"], doc.get("project", ""), path,
+                                        doc.get("chunk_index", 0), doc.get("metadata"), doc.get("tf"))
+            shard.paths.append((path, slot))
+        for shard in index.shards.values():
+            shard.paths.sort()
+        return index
+
+    def add_records(self, records: Iterable[Dict]) -> int:
+        """Indexes chunk records as written to codebase_embeddings.json."""
+        count = 0
+        for item in records:
+            content = item.get('content')
+            if not content:
+                continue
+            project = item.get('project', 'unknown')
+            path = item.get('path', item.get('rel_path', 'unknown'))
+            chunk_index = item.get('chunk_index', 0)
+            metadata = dict(item.get('metadata') or {})
+            if item.get('total_chunks') is not None:
+                metadata['total_chunks'] = item['total_chunks']
+            self.add(chunk_doc_id(project, path, chunk_index), content, project, path, chunk_index, metadata)
+            count += 1
+        return count
+
+def main():
+    print("="*60)
+    print("🔤 LEXICAL INDEX (BM25)")
+    print("="*60)
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--rebuild":
+        if not os.path.exists(EMBEDDINGS_FILE):
+            print(f"❌ File not found: {EMBEDDINGS_FILE}")
+            return
+
+        with open(EMBEDDINGS_FILE, "r", encoding="utf-8") as f:
+            records = json.load(f)
+
+        index = LexicalIndex()
+        start = time.time()
+        count = index.add_records(records)
+        index.save()
+        print(f"✅ Indexed {count} chunks ({index.vocabulary_size} terms) in {time.time() - start:.2f}s")
+        print(f"📄 Index saved to: {INDEX_FILE}")
+        return
+
+    query = " ".join(sys.argv[1:])
+    if not query:
+        print("Usage: python lexical_index.py --rebuild | <query>")
+        return
+
+    index = LexicalIndex.load()
+    start = time.perf_counter()
+    hits = index.search(query, 10)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    print(f"🔍 '{query}' -> {len(hits)} hits in {elapsed_ms:.2f}ms ({len(index)} chunks)")
+    for doc, score in hits:
+        print(f"   👉 ({score:.3f}) [{doc['project']}] {doc['path']} #{doc['chunk_index']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,561 @@
+"""
+🔥 LOAD GENERATOR FOR THE CLOUD RUN DEPLOYMENT
+
+Open-loop, asyncio-based: requests are fired on an arrival schedule that
+does not wait for earlier responses, and latency is measured from the
+scheduled send time, so a slow server can't hide its queueing
+(coordinated omission). Standard library only.
+
+    python load_test.py https://lavaseco-app-xxxxx-uc.a.run.app --stages=30:5,60:20,30:20
+    python load_test.py --stub --stages=10:50,20:200
+"""
+
+import asyncio
+import json
+import math
+import random
+import ssl
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+# Configuration
+DEFAULT_STAGES = [(30, 5.0), (60, 20.0), (30, 20.0)]   # (seconds, requests/s reached at the end)
+DEFAULT_MAX_CONNECTIONS = 64
+DEFAULT_MAX_INFLIGHT = 2000
+REQUEST_TIMEOUT = 30.0
+RESULTS_FILE = "load_test_results.json"
+USER_AGENT = "lavaseco-loadtest/1.0"
+
+# Counter traffic: what the front desk actually calls, weighted by frequency
+DEFAULT_SCENARIOS = [
+    {"name": "orders", "method": "GET", "path": "/api/orders", "weight": 40},
+    {"name": "next-id", "method": "GET", "path": "/api/orders/next-id", "weight": 30},
+    {"name": "daily-counts", "method": "GET", "path": "/api/logistics/daily-counts?limit=30", "weight": 20},
+    {"name": "health", "method": "GET", "path": "/api/health", "weight": 10},
+]
+
+PERCENTILES = (50, 95, 99, 99.9)
+
+# ---------------------------------------------------------
+# HDR-STYLE HISTOGRAM
+# ---------------------------------------------------------
+class LatencyHistogram:
+    """
+    Log-linear buckets over integer microseconds: exact below 256us, then
+    128 sub-buckets per power of two (< 0.8% relative error) up to any
+    value. Recording is O(1) and histograms merge by adding counts.
+    """
+    SUB_BITS = 7
+    SUB = 1 << SUB_BITS
+    LINEAR = SUB << 1
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    @classmethod
+    def _index(cls, value: int) -> int:
+        if value < cls.LINEAR:
+            return value
+        shift = value.bit_length() - (cls.SUB_BITS + 1)
+        return cls.LINEAR + (shift - 1) * cls.SUB + ((value >> shift) - cls.SUB)
+
+    @classmethod
+    def _value(cls, index: int) -> int:
+        """Highest value that lands in the bucket."""
+        if index < cls.LINEAR:
+            return index
+        shift, sub = divmod(index - cls.LINEAR, cls.SUB)
+        shift += 1
+        return ((sub + cls.SUB + 1) << shift) - 1
+
+    def record(self, seconds: float):
+        value = max(0, int(seconds * 1_000_000))
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "LatencyHistogram"):
+        self.counts.update(other.counts)
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p: float) -> float:
+        """Value at percentile p, in milliseconds."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(p / 100 * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._value(index), self.max) / 1000
+        return self.max / 1000
+
+    def summary(self) -> Dict[str, float]:
+        if not self.count:
+            return {"count": 0}
+        result = {"count": self.count, "min_ms": self.min / 1000, "mean_ms": self.total / self.count / 1000}
+        for p in PERCENTILES:
+            result[f"p{p:g}_ms"] = self.percentile(p)
+        result["max_ms"] = self.max / 1000
+        return result
+
+# ---------------------------------------------------------
+# KEEP-ALIVE HTTP/1.1 CLIENT
+# ---------------------------------------------------------
+class HttpError(Exception):
+    pass
+
+class Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.requests = 0
+
+    def close(self):
+        self.writer.close()
+
+class ConnectionPool:
+    """At most `size` keep-alive connections; idle ones are reused LIFO."""
+
+    def __init__(self, url: str, size: int = DEFAULT_MAX_CONNECTIONS):
+        parts = urlsplit(url)
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.https else 80)
+        self.host_header = parts.netloc
+        self.base_path = parts.path.rstrip("/")
+        self.ssl = ssl.create_default_context() if self.https else None
+        self.slots = asyncio.Semaphore(size)
+        self.idle: List[Connection] = []
+        self.connects = 0
+        self.connect_time = LatencyHistogram()   # TCP + TLS of each new connection
+        self.server_time = LatencyHistogram()    # request written -> response read, on an open connection
+
+    async def acquire(self) -> Connection:
+        await self.slots.acquire()
+        while self.idle:
+            conn = self.idle.pop()
+            if not conn.reader.at_eof():
+                return conn
+            conn.close()
+        try:
+            start = time.perf_counter()
+            reader, writer = await asyncio.open_connection(
+                self.host, self.port, ssl=self.ssl,
+                server_hostname=self.host if self.https else None
+            )
+            self.connect_time.record(time.perf_counter() - start)
+            self.connects += 1
+            return Connection(reader, writer)
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def release(self, conn: Connection, reusable: bool):
+        if reusable:
+            self.idle.append(conn)
+        else:
+            conn.close()
+        self.slots.release()
+
+    async def request(self, method: str, path: str, body: Optional[bytes] = None) -> Tuple[int, bytes]:
+        conn = await self.acquire()
+        reusable = False
+        try:
+            head = [f"{method} {self.base_path}{path} HTTP/1.1", f"Host: {self.host_header}",
+                    f"User-Agent: {USER_AGENT}", "Accept: application/json", "Connection: keep-alive"]
+            if body is not None:
+                head += ["Content-Type: application/json", f"Content-Length: {len(body)}"]
+            sent = time.perf_counter()
+            conn.writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + (body or b""))
+            await conn.writer.drain()
+            status, payload, keep_alive = await read_response(conn.reader)
+            self.server_time.record(time.perf_counter() - sent)
+            conn.requests += 1
+            reusable = keep_alive
+            return status, payload
+        finally:
+            self.release(conn, reusable)
+
+    def close(self):
+        for conn in self.idle:
+            conn.close()
+        self.idle.clear()
+
+async def read_response(reader: asyncio.StreamReader) -> Tuple[int, bytes, bool]:
+    status_line = await reader.readline()
+    if not status_line:
+        raise HttpError("connection closed")
+    parts = status_line.split(None, 2)
+    if len(parts) < 2 or not parts[0].startswith(b"HTTP/"):
+        raise HttpError(f"bad status line: {status_line[:60]!r}")
+    status = int(parts[1])
+    keep_alive = parts[0] != b"HTTP/1.0"
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get("connection", "").lower() == "close":
+        keep_alive = False
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        body = bytearray()
+        while True:
+            size = int((await reader.readline()).split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                break
+            body += await reader.readexactly(size + 2)
+            del body[-2:]
+        return status, bytes(body), keep_alive
+    if "content-length" in headers:
+        return status, await reader.readexactly(int(headers["content-length"])), keep_alive
+    if status in (204, 304) or 100 <= status < 200:
+        return status, b"", keep_alive
+    return status, await reader.read(), False
+
+# ---------------------------------------------------------
+# LOAD GENERATOR
+# ---------------------------------------------------------
+def parse_stages(spec: str) -> List[Tuple[float, float]]:
+    """'30:5,60:20' -> [(30, 5.0), (60, 20.0)]: ramp to 5 rps over 30s, then to 20 over 60s."""
+    stages = []
+    for part in spec.split(","):
+        duration, _, rate = part.partition(":")
+        stages.append((float(duration), float(rate)))
+    return stages
+
+def arrival_times(stages: List[Tuple[float, float]], poisson: bool = True,
+                  rng: Optional[random.Random] = None):
+    """
+    Yields (offset_seconds, stage_index). Each stage ramps linearly from
+    the previous stage's rate to its own.
+    """
+    rng = rng or random.Random()
+    t = 0.0
+    stage_start = 0.0
+    previous_rate = 0.0
+    for index, (duration, rate) in enumerate(stages):
+        stage_end = stage_start + duration
+        while True:
+            progress = (t - stage_start) / duration if duration else 1.0
+            current = previous_rate + (rate - previous_rate) * progress
+            if current <= 0:
+                t += 0.01
+            else:
+                t += rng.expovariate(current) if poisson else 1.0 / current
+            if t >= stage_end:
+                break
+            yield t, index
+        t = stage_end
+        stage_start = stage_end
+        previous_rate = rate
+
+class LoadTest:
+    def __init__(self, url: str, stages: List[Tuple[float, float]],
+                 scenarios: Optional[List[Dict[str, Any]]] = None,
+                 max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 max_inflight: int = DEFAULT_MAX_INFLIGHT,
+                 timeout: float = REQUEST_TIMEOUT, poisson: bool = True, seed: Optional[int] = None):
+        self.url = url
+        self.stages = stages
+        self.scenarios = scenarios or DEFAULT_SCENARIOS
+        self.max_connections = max_connections
+        self.max_inflight = max_inflight
+        self.timeout = timeout
+        self.poisson = poisson
+        self.rng = random.Random(seed)
+
+        self.latency = LatencyHistogram()    # from the scheduled send time
+        self.service = LatencyHistogram()    # from the actual send time
+        self.by_endpoint = {s["name"]: LatencyHistogram() for s in self.scenarios}
+        self.by_stage = [LatencyHistogram() for _ in stages]
+        self.errors: Counter = Counter()
+        self.errors_by_endpoint: Counter = Counter()
+        self.sent = 0
+        self.dropped = 0
+        self.max_lag = 0.0
+        self.elapsed = 0.0
+        self.pool: Optional[ConnectionPool] = None
+
+    def _pick(self) -> Dict[str, Any]:
+        return self.rng.choices(self.scenarios, weights=[s.get("weight", 1) for s in self.scenarios])[0]
+
+    async def _fire(self, scenario: Dict[str, Any], intended: float, stage: int):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        body = scenario.get("body")
+        error = None
+        try:
+            status, _ = await asyncio.wait_for(
+                self.pool.request(scenario["method"], scenario["path"],
+                                  json.dumps(body).encode("utf-8") if body is not None else None),
+                self.timeout
+            )
+            if not 200 <= status < 400:
+                error = f"HTTP {status}"
+        except asyncio.TimeoutError:
+            error = "timeout"
+        except (OSError, HttpError, asyncio.IncompleteReadError, ValueError) as e:
+            error = type(e).__name__
+
+        finished = loop.time()
+        if error:
+            self.errors[error] += 1
+            self.errors_by_endpoint[scenario["name"]] += 1
+            return
+        self.latency.record(finished - intended)
+        self.service.record(finished - started)
+        self.by_endpoint[scenario["name"]].record(finished - intended)
+        self.by_stage[stage].record(finished - intended)
+
+    async def run(self) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        self.pool = ConnectionPool(self.url, self.max_connections)
+        inflight = set()
+        start = loop.time()
+        try:
+            for offset, stage in arrival_times(self.stages, self.poisson, self.rng):
+                delay = start + offset - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    self.max_lag = max(self.max_lag, -delay)
+                if len(inflight) >= self.max_inflight:
+                    self.dropped += 1
+                    continue
+                task = asyncio.ensure_future(self._fire(self._pick(), start + offset, stage))
+                inflight.add(task)
+                task.add_done_callback(inflight.discard)
+                self.sent += 1
+            if inflight:
+                await asyncio.wait(inflight)
+        finally:
+            self.elapsed = loop.time() - start
+            self.pool.close()
+        return self.report()
+
+    def report(self) -> Dict[str, Any]:
+        failed = sum(self.errors.values())
+        return {
+            "target": self.url,
+            "stages": [{"duration_s": d, "rate": r} for d, r in self.stages],
+            "elapsed_s": self.elapsed,
+            "sent": self.sent,
+            "completed": self.latency.count,
+            "failed": failed,
+            "dropped": self.dropped,
+            "error_rate": (failed + self.dropped) / max(self.sent + self.dropped, 1),
+            "throughput_rps": self.latency.count / self.elapsed if self.elapsed else 0.0,
+            "scheduler_max_lag_ms": self.max_lag * 1000,
+            "connections_opened": self.pool.connects if self.pool else 0,
+            "connect_time": self.pool.connect_time.summary() if self.pool else {},
+            "latency": self.latency.summary(),
+            "service_time": self.service.summary(),
+            "server_time": self.pool.server_time.summary() if self.pool else {},
+            "endpoints": {
+                name: {**h.summary(), "errors": self.errors_by_endpoint[name]}
+                for name, h in self.by_endpoint.items()
+            },
+            "by_stage": [h.summary() for h in self.by_stage],
+            "errors": dict(self.errors)
+        }
+
+def print_report(report: Dict[str, Any]):
+    def row(label: str, s: Dict[str, Any]) -> str:
+        if not s.get("count"):
+            return f"   {label:<14} {'-':>7}"
+        return (f"   {label:<14} {s['count']:>7} " +
+                " ".join(f"{s[f'p{p:g}_ms']:>9.1f}" for p in PERCENTILES) +
+                f" {s['max_ms']:>9.1f}")
+
+    print(f"\n📊 {report['completed']}/{report['sent']} OK in {report['elapsed_s']:.1f}s "
+          f"({report['throughput_rps']:.1f} rps), error rate {report['error_rate'] * 100:.2f}%, "
+          f"{report['connections_opened']} connections")
+    print(f"   {'':<14} {'count':>7} " + " ".join(f"{'p' + format(p, 'g'):>9}" for p in PERCENTILES) + f" {'max':>9}  (ms)")
+    print(row("all", report["latency"]))
+    print(row("service time", report["service_time"]))
+    print(row("  server", report["server_time"]))
+    print(row("  connect", report["connect_time"]))
+    for name, s in report["endpoints"].items():
+        print(row(name, s) + (f"  ❌ {s['errors']}" if s["errors"] else ""))
+    for i, s in enumerate(report["by_stage"]):
+        print(row(f"stage {i + 1}", s))
+    if report["errors"]:
+        print("   Errors: " + ", ".join(f"{k}: {v}" for k, v in sorted(report["errors"].items())))
+    if report["dropped"]:
+        print(f"   ⚠️ {report['dropped']} arrivals dropped (more than the in-flight limit)")
+    if report["scheduler_max_lag_ms"] > 50:
+        print(f"   ⚠️ Generator fell {report['scheduler_max_lag_ms']:.0f}ms behind schedule; results understate load")
+
+# ---------------------------------------------------------
+# LOCAL STAND-IN SERVER
+# ---------------------------------------------------------
+STUB_MEDIAN_MS = {"/api/orders": 35.0, "/api/orders/next-id": 12.0,
+                  "/api/logistics/daily-counts": 20.0, "/api/health": 5.0}
+
+class StubServer:
+    """
+    Stands in for the Next.js API: the endpoints in DEFAULT_SCENARIOS
+    answer small JSON bodies after a log-normal delay, with an optional
+    error rate, over keep-alive HTTP/1.1.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, sigma: float = 0.5,
+                 error_rate: float = 0.0, seed: Optional[int] = None):
+        self.host = host
+        self.port = port
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.server = None
+        self.handlers = set()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        # Idle keep-alive handlers are waiting on readline: close them cleanly
+        for task in list(self.handlers):
+            task.cancel()
+        if self.handlers:
+            await asyncio.gather(*self.handlers, return_exceptions=True)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self.handlers.add(task)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                length = 0
+                close = False
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    if name.strip().lower() == "content-length":
+                        length = int(value)
+                    elif name.strip().lower() == "connection":
+                        close = value.strip().lower() == "close"
+                if length:
+                    await reader.readexactly(length)
+
+                path = target.split("?", 1)[0]
+                median = STUB_MEDIAN_MS.get(path)
+                if median is None:
+                    status, payload = 404, {"error": "not found"}
+                else:
+                    await asyncio.sleep(median * math.exp(self.rng.gauss(0, self.sigma)) / 1000)
+                    if self.rng.random() < self.error_rate:
+                        status, payload = 500, {"error": "stub failure"}
+                    else:
+                        status, payload = 200, {"status": "ok", "path": path, "method": method}
+
+                body = json.dumps(payload).encode("utf-8")
+                writer.write((f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                              f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                              f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n").encode("latin-1") + body)
+                await writer.drain()
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError, asyncio.CancelledError):
+            pass
+        finally:
+            self.handlers.discard(task)
+            writer.close()
+
+# ---------------------------------------------------------
+# CLI
+# ---------------------------------------------------------
+async def run_load_test(url: Optional[str], stages: List[Tuple[float, float]], stub: bool = False,
+                        stub_error_rate: float = 0.0, **options) -> Dict[str, Any]:
+    server = None
+    if stub:
+        server = StubServer(error_rate=stub_error_rate)
+        await server.start()
+        url = server.url
+        print(f"🧪 Stand-in server on {url}")
+    try:
+        return await LoadTest(url, stages, **options).run()
+    finally:
+        if server:
+            await server.stop()
+
+def main():
+    print("="*60)
+    print("🔥 LOAD TEST (OPEN LOOP)")
+    print("="*60)
+
+    args = sys.argv[1:]
+    options = {a.split("=", 1)[0]: a.split("=", 1)[1] if "=" in a else True
+               for a in args if a.startswith("--")}
+    positional = [a for a in args if not a.startswith("--")]
+    stub = bool(options.get("--stub"))
+    url = positional[0] if positional else None
+    if not url and not stub:
+        print("Usage: python load_test.py <base-url> | --stub [--stages=30:5,60:20] [--connections=64]")
+        print("       [--scenarios=file.json] [--constant] [--max-error-rate=0.01] [--max-p99-ms=...]")
+        return
+
+    stages = parse_stages(options["--stages"]) if "--stages" in options else DEFAULT_STAGES
+    scenarios = None
+    if "--scenarios" in options:
+        with open(options["--scenarios"], "r", encoding="utf-8") as f:
+            scenarios = json.load(f)
+
+    print(f"🎯 {url or 'stub'} | stages: " + ", ".join(f"{d:g}s→{r:g}rps" for d, r in stages))
+    report = asyncio.run(run_load_test(
+        url, stages, stub=stub,
+        stub_error_rate=float(options.get("--stub-error-rate", 0.0)),
+        scenarios=scenarios,
+        max_connections=int(options.get("--connections", DEFAULT_MAX_CONNECTIONS)),
+        poisson="--constant" not in options
+    ))
+    print_report(report)
+
+    with open(RESULTS_FILE, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results saved to {RESULTS_FILE}")
+
+    failures = []
+    max_error_rate = float(options.get("--max-error-rate", 1.0))
+    if report["error_rate"] > max_error_rate:
+        failures.append(f"error rate {report['error_rate']:.2%} > {max_error_rate:.2%}")
+    if "--max-p99-ms" in options and report["latency"].get("p99_ms", 0) > float(options["--max-p99-ms"]):
+        failures.append(f"p99 {report['latency']['p99_ms']:.1f}ms > {options['--max-p99-ms']}ms")
+    if failures:
+        print("❌ " + "; ".join(failures))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,517 @@
+import heapq
+import math
+import random
+import sys
+import time
+from array import array
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Configuration
+FETCH_SIZE = 10000          # rows per round trip when bulk-loading
+COMPACT_RATIO = 0.1         # rebuild CSR once the delta exceeds 10% of the edges
+BENCH_EDGES = 1_000_000
+
+OUT = "out"
+IN = "in"
+BOTH = "both"
+
+FILE_NODE_PREFIX = "file:"
+
+def file_node_id(project: str, path: str) -> str:
+    """Graph node id for a scanned file (case kept: paths are case-sensitive)."""
+    return f"{FILE_NODE_PREFIX}{project}/{path}"
+
+def parse_file_node_id(node_id: str) -> Optional[Tuple[str, str]]:
+    if not node_id.startswith(FILE_NODE_PREFIX):
+        return None
+    project, _, path = node_id[len(FILE_NODE_PREFIX):].partition("/")
+    return project, path
+
+class MemoryGraph:
+    """
+    In-process copy of memory_nodes / memory_relations.
+
+    Nodes are mapped to dense ints and edges are stored twice in CSR form
+    (outgoing and incoming): `ptr[u]:ptr[u+1]` slices into flat arrays of
+    neighbor, confidence and relationship-type ids. Edges that arrive via
+    refresh() go to a small delta adjacency until the next compaction.
+    """
+
+    def __init__(self):
+        self.node_ids: List[str] = []
+        self.node_index: Dict[str, int] = {}
+        self.node_names: List[str] = []
+        self.node_types: List[str] = []
+
+        self.rel_types: List[str] = []
+        self.rel_type_index: Dict[str, int] = {}
+
+        self.out_ptr = array('q', [0])
+        self.out_dst = array('q')
+        self.out_w = array('d')
+        self.out_rel = array('H')
+        self.in_ptr = array('q', [0])
+        self.in_src = array('q')
+        self.in_w = array('d')
+        self.in_rel = array('H')
+
+        self.delta_out: Dict[int, List[Tuple[int, float, int]]] = defaultdict(list)
+        self.delta_in: Dict[int, List[Tuple[int, float, int]]] = defaultdict(list)
+        self.delta_edges = 0
+
+        # Refresh watermarks (and the rows seen exactly at them, since
+        # timestamps can tie)
+        self.nodes_watermark = None
+        self.nodes_at_watermark: Set[str] = set()
+        self.edges_watermark = None
+        self.edges_at_watermark: Set[str] = set()
+
+    @property
+    def node_count(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.out_dst) + self.delta_edges
+
+    # -----------------------------------------------------
+    # BUILDING
+    # -----------------------------------------------------
+    def add_node(self, node_id: str, name: Optional[str] = None, node_type: Optional[str] = None) -> int:
+        u = self.node_index.get(node_id)
+        if u is None:
+            u = len(self.node_ids)
+            self.node_index[node_id] = u
+            self.node_ids.append(node_id)
+            self.node_names.append(name or node_id)
+            self.node_types.append(node_type or "Concept")
+            # New nodes start with empty CSR rows
+            self.out_ptr.append(self.out_ptr[-1])
+            self.in_ptr.append(self.in_ptr[-1])
+        else:
+            if name is not None:
+                self.node_names[u] = name
+            if node_type is not None:
+                self.node_types[u] = node_type
+        return u
+
+    def _rel_id(self, relationship: str) -> int:
+        r = self.rel_type_index.get(relationship)
+        if r is None:
+            r = len(self.rel_types)
+            self.rel_type_index[relationship] = r
+            self.rel_types.append(relationship)
+        return r
+
+    def build(self, nodes: Iterable[Tuple[str, str, str]],
+              edges: Iterable[Tuple[str, str, str, Optional[float]]]):
+        """
+        Bulk build from (id, name, type) and (source, relationship, target,
+        confidence) tuples. Relations pointing at unknown nodes create them,
+        as RemoteGraph.addRelation does.
+        """
+        for node_id, name, node_type in nodes:
+            self.add_node(node_id, name, node_type)
+
+        src = array('q')
+        dst = array('q')
+        weights = array('d')
+        rels = array('H')
+        add_node = self.add_node
+        for source, relationship, target, confidence in edges:
+            src.append(add_node(source))
+            dst.append(add_node(target))
+            weights.append(1.0 if confidence is None else confidence)
+            rels.append(self._rel_id(relationship))
+
+        self._build_csr(src, dst, weights, rels)
+
+    def _build_csr(self, src: array, dst: array, weights: array, rels: array):
+        n = self.node_count
+        self.out_ptr, self.out_dst, self.out_w, self.out_rel = _csr(n, src, dst, weights, rels)
+        self.in_ptr, self.in_src, self.in_w, self.in_rel = _csr(n, dst, src, weights, rels)
+        self.delta_out.clear()
+        self.delta_in.clear()
+        self.delta_edges = 0
+
+    def add_edge(self, source: str, relationship: str, target: str, confidence: Optional[float] = None):
+        """Adds one edge to the delta adjacency (used by refresh)."""
+        u = self.add_node(source)
+        v = self.add_node(target)
+        w = 1.0 if confidence is None else confidence
+        r = self._rel_id(relationship)
+        self.delta_out[u].append((v, w, r))
+        self.delta_in[v].append((u, w, r))
+        self.delta_edges += 1
+
+    def copy(self) -> "MemoryGraph":
+        """
+        Independent copy to refresh() while readers keep traversing this one
+        (the arrays are copied flat, so it is cheap next to a full load()).
+        """
+        graph = MemoryGraph()
+        graph.node_ids = list(self.node_ids)
+        graph.node_index = dict(self.node_index)
+        graph.node_names = list(self.node_names)
+        graph.node_types = list(self.node_types)
+        graph.rel_types = list(self.rel_types)
+        graph.rel_type_index = dict(self.rel_type_index)
+        for name in ("out_ptr", "out_dst", "out_w", "out_rel", "in_ptr", "in_src", "in_w", "in_rel"):
+            setattr(graph, name, array(getattr(self, name).typecode, getattr(self, name)))
+        graph.delta_out = defaultdict(list, {u: list(edges) for u, edges in self.delta_out.items()})
+        graph.delta_in = defaultdict(list, {v: list(edges) for v, edges in self.delta_in.items()})
+        graph.delta_edges = self.delta_edges
+        graph.nodes_watermark = self.nodes_watermark
+        graph.nodes_at_watermark = set(self.nodes_at_watermark)
+        graph.edges_watermark = self.edges_watermark
+        graph.edges_at_watermark = set(self.edges_at_watermark)
+        return graph
+
+    def compact(self):
+        """Folds the delta adjacency back into the CSR arrays."""
+        if not self.delta_edges:
+            return
+        src = array('q')
+        for u in range(self.node_count):
+            src.extend([u] * (self.out_ptr[u + 1] - self.out_ptr[u]))
+        dst = array('q', self.out_dst)
+        weights = array('d', self.out_w)
+        rels = array('H', self.out_rel)
+        for u, edges in self.delta_out.items():
+            for v, w, r in edges:
+                src.append(u)
+                dst.append(v)
+                weights.append(w)
+                rels.append(r)
+        self._build_csr(src, dst, weights, rels)
+
+    # -----------------------------------------------------
+    # LOADING FROM POSTGRES
+    # -----------------------------------------------------
+    def load(self, conn):
+        """Bulk-loads both tables with server-side cursors."""
+        nodes = _stream(conn, "graph_nodes", """
+            SELECT id, name, type, coalesce(updated_at, created_at) FROM memory_nodes
+        """)
+        node_rows = []
+        for node_id, name, node_type, ts in nodes:
+            node_rows.append((node_id, name, node_type))
+            self._advance_nodes_watermark(node_id, ts)
+
+        edge_rows = []
+        for rel_id, source, relationship, target, confidence, ts in _stream(conn, "graph_edges", """
+            SELECT id, source, relationship, target, confidence, created_at FROM memory_relations
+        """):
+            edge_rows.append((source, relationship, target, confidence))
+            self._advance_edges_watermark(rel_id, ts)
+
+        self.build(node_rows, edge_rows)
+        conn.rollback()
+
+    def refresh(self, conn) -> Tuple[int, int]:
+        """
+        Pulls nodes changed since the last updated_at and relations created
+        since the last created_at. Returns (nodes, edges) applied. Deleted
+        rows and in-place confidence edits need a full load().
+        """
+        new_nodes = 0
+        cursor = conn.cursor()
+        if self.nodes_watermark is None:
+            cursor.execute("SELECT id, name, type, coalesce(updated_at, created_at) FROM memory_nodes")
+        else:
+            cursor.execute("""
+                SELECT id, name, type, coalesce(updated_at, created_at) FROM memory_nodes
+                WHERE coalesce(updated_at, created_at) >= %s
+            """, (self.nodes_watermark,))
+        for node_id, name, node_type, ts in cursor.fetchall():
+            if ts == self.nodes_watermark and node_id in self.nodes_at_watermark:
+                continue
+            self.add_node(node_id, name, node_type)
+            self._advance_nodes_watermark(node_id, ts)
+            new_nodes += 1
+
+        new_edges = 0
+        if self.edges_watermark is None:
+            cursor.execute("SELECT id, source, relationship, target, confidence, created_at FROM memory_relations")
+        else:
+            cursor.execute("""
+                SELECT id, source, relationship, target, confidence, created_at FROM memory_relations
+                WHERE created_at >= %s
+            """, (self.edges_watermark,))
+        for rel_id, source, relationship, target, confidence, ts in cursor.fetchall():
+            if ts == self.edges_watermark and rel_id in self.edges_at_watermark:
+                continue
+            self.add_edge(source, relationship, target, confidence)
+            self._advance_edges_watermark(rel_id, ts)
+            new_edges += 1
+        cursor.close()
+        conn.rollback()
+
+        if self.delta_edges > COMPACT_RATIO * max(len(self.out_dst), 1):
+            self.compact()
+        return new_nodes, new_edges
+
+    def _advance_nodes_watermark(self, node_id: str, ts):
+        if ts is None:
+            return
+        if self.nodes_watermark is None or ts > self.nodes_watermark:
+            self.nodes_watermark = ts
+            self.nodes_at_watermark = {node_id}
+        elif ts == self.nodes_watermark:
+            self.nodes_at_watermark.add(node_id)
+
+    def _advance_edges_watermark(self, rel_id: str, ts):
+        if ts is None:
+            return
+        if self.edges_watermark is None or ts > self.edges_watermark:
+            self.edges_watermark = ts
+            self.edges_at_watermark = {rel_id}
+        elif ts == self.edges_watermark:
+            self.edges_at_watermark.add(rel_id)
+
+    # -----------------------------------------------------
+    # QUERIES
+    # -----------------------------------------------------
+    def _edges(self, u: int, direction: str):
+        """Yields (neighbor, confidence, rel_id) for node u."""
+        if direction in (OUT, BOTH):
+            for j in range(self.out_ptr[u], self.out_ptr[u + 1]):
+                yield self.out_dst[j], self.out_w[j], self.out_rel[j]
+            yield from self.delta_out.get(u, ())
+        if direction in (IN, BOTH):
+            for j in range(self.in_ptr[u], self.in_ptr[u + 1]):
+                yield self.in_src[j], self.in_w[j], self.in_rel[j]
+            yield from self.delta_in.get(u, ())
+
+    def _rel_filter(self, relationships: Optional[Iterable[str]]) -> Optional[Set[int]]:
+        if relationships is None:
+            return None
+        if isinstance(relationships, str):
+            relationships = [relationships]
+        return {self.rel_type_index[r] for r in relationships if r in self.rel_type_index}
+
+    def neighbors(self, node_id: str, relationships: Optional[Iterable[str]] = None,
+                  direction: str = OUT) -> List[Tuple[str, str, float]]:
+        """Typed-relation lookup: [(neighbor_id, relationship, confidence)]."""
+        u = self.node_index.get(node_id)
+        if u is None:
+            return []
+        allowed = self._rel_filter(relationships)
+        return [
+            (self.node_ids[v], self.rel_types[r], w)
+            for v, w, r in self._edges(u, direction)
+            if allowed is None or r in allowed
+        ]
+
+    def k_hop(self, node_id: str, k: int = 2, relationships: Optional[Iterable[str]] = None,
+              direction: str = BOTH, min_confidence: float = 0.0, limit: Optional[int] = None) -> Dict[str, int]:
+        """Breadth-first neighborhood: {node_id: hops} up to k hops away."""
+        start = self.node_index.get(node_id)
+        if start is None:
+            return {}
+        allowed = self._rel_filter(relationships)
+
+        hops = {start: 0}
+        frontier = [start]
+        for depth in range(1, k + 1):
+            next_frontier = []
+            for u in frontier:
+                for v, w, r in self._edges(u, direction):
+                    if v in hops or w < min_confidence or (allowed is not None and r not in allowed):
+                        continue
+                    hops[v] = depth
+                    next_frontier.append(v)
+                    if limit is not None and len(hops) > limit:
+                        return {self.node_ids[n]: d for n, d in hops.items()}
+            if not next_frontier:
+                break
+            frontier = next_frontier
+
+        return {self.node_ids[n]: d for n, d in hops.items()}
+
+    def shortest_path(self, source: str, target: str, relationships: Optional[Iterable[str]] = None,
+                      direction: str = OUT, weighted: bool = False) -> Optional[List[str]]:
+        """
+        Fewest-hops path (bidirectional BFS), or with `weighted` the most
+        confident path: Dijkstra over cost = -log(confidence).
+        """
+        s = self.node_index.get(source)
+        t = self.node_index.get(target)
+        if s is None or t is None:
+            return None
+        allowed = self._rel_filter(relationships)
+        if weighted:
+            return self._dijkstra(s, t, allowed, direction)
+
+        reverse = {OUT: IN, IN: OUT, BOTH: BOTH}[direction]
+        parents = ({s: -1}, {t: -1})
+        frontiers = ([s], [t])
+        meet = s if s == t else None
+
+        while meet is None and frontiers[0] and frontiers[1]:
+            # Always grow the smaller frontier
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            seen, other = parents[side], parents[1 - side]
+            step = direction if side == 0 else reverse
+            next_frontier = []
+            for u in frontiers[side]:
+                for v, w, r in self._edges(u, step):
+                    if v in seen or (allowed is not None and r not in allowed):
+                        continue
+                    seen[v] = u
+                    if v in other:
+                        meet = v
+                        break
+                    next_frontier.append(v)
+                if meet is not None:
+                    break
+            frontiers = (next_frontier, frontiers[1]) if side == 0 else (frontiers[0], next_frontier)
+
+        if meet is None:
+            return None
+        path = []
+        u = meet
+        while u != -1:
+            path.append(self.node_ids[u])
+            u = parents[0][u]
+        path.reverse()
+        u = parents[1][meet]
+        while u != -1:
+            path.append(self.node_ids[u])
+            u = parents[1][u]
+        return path
+
+    def _dijkstra(self, s: int, t: int, allowed: Optional[Set[int]], direction: str) -> Optional[List[str]]:
+        parent = {s: -1}
+        dist = {s: 0.0}
+        heap = [(0.0, s)]
+        done = set()
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in done:
+                continue
+            done.add(u)
+            if u == t:
+                break
+            for v, w, r in self._edges(u, direction):
+                if w <= 0 or (allowed is not None and r not in allowed):
+                    continue
+                nd = d - math.log(min(w, 1.0))
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    parent[v] = u
+                    heapq.heappush(heap, (nd, v))
+
+        if t not in parent:
+            return None
+        path = []
+        u = t
+        while u != -1:
+            path.append(self.node_ids[u])
+            u = parent[u]
+        return path[::-1]
+
+def _csr(n: int, src: array, dst: array, weights: array, rels: array):
+    """Counting-sort the edge list by source into CSR arrays."""
+    ptr = array('q', bytes(8 * (n + 1)))
+    for u in src:
+        ptr[u + 1] += 1
+    for i in range(n):
+        ptr[i + 1] += ptr[i]
+
+    m = len(src)
+    cols = array('q', bytes(8 * m))
+    w_out = array('d', bytes(8 * m))
+    r_out = array('H', bytes(2 * m))
+    pos = array('q', ptr[:-1])
+    for i in range(m):
+        u = src[i]
+        p = pos[u]
+        cols[p] = dst[i]
+        w_out[p] = weights[i]
+        r_out[p] = rels[i]
+        pos[u] = p + 1
+    return ptr, cols, w_out, r_out
+
+def _stream(conn, name: str, query: str):
+    from db import stream
+    return stream(conn, query, name=name, fetch_size=FETCH_SIZE)
+
+# ---------------------------------------------------------
+# BENCHMARK
+# ---------------------------------------------------------
+def synthetic_graph(n_edges: int, seed: int = 7) -> MemoryGraph:
+    rng = random.Random(seed)
+    n_nodes = max(n_edges // 10, 2)
+    relationships = ["IMPORTS", "CALLS", "DEFINES", "USES", "RELATED_TO", "PART_OF", "DEPENDS_ON", "MENTIONS"]
+    nodes = ((f"n{i}", f"Node {i}", "Concept") for i in range(n_nodes))
+    edges = (
+        (f"n{rng.randrange(n_nodes)}", rng.choice(relationships), f"n{rng.randrange(n_nodes)}", rng.random())
+        for _ in range(n_edges)
+    )
+    graph = MemoryGraph()
+    graph.build(nodes, edges)
+    return graph
+
+def run_benchmark(n_edges: int = BENCH_EDGES, samples: int = 200):
+    print(f"🧪 Synthetic graph: {n_edges:,} edges")
+    start = time.perf_counter()
+    graph = synthetic_graph(n_edges)
+    print(f"   🏗️ Build: {time.perf_counter() - start:.2f}s ({graph.node_count:,} nodes)")
+
+    rng = random.Random(11)
+    picks = [f"n{rng.randrange(graph.node_count)}" for _ in range(samples)]
+
+    def timed(label, fn):
+        start = time.perf_counter()
+        for i, node in enumerate(picks):
+            fn(node, picks[-1 - i])
+        avg_ms = (time.perf_counter() - start) * 1000 / samples
+        print(f"   ⏱️ {label}: {avg_ms:.3f}ms avg")
+
+    timed("neighbors (typed)", lambda a, b: graph.neighbors(a, "CALLS"))
+    timed("1-hop", lambda a, b: graph.k_hop(a, 1))
+    timed("2-hop", lambda a, b: graph.k_hop(a, 2))
+    timed("2-hop (typed, out)", lambda a, b: graph.k_hop(a, 2, ["IMPORTS", "CALLS"], OUT))
+    timed("shortest path (bfs)", lambda a, b: graph.shortest_path(a, b))
+
+    for i in range(samples):
+        graph.add_edge(picks[i], "MENTIONS", picks[-1 - i], 0.5)
+    start = time.perf_counter()
+    graph.compact()
+    print(f"   🧹 Compact with {samples} delta edges: {time.perf_counter() - start:.2f}s")
+
+def main():
+    print("="*60)
+    print("🕸️ MEMORY GRAPH ENGINE")
+    print("="*60)
+
+    args = sys.argv[1:]
+    if args and args[0] == "--bench":
+        run_benchmark(int(args[1]) if len(args) > 1 else BENCH_EDGES)
+        return
+
+    from db import connect_db
+    conn = connect_db()
+    if not conn:
+        sys.exit(1)
+
+    try:
+        graph = MemoryGraph()
+        start = time.perf_counter()
+        graph.load(conn)
+        print(f"✅ Loaded {graph.node_count} nodes / {graph.edge_count} relations "
+              f"in {time.perf_counter() - start:.2f}s")
+
+        if args:
+            node = args[0]   # ids are case-sensitive (file paths)
+            print(f"\n🔍 {node}")
+            for other, relationship, confidence in graph.neighbors(node, direction=BOTH):
+                print(f"   -[{relationship} {confidence:.2f}]- {other}")
+            print(f"   2-hop neighborhood: {len(graph.k_hop(node, 2))} nodes")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+📈 PIPELINE METRICS: TIMERS, COUNTERS AND HISTOGRAMS
+
+Off unless enabled (--metrics or PIPELINE_METRICS=1); when off, every
+call returns after one attribute check. Exported as Prometheus text
+(search_service's /metrics, or a .prom file for the node_exporter
+textfile collector) and as a JSON run summary.
+
+    with metrics.timer("file_read"):
+        content = f.read()
+    metrics.count("chunks", len(chunks))
+"""
+
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# Configuration
+PREFIX = "lavaseco_"
+ENV_FLAG = "PIPELINE_METRICS"
+# Histogram bounds in seconds: from a cache hit up to a Vertex retry
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile, capped at the observed max."""
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+class _Timer:
+    __slots__ = ("registry", "name", "labels", "start")
+
+    def __init__(self, registry: "Registry", name: str, labels: Dict[str, Any]):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        listener = self.registry.listener
+        if listener is not None:
+            listener.enter(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        labels = self.labels
+        if exc_type is not None:
+            labels = {**labels, "outcome": "error"}
+        self.registry.observe(self.name, seconds, **labels)
+        listener = self.registry.listener
+        if listener is not None:
+            listener.exit(self.name, seconds)
+        return False
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class Registry:
+    """
+    Three families: counters (lavaseco_<name>_total), gauges
+    (lavaseco_<name>) and one histogram of stage durations
+    (lavaseco_stage_seconds{stage=...}).
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self.stages: Dict[LabelKey, _Histogram] = {}
+        self.listener = None   # gets enter(stage) / exit(stage, seconds) from timers (profiling.py)
+
+    def count(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self.lock:
+            family = self.counters.setdefault(name, {})
+            family[key] = family.get(key, 0) + value
+
+    def gauge(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, stage: str, seconds: float, **labels):
+        if not self.enabled:
+            return
+        key = _label_key({"stage": stage, **labels})
+        with self.lock:
+            histogram = self.stages.get(key)
+            if histogram is None:
+                histogram = self.stages[key] = _Histogram()
+            histogram.observe(seconds)
+
+    def timer(self, stage: str, **labels):
+        if not self.enabled and self.listener is None:
+            return _NULL_TIMER
+        return _Timer(self, stage, labels)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.stages.clear()
+            self.started_at = time.time()
+
+    # -----------------------------------------------------
+    # EXPORT
+    # -----------------------------------------------------
+    def to_prometheus(self) -> str:
+        lines = []
+        with self.lock:
+            for name, family in sorted(self.counters.items()):
+                lines.append(f"# TYPE {PREFIX}{name}_total counter")
+                lines += [f"{PREFIX}{name}_total{_format_labels(k)} {v:g}" for k, v in sorted(family.items())]
+            for name, family in sorted(self.gauges.items()):
+                lines.append(f"# TYPE {PREFIX}{name} gauge")
+                lines += [f"{PREFIX}{name}{_format_labels(k)} {v:g}" for k, v in sorted(family.items())]
+            if self.stages:
+                metric = f"{PREFIX}stage_seconds"
+                lines.append(f"# TYPE {metric} histogram")
+                for key, h in sorted(self.stages.items()):
+                    cumulative = 0
+                    for bound, n in zip(BUCKETS, h.counts):
+                        cumulative += n
+                        lines.append(f"{metric}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {cumulative}")
+                    lines.append(f"{metric}_bucket{_format_labels(key, ('le', '+Inf'))} {h.count}")
+                    lines.append(f"{metric}_sum{_format_labels(key)} {h.sum:.6f}")
+                    lines.append(f"{metric}_count{_format_labels(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, Any]:
+        def label_name(key: LabelKey) -> str:
+            return ",".join(f"{k}={v}" for k, v in key) or "_"
+
+        def stage_name(key: LabelKey) -> str:
+            rest = tuple((k, v) for k, v in key if k != "stage")
+            return dict(key)["stage"] + (f"[{label_name(rest)}]" if rest else "")
+
+        with self.lock:
+            stages = {}
+            for key, h in sorted(self.stages.items()):
+                stages[stage_name(key)] = {
+                    "count": h.count,
+                    "total_s": round(h.sum, 6),
+                    "mean_ms": round(h.sum / h.count * 1000, 3) if h.count else 0.0,
+                    "p50_ms": round(h.quantile(0.5) * 1000, 3),
+                    "p95_ms": round(h.quantile(0.95) * 1000, 3),
+                    "max_ms": round(h.max * 1000, 3)
+                }
+            return {
+                "started_at": self.started_at,
+                "elapsed_s": round(time.time() - self.started_at, 3),
+                "stages": stages,
+                "counters": {name: {label_name(k): v for k, v in family.items()}
+                             for name, family in sorted(self.counters.items())},
+                "gauges": {name: {label_name(k): v for k, v in family.items()}
+                           for name, family in sorted(self.gauges.items())}
+            }
+
+    def write_run_summary(self, script: str) -> Optional[str]:
+        """metrics_<script>.json plus metrics_<script>.prom; returns the JSON path."""
+        if not self.enabled:
+            return None
+        json_path = f"metrics_{script}.json"
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"script": script, **self.summary()}, f, indent=2)
+        with open(f"metrics_{script}.prom", "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        return json_path
+
+REGISTRY = Registry(os.environ.get(ENV_FLAG, "") not in ("", "0"))
+
+count = REGISTRY.count
+gauge = REGISTRY.gauge
+observe = REGISTRY.observe
+timer = REGISTRY.timer
+
+def timed_iter(stage: str, iterable: Iterable[Any], **labels) -> Iterable[Any]:
+    """Times each wait for the next item, e.g. a consumer starved by its producer."""
+    if not REGISTRY.enabled:
+        return iterable
+    return _timed_iter(stage, iterable, labels)
+
+def _timed_iter(stage: str, iterable: Iterable[Any], labels: Dict[str, Any]):
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        REGISTRY.observe(stage, time.perf_counter() - start, **labels)
+        yield item
+
+def enable(on: bool = True):
+    REGISTRY.enabled = on
+
+def enabled() -> bool:
+    return REGISTRY.enabled
+
+def enable_from_args(args: Iterable[str] = None) -> bool:
+    """Turns metrics on for `--metrics` (the environment variable also works)."""
+    if "--metrics" in (sys.argv[1:] if args is None else args):
+        enable()
+    return REGISTRY.enabled
+
+def print_summary(summary: Dict[str, Any]):
+    stages = summary["stages"]
+    if not stages:
+        return
+    print(f"\n   {'stage':<36} {'count':>7} {'total_s':>9} {'mean_ms':>9} {'p95_ms':>9} {'max_ms':>9}")
+    for name, s in sorted(stages.items(), key=lambda item: -item[1]["total_s"]):
+        print(f"   {name:<36} {s['count']:>7} {s['total_s']:>9.2f} {s['mean_ms']:>9.2f} "
+              f"{s['p95_ms']:>9.2f} {s['max_ms']:>9.2f}")
+
+def finish(script: str):
+    """Prints where the time went and writes the run summary, if metrics are on."""
+    if not REGISTRY.enabled:
+        return
+    summary = REGISTRY.summary()
+    print_summary(summary)
+    path = REGISTRY.write_run_summary(script)
+    print(f"📈 Metrics: {path} (+ .prom)")
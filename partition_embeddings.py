@@ -0,0 +1,380 @@
+"""
+🧱 PROJECT PARTITIONS FOR codebase_embeddings
+
+Turns codebase_embeddings into a table LIST-partitioned by project: one
+partition per project (plus a DEFAULT one for projects nobody registered
+yet), each with its own IVFFlat index sized to its own row count. A
+search filtered by project is pruned to one partition, and re-indexing or
+truncating one project never rebuilds or locks another.
+
+    python partition_embeddings.py status
+    python partition_embeddings.py migrate [--drop-flat]   # flat table -> partitioned, in one transaction
+    python partition_embeddings.py add <project>           # own partition (rows move out of DEFAULT)
+    python partition_embeddings.py reindex <project>       # (re)build one partition's ANN index, CONCURRENTLY
+    python partition_embeddings.py truncate <project>
+
+A partition gets its ANN index once it has rows. Rows written afterwards
+(pipeline, watch) do not retrain it: `status` flags partitions whose index
+is missing or whose lists no longer fit the row count, and `reindex`
+rebuilds them ("(default)" names the DEFAULT partition).
+
+Fresh databases can start partitioned with `python init_db.py --partitioned`.
+"""
+
+import math
+import re
+import sys
+from typing import Dict, List, Optional
+
+try:
+    from psycopg2 import sql
+    HAS_PSYCOPG2 = True
+except ImportError:
+    HAS_PSYCOPG2 = False  # db.py reports it; connect_db() returns None without the driver
+
+from db import STATEMENT_TIMEOUT_MS, connect_db
+
+# Configuration
+TABLE = "codebase_embeddings"
+DEFAULT_PARTITION = "codebase_embeddings_default"
+FLAT_TABLE = "codebase_embeddings_flat"           # the old table, kept after `migrate` unless --drop-flat
+KNOWN_PROJECTS = ("lavaseco-app", "hydra-web", "ANTIGRAVITY_INTERNAL")
+# Written by the scripts; file_ext is generated and id comes from the sequence
+DATA_COLUMNS = ("project", "file_path", "content", "embedding", "metadata", "created_at", "chunk_key", "content_hash")
+MAX_IDENTIFIER = 63
+
+# ---------------------------------------------------------
+# CATALOG
+# ---------------------------------------------------------
+def partition_name(project: str) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "_", project.lower()).strip("_") or "project"
+    return f"{TABLE}_{slug}"[:MAX_IDENTIFIER - len("_embedding_idx")]
+
+def ann_index_name(partition: str) -> str:
+    return f"{partition}_embedding_idx"
+
+def ann_lists(rows: int) -> int:
+    """pgvector's guidance for IVFFlat: rows / 1000 up to 1M rows, sqrt(rows) above."""
+    if rows > 1_000_000:
+        return int(math.sqrt(rows))
+    return max(1, rows // 1000)
+
+def lists_stale(lists: int, rows: int) -> bool:
+    """IVFFlat centroids are trained once; off by 2x from what the rows call for is worth a reindex."""
+    expected = ann_lists(rows)
+    return lists * 2 <= expected or expected * 2 <= lists
+
+def is_partitioned(cursor) -> bool:
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s);", (TABLE,))
+    row = cursor.fetchone()
+    return bool(row) and row[0] == "p"
+
+def vector_columns(cursor, table: str = TABLE) -> Dict[str, str]:
+    """Vector column -> type; more than `embedding` while a model migration runs (embedding_versions.py)."""
+    cursor.execute("""
+        SELECT attname, format_type(atttypid, atttypmod) FROM pg_attribute
+        WHERE attrelid = to_regclass(%s) AND attnum > 0 AND NOT attisdropped
+          AND atttypid = 'vector'::regtype
+        ORDER BY attnum;
+    """, (table,))
+    return dict(cursor.fetchall())
+
+def data_columns(cursor, table: str = TABLE) -> List[str]:
+    return list(DATA_COLUMNS) + [c for c in vector_columns(cursor, table) if c not in DATA_COLUMNS]
+
+def partitions(cursor) -> Dict[Optional[str], str]:
+    """project -> partition table; the DEFAULT partition is under None."""
+    cursor.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s);
+    """, (TABLE,))
+    result = {}
+    for name, bound in cursor.fetchall():
+        if bound == "DEFAULT":
+            result[None] = name
+            continue
+        match = re.fullmatch(r"FOR VALUES IN \('((?:[^']|'')*)'\)", bound)
+        if match:
+            result[match.group(1).replace("''", "'")] = name
+    return result
+
+# ---------------------------------------------------------
+# DDL
+# ---------------------------------------------------------
+def create_partitioned_table(cursor, name: str = TABLE):
+    """Same columns as init_db's flat table. The partition key has to be part of every unique index."""
+    cursor.execute(sql.SQL("""
+        CREATE TABLE {table} (
+          id bigserial,
+          project text not null,
+          file_path text not null,
+          content text not null,
+          embedding vector(768),
+          metadata jsonb,
+          created_at timestamptz default now(),
+          file_ext text generated always as (lower(substring(file_path from '\\.[^./]+$'))) stored,
+          chunk_key text,
+          content_hash text,
+          PRIMARY KEY (id, project)
+        ) PARTITION BY LIST (project);
+        CREATE TABLE {default} PARTITION OF {table} DEFAULT;
+    """).format(table=sql.Identifier(name), default=sql.Identifier(DEFAULT_PARTITION)))
+
+def create_parent_indexes(cursor):
+    """Declared once on the parent; Postgres creates them on every partition, present and future."""
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS codebase_embeddings_project_chunk_key_idx
+        ON codebase_embeddings (project, chunk_key);
+        CREATE INDEX IF NOT EXISTS codebase_embeddings_project_path_idx
+        ON codebase_embeddings (project, file_path text_pattern_ops);
+        CREATE INDEX IF NOT EXISTS codebase_embeddings_path_idx
+        ON codebase_embeddings (file_path text_pattern_ops);
+        CREATE INDEX IF NOT EXISTS codebase_embeddings_ext_idx
+        ON codebase_embeddings (file_ext);
+        CREATE INDEX IF NOT EXISTS codebase_embeddings_type_idx
+        ON codebase_embeddings ((metadata->>'type'));
+    """)
+
+def create_ann_index(cursor, partition: str, concurrently: bool = False, name: Optional[str] = None) -> int:
+    """
+    IVFFlat index on one partition, trained on its current rows; returns the
+    lists used. An empty partition gets none (0): centroids trained on no
+    rows are useless, so ensure_ann_indexes() builds it once rows arrive.
+    """
+    cursor.execute(sql.SQL("SELECT count(*) FROM {};").format(sql.Identifier(partition)))
+    rows = cursor.fetchone()[0]
+    if not rows:
+        return 0
+    lists = ann_lists(rows)
+    cursor.execute(sql.SQL("""
+        CREATE INDEX {concurrently} IF NOT EXISTS {index} ON {partition}
+        USING ivfflat (embedding vector_cosine_ops) WITH (lists = {lists});
+    """).format(concurrently=sql.SQL("CONCURRENTLY" if concurrently else ""),
+                index=sql.Identifier(name or ann_index_name(partition)),
+                partition=sql.Identifier(partition), lists=sql.Literal(lists)))
+    return lists
+
+def ensure_partition(cursor, project: str) -> str:
+    """
+    The partition holding `project`, created if needed. Rows that landed in
+    DEFAULT before the partition existed move into it (same transaction).
+    """
+    existing = partitions(cursor)
+    if project in existing:
+        return existing[project]
+
+    name = partition_name(project)
+    columns = sql.SQL(", ").join(map(sql.Identifier, data_columns(cursor)))
+    cursor.execute(sql.SQL("""
+        CREATE TEMP TABLE partition_move ON COMMIT DROP AS
+            SELECT id, {columns} FROM {default} WHERE project = %s;
+        DELETE FROM {default} WHERE project = %s;
+        CREATE TABLE {name} PARTITION OF {table} FOR VALUES IN ({project});
+        INSERT INTO {table} (id, {columns}) SELECT id, {columns} FROM partition_move;
+        DROP TABLE partition_move;
+    """).format(columns=columns, default=sql.Identifier(DEFAULT_PARTITION), name=sql.Identifier(name),
+                table=sql.Identifier(TABLE), project=sql.Literal(project)), (project, project))
+    create_ann_index(cursor, name)
+    return name
+
+def ensure_ann_indexes(cursor, only: Optional[List[str]] = None) -> Dict[str, int]:
+    """
+    Per-partition ANN indexes that are missing on partitions with rows
+    (init_db on a partitioned table, upload_embeddings after filling them).
+    `only` limits it to those tables, which may also be the flat table.
+    """
+    created = {}
+    for partition in (only if only is not None else partitions(cursor).values()):
+        cursor.execute("SELECT to_regclass(%s) IS NULL;", (ann_index_name(partition),))
+        if cursor.fetchone()[0]:
+            lists = create_ann_index(cursor, partition)
+            if lists:
+                created[partition] = lists
+    return created
+
+def truncate_tables(cursor, tables: List[str]):
+    """
+    TRUNCATE that also drops the tables' ANN indexes. TRUNCATE would rebuild
+    them on no rows, leaving centroids nothing retrains; ensure_ann_indexes()
+    builds `embedding`'s again once the rows are back, and flip() a building
+    version's.
+    """
+    cursor.execute("""
+        SELECT i.relname
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        JOIN pg_am am ON am.oid = i.relam
+        WHERE x.indrelid = ANY(%s::regclass[]) AND am.amname IN ('ivfflat', 'hnsw');
+    """, (tables,))
+    for (index,) in cursor.fetchall():
+        cursor.execute(sql.SQL("DROP INDEX {};").format(sql.Identifier(index)))
+    cursor.execute(sql.SQL("TRUNCATE {};").format(sql.SQL(", ").join(map(sql.Identifier, tables))))
+
+# ---------------------------------------------------------
+# COMMANDS
+# ---------------------------------------------------------
+def migrate(conn, drop_flat: bool = False):
+    """
+    Flat table -> partitioned, in one transaction: readers see either the
+    old table or the new one. Writers and readers wait while rows are copied.
+    """
+    cursor = conn.cursor()
+    if is_partitioned(cursor):
+        print("✅ codebase_embeddings is already partitioned")
+        return
+    cursor.execute("SET LOCAL statement_timeout = 0;")   # copy + index builds
+
+    # 1. Move the flat table and everything named after it out of the way
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id');", (TABLE,))
+    sequence = cursor.fetchone()[0]
+    cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {};").format(sql.Identifier(TABLE), sql.Identifier(FLAT_TABLE)))
+    if sequence:
+        cursor.execute(sql.SQL("ALTER SEQUENCE {} RENAME TO {};").format(
+            sql.SQL(sequence), sql.Identifier(f"{FLAT_TABLE}_id_seq")))
+    cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s;", (FLAT_TABLE,))
+    for (index,) in cursor.fetchall():
+        if index.startswith(TABLE):
+            cursor.execute(sql.SQL("ALTER INDEX {} RENAME TO {};").format(
+                sql.Identifier(index), sql.Identifier(FLAT_TABLE + index[len(TABLE):])))
+
+    # 2. Partitioned table, one partition per known or present project
+    create_partitioned_table(cursor)
+    for column, column_type in vector_columns(cursor, FLAT_TABLE).items():
+        # The active model's dimensions, plus the columns of other model versions
+        if column == "embedding":
+            cursor.execute(sql.SQL("ALTER TABLE {} ALTER COLUMN embedding TYPE {};").format(
+                sql.Identifier(TABLE), sql.SQL(column_type)))
+        else:
+            cursor.execute(sql.SQL("ALTER TABLE {} ADD COLUMN {} {};").format(
+                sql.Identifier(TABLE), sql.Identifier(column), sql.SQL(column_type)))
+    create_parent_indexes(cursor)
+    cursor.execute(sql.SQL("SELECT DISTINCT project FROM {};").format(sql.Identifier(FLAT_TABLE)))
+    projects = sorted(set(KNOWN_PROJECTS) | {row[0] for row in cursor.fetchall()})
+    for project in projects:
+        cursor.execute(sql.SQL("CREATE TABLE {} PARTITION OF {} FOR VALUES IN ({});").format(
+            sql.Identifier(partition_name(project)), sql.Identifier(TABLE), sql.Literal(project)))
+
+    # 3. Rows keep their ids; the new sequence continues after them
+    columns = sql.SQL(", ").join(map(sql.Identifier, data_columns(cursor)))
+    cursor.execute(sql.SQL("INSERT INTO {table} (id, {columns}) SELECT id, {columns} FROM {flat};").format(
+        table=sql.Identifier(TABLE), columns=columns, flat=sql.Identifier(FLAT_TABLE)))
+    print(f"📦 {cursor.rowcount} rows copied into {len(projects)} partitions")
+    cursor.execute("SELECT setval(pg_get_serial_sequence(%s, 'id'), coalesce(max(id), 0) + 1, false) FROM codebase_embeddings;",
+                   (TABLE,))
+
+    # 4. ANN indexes after the copy: trained on the real data, and faster than maintaining them row by row
+    for partition, lists in ensure_ann_indexes(cursor).items():
+        print(f"   ⚡ {partition}: ivfflat lists = {lists}")
+    cursor.execute("ANALYZE codebase_embeddings;")
+
+    if drop_flat:
+        cursor.execute(sql.SQL("DROP TABLE {};").format(sql.Identifier(FLAT_TABLE)))
+    conn.commit()
+    print("✅ codebase_embeddings is now partitioned by project"
+          + ("" if drop_flat else f" (old table kept as {FLAT_TABLE})"))
+
+def reindex(conn, project: str):
+    """Builds a replacement index next to the old one, so searches on the partition keep running."""
+    cursor = conn.cursor()
+    partition = partitions(cursor).get(project)
+    conn.rollback()
+    if partition is None:
+        raise ValueError(f"No partition for project {project!r}")
+
+    index = ann_index_name(partition)
+    conn.autocommit = True   # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+    try:
+        cursor.execute("SET statement_timeout = 0;")
+        cursor.execute(sql.SQL("DROP INDEX IF EXISTS {};").format(sql.Identifier(index + "_new")))  # a failed earlier run
+        lists = create_ann_index(cursor, partition, concurrently=True, name=index + "_new")
+        if lists:
+            cursor.execute(sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {};").format(sql.Identifier(index)))
+            cursor.execute(sql.SQL("ALTER INDEX {} RENAME TO {};").format(
+                sql.Identifier(index + "_new"), sql.Identifier(index)))
+    finally:
+        cursor.execute("SET statement_timeout = %s;", (STATEMENT_TIMEOUT_MS,))
+        conn.autocommit = False
+    if lists:
+        print(f"✅ {index} rebuilt (lists = {lists})")
+    else:
+        print(f"⚠️ {partition} is empty: no ANN index until it has rows")
+
+def truncate(conn, project: str):
+    cursor = conn.cursor()
+    partition = partitions(cursor).get(project)
+    if partition is None:
+        raise ValueError(f"No partition for project {project!r}")
+    truncate_tables(cursor, [partition])
+    conn.commit()
+    print(f"🧹 {partition} truncated (its ANN index is rebuilt once it has rows again)")
+
+def status(conn):
+    cursor = conn.cursor()
+    if not is_partitioned(cursor):
+        cursor.execute("SELECT count(*) FROM codebase_embeddings;")
+        print(f"📄 codebase_embeddings is a flat table ({cursor.fetchone()[0]} rows). "
+              "Run `python partition_embeddings.py migrate` to partition it.")
+        conn.rollback()
+        return
+
+    print(f"   {'project':<24} {'partition':<42} {'rows':>8} {'size':>9}  ann index")
+    for project, partition in sorted(partitions(cursor).items(), key=lambda item: item[0] or "~"):
+        cursor.execute(sql.SQL("SELECT count(*), pg_size_pretty(pg_total_relation_size(%s)) FROM {};").format(
+            sql.Identifier(partition)), (partition,))
+        rows, size = cursor.fetchone()
+        cursor.execute("SELECT reloptions FROM pg_class WHERE oid = to_regclass(%s);", (ann_index_name(partition),))
+        index = cursor.fetchone()
+        if index is None:
+            ann = "❌ missing, run reindex" if rows else "(empty)"
+        else:
+            ann = ", ".join(index[0] or [])
+            lists = next((int(opt.split("=", 1)[1]) for opt in index[0] or [] if opt.startswith("lists=")), None)
+            if lists and lists_stale(lists, rows):
+                ann += f" ⚠️ stale for {rows} rows (lists = {ann_lists(rows)}), run reindex"
+        print(f"   {project or '(default)':<24} {partition:<42} {rows:>8} {size:>9}  {ann}")
+    conn.rollback()
+
+def main():
+    print("="*60)
+    print("🧱 PARTICIONES DE codebase_embeddings POR PROYECTO")
+    print("="*60)
+
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    command = args[0] if args else "status"
+    if command in ("add", "reindex", "truncate") and len(args) < 2:
+        print(f"Usage: python partition_embeddings.py {command} <project>")
+        sys.exit(2)
+
+    conn = connect_db()
+    if not conn:
+        sys.exit(1)
+    try:
+        if command == "status":
+            status(conn)
+        elif command == "migrate":
+            migrate(conn, drop_flat="--drop-flat" in sys.argv[1:])
+        elif command == "add":
+            cursor = conn.cursor()
+            if not is_partitioned(cursor):
+                raise ValueError("codebase_embeddings is not partitioned yet (run `migrate`)")
+            name = ensure_partition(cursor, args[1])
+            conn.commit()
+            print(f"✅ {args[1]} -> {name}")
+        elif command == "reindex":
+            reindex(conn, None if args[1] == "(default)" else args[1])
+        elif command == "truncate":
+            truncate(conn, args[1])
+        else:
+            print(__doc__)
+            sys.exit(2)
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
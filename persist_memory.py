@@ -1,12 +1,18 @@
 import json
 import os
+import sys
 import time
-import psycopg2
 from datetime import datetime
+from typing import Any, Dict, Iterable, List
 
 # Reuse our robust modules
-from generate_embeddings import model, get_batch_embeddings
-from upload_embeddings import connect_db
+from generate_embeddings import get_batch_embeddings, recursive_split_text, TARGET_CHUNK_SIZE
+from db import connect_db
+from upload_embeddings import content_hash
+from lexical_index import LexicalIndex, chunk_doc_id, INDEX_FILE
+
+MEMORY_PROJECT = "ANTIGRAVITY_INTERNAL"
+EMBED_BATCH_SIZE = 5  # texts per Vertex request, as in generate_embeddings
 
 # Memory Content
 SESSION_SUMMARY = """
@@ -33,62 +39,163 @@ SESSION_SUMMARY = """
 - Se ha ejecutado el Imperativo de Registro (Law #3).
 """
 
+# ---------------------------------------------------------
+# MEMORY INGESTION
+# ---------------------------------------------------------
+def memory_document(path: str, content: str, importance: str = "high") -> Dict[str, Any]:
+    return {"path": path, "content": content, "importance": importance}
+
+def read_memory_files(paths: Iterable[str]) -> Iterable[Dict[str, Any]]:
+    """Files are keyed by their path relative to the working directory, so same-named files don't collide."""
+    for path in paths:
+        rel_path = os.path.relpath(path).replace(os.sep, "/")
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            yield memory_document(f"memory/{rel_path}", f.read())
+
+def read_memory_stream(stream) -> Iterable[Dict[str, Any]]:
+    """
+    JSON lines ({"path": ..., "content": ..., "importance": ...}) are read
+    one document per line; any other input is a single document keyed by
+    its content hash, so piping the same text again is deduplicated.
+    """
+    first = stream.readline()
+    if first.lstrip().startswith("{"):
+        for line in [first] + list(stream):
+            if line.strip():
+                doc = json.loads(line)
+                yield memory_document(doc["path"], doc["content"], doc.get("importance", "high"))
+    else:
+        content = first + stream.read()
+        yield memory_document(f"memory/stdin_{content_hash(content)[:16]}.md", content)
+
+def chunk_memories(docs: Iterable[Dict[str, Any]], project: str = MEMORY_PROJECT) -> List[Dict[str, Any]]:
+    records = []
+    for doc in docs:
+        if not doc["content"].strip():
+            continue
+        chunks = recursive_split_text(doc["content"], TARGET_CHUNK_SIZE)
+        for i, chunk in enumerate(chunks):
+            records.append({
+                "project": project,
+                "path": doc["path"],
+                "content": chunk,
+                "chunk_index": i,
+                "total_chunks": len(chunks),
+                "importance": doc["importance"],
+                "chunk_key": chunk_doc_id(project, doc["path"], i),
+                "content_hash": content_hash(chunk)
+            })
+    return records
+
+def ingest_memories(conn, docs: Iterable[Dict[str, Any]], project: str = MEMORY_PROJECT) -> Dict[str, int]:
+    """
+    Chunks the documents, embeds only chunks whose content changed (in
+    batches of EMBED_BATCH_SIZE), and upserts by chunk_key in a single
+    transaction. Chunks left over from a longer previous version of a
+    document are deleted.
+    """
+    records = chunk_memories(docs, project)
+    stats = {"chunks": len(records), "unchanged": 0, "embedded": 0, "removed": 0}
+    if not records:
+        return stats
+
+    cursor = conn.cursor()
+    keys = [r["chunk_key"] for r in records]
+    cursor.execute(
+        "SELECT chunk_key, content_hash FROM codebase_embeddings WHERE chunk_key = ANY(%s);",
+        (keys,)
+    )
+    stored = dict(cursor.fetchall())
+    from embedding_versions import active_model, store_embeddings
+    model = active_model(cursor)
+    conn.rollback()  # don't hold the read transaction open across Vertex calls
+
+    changed = [r for r in records if stored.get(r["chunk_key"]) != r["content_hash"]]
+    stats["unchanged"] = len(records) - len(changed)
+
+    for i in range(0, len(changed), EMBED_BATCH_SIZE):
+        batch = changed[i:i + EMBED_BATCH_SIZE]
+        vectors = get_batch_embeddings([r["content"] for r in batch], model)
+        if len(vectors) != len(batch):
+            raise RuntimeError("Fallo al generar embeddings")
+        for record, vector in zip(batch, vectors):
+            record["embedding"] = vector
+        print(f"   ⚡ {min(i + EMBED_BATCH_SIZE, len(changed))}/{len(changed)} fragmentos vectorizados")
+    stats["embedded"] = len(changed)
+
+    now = datetime.now().isoformat()
+    try:
+        if changed:
+            store_embeddings(cursor, [(
+                r["project"], r["path"], r["content"], r["embedding"],
+                json.dumps({
+                    # We treat this as a special "System Memory" file
+                    "type": "conversation_memory",
+                    "date": now,
+                    "importance": r["importance"],
+                    "chunk_index": r["chunk_index"],
+                    "total_chunks": r["total_chunks"],
+                    "model": model
+                }),
+                r["chunk_key"], r["content_hash"]
+            ) for r in changed])
+
+        paths = sorted({r["path"] for r in records})
+        cursor.execute("""
+            DELETE FROM codebase_embeddings
+            WHERE project = %s AND file_path = ANY(%s) AND NOT (chunk_key = ANY(%s))
+            RETURNING chunk_key;
+        """, (project, paths, keys))
+        removed = [row[0] for row in cursor.fetchall()]
+        stats["removed"] = len(removed)
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    if changed or removed:
+        lexical = LexicalIndex.load(INDEX_FILE)
+        for key in removed:
+            lexical.remove(key)
+        for r in changed:
+            lexical.add(r["chunk_key"], r["content"], r["project"], r["path"], r["chunk_index"],
+                        {"type": "conversation_memory", "total_chunks": r["total_chunks"]})
+        lexical.save(INDEX_FILE)
+
+    return stats
+
 def main():
     print("="*60)
     print("🧠 PERSISTIENDO MEMORIA DE SESIÓN")
     print("="*60)
-    
-    # 1. Generate Embedding
-    print("⚡ Generando vector de pensamiento...")
-    try:
-        # We wrap in a list as get_batch_embeddings expects list
-        vectors = get_batch_embeddings([SESSION_SUMMARY])
-        if not vectors:
-            print("❌ Fallo al generar embedding.")
-            return
-        vector = vectors[0]
-    except Exception as e:
-        print(f"❌ Error Vertex AI: {e}")
-        return
 
-    # 2. Insert into DB
+    # Sources: files given as arguments, "-" for stdin, or the built-in summary
+    args = sys.argv[1:]
+    if args == ["-"]:
+        docs = list(read_memory_stream(sys.stdin))
+    elif args:
+        docs = list(read_memory_files(args))
+    else:
+        docs = [memory_document("memory/session_2026_01_21.md", SESSION_SUMMARY)]
+    print(f"📥 Documentos de memoria: {len(docs)}")
+
     conn = connect_db()
     if not conn:
         return
-    
+
     try:
-        cursor = conn.cursor()
-        print("💾 Grabando en `codebase_embeddings`...")
-        
-        query = """
-            INSERT INTO codebase_embeddings (project, file_path, content, embedding, metadata)
-            VALUES (%s, %s, %s, %s, %s)
-            ON CONFLICT (id) DO NOTHING;
-        """
-        
-        # We treat this as a special "System Memory" file
-        metadata = json.dumps({
-            "type": "conversation_memory",
-            "date": datetime.now().isoformat(),
-            "importance": "high"
-        })
-        
-        cursor.execute(query, (
-            "ANTIGRAVITY_INTERNAL", 
-            "memory/session_2026_01_21.md", 
-            SESSION_SUMMARY, 
-            vector, 
-            metadata
-        ))
-        
-        conn.commit()
+        start = time.time()
+        stats = ingest_memories(conn, docs)
+        print(f"💾 {stats['chunks']} fragmentos: {stats['embedded']} vectorizados, "
+              f"{stats['unchanged']} sin cambios, {stats['removed']} eliminados "
+              f"({time.time() - start:.2f}s)")
         print("✅ Memoria cristalizada exitosamente.")
-        
     except Exception as e:
-        print(f"❌ Error DB: {e}")
-        conn.rollback()
+        print(f"❌ Error: {e}")
     finally:
         conn.close()
 
 if __name__ == "__main__":
-    main()
+    from profiling import run_main  # --profile
+    run_main("persist_memory", main)
@@ -0,0 +1,401 @@
+"""
+🏭 INDEXING PIPELINE: SCAN -> CHUNK -> EMBED -> UPLOAD IN ONE STREAM
+
+Replaces the scan_codebase.py / generate_embeddings.py / upload_embeddings.py
+hand-off through JSON files. Stages run concurrently and pass records
+through bounded queues, so embedding starts with the first file scanned
+and a slow stage pushes back on the ones before it instead of piling up
+memory. Only chunks whose content_hash changed are embedded; rows are
+upserted by chunk_key and, after a clean run, rows for chunks that no
+longer exist are deleted.
+
+    python pipeline.py [--dry-run] [--chunk-workers=4] [--embed-workers=1] [--upload-workers=1] [--queue-size=64]
+"""
+
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from generate_embeddings import get_batch_embeddings, iter_chunked_files, INPUT_FILE
+import metrics
+from lexical_index import LexicalIndex, chunk_doc_id, INDEX_FILE
+from scan_codebase import DIRECTORIES_TO_SCAN, scan_directory
+from db import connect_db
+from upload_embeddings import content_hash
+
+# Configuration
+QUEUE_SIZE = 64             # items buffered between two stages (back-pressure beyond this)
+CHUNK_WORKERS = None        # processes reading and splitting files (None: one per core)
+HASH_WORKERS = 2            # threads hashing chunks and dropping unchanged ones
+EMBED_WORKERS = 1           # the 50 RPM limiter is shared, so more only helps with API latency
+UPLOAD_WORKERS = 1
+EMBED_BATCH_SIZE = 5        # texts per Vertex request, as in generate_embeddings
+UPLOAD_BATCH_SIZE = 25      # rows per insert, as in upload_embeddings
+LINGER_SECONDS = 0.5        # a partial batch waits this long for more items
+POLL_SECONDS = 0.1          # how often blocked workers check for a failure elsewhere
+
+_DONE = object()
+
+# ---------------------------------------------------------
+# ORCHESTRATOR
+# ---------------------------------------------------------
+class Stage:
+    """
+    `workers` threads take batches of up to `batch_size` items from the
+    inbox, call fn(batch) and put whatever it returns on the outbox.
+    """
+
+    def __init__(self, name: str, fn: Callable[[List[Any]], Iterable[Any]], workers: int = 1,
+                 batch_size: int = 1, linger: float = LINGER_SECONDS):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.linger = linger
+        self.stats = {"in": 0, "out": 0, "busy_s": 0.0, "starved_s": 0.0, "blocked_s": 0.0}
+        self._lock = threading.Lock()
+        self._running = 0
+
+    def _count(self, **deltas):
+        with self._lock:
+            for key, value in deltas.items():
+                self.stats[key] += value
+
+class Pipeline:
+    """
+    Bounded queues between stages; end of input travels as one _DONE
+    marker per downstream worker. The first exception stops every stage
+    and is re-raised by run().
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = QUEUE_SIZE):
+        self.stages = stages
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self.stop = threading.Event()
+        self.error: Optional[BaseException] = None
+        self.source_stats = {"out": 0, "blocked_s": 0.0}
+
+    def _put(self, q: queue.Queue, item: Any) -> float:
+        """Blocks while the queue is full (back-pressure); returns the time spent waiting."""
+        start = time.perf_counter()
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=POLL_SECONDS)
+                break
+            except queue.Full:
+                continue
+        return time.perf_counter() - start
+
+    def _get(self, q: queue.Queue, timeout: Optional[float] = None) -> Any:
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while not self.stop.is_set():
+            wait = POLL_SECONDS if deadline is None else min(POLL_SECONDS, deadline - time.perf_counter())
+            if wait <= 0:
+                raise queue.Empty
+            try:
+                return q.get(timeout=wait)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _fail(self, error: BaseException):
+        if self.error is None:
+            self.error = error
+        self.stop.set()
+
+    def _feed(self, source: Iterable[Any]):
+        try:
+            for item in source:
+                if self.stop.is_set():
+                    return
+                self.source_stats["blocked_s"] += self._put(self.queues[0], item)
+                self.source_stats["out"] += 1
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            close = getattr(source, "close", None)
+            if close is not None:
+                close()  # a generator source releases what it holds (e.g. a process pool)
+            for _ in range(self.stages[0].workers):
+                self._put(self.queues[0], _DONE)
+
+    def _work(self, index: int):
+        stage = self.stages[index]
+        inbox = self.queues[index]
+        outbox = self.queues[index + 1] if index + 1 < len(self.stages) else None
+        finished = False
+        try:
+            while not finished and not self.stop.is_set():
+                start = time.perf_counter()
+                item = self._get(inbox)
+                batch = []
+                if item is _DONE:
+                    finished = True
+                else:
+                    batch.append(item)
+                    # Fill the batch, but don't hold a partial one forever
+                    while len(batch) < stage.batch_size:
+                        try:
+                            item = self._get(inbox, stage.linger)
+                        except queue.Empty:
+                            break
+                        if item is _DONE:
+                            finished = True
+                            break
+                        batch.append(item)
+                stage._count(starved_s=time.perf_counter() - start)
+                if not batch:
+                    continue
+
+                start = time.perf_counter()
+                with metrics.timer(f"pipeline_{stage.name}"):
+                    results = list(stage.fn(batch))
+                stage._count(busy_s=time.perf_counter() - start, **{"in": len(batch)})
+                if outbox is not None:
+                    blocked = sum(self._put(outbox, result) for result in results)
+                    stage._count(blocked_s=blocked)
+                stage._count(out=len(results))
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            with stage._lock:
+                stage._running -= 1
+                last = stage._running == 0
+            if last and outbox is not None:
+                for _ in range(self.stages[index + 1].workers):
+                    self._put(outbox, _DONE)
+
+    def run(self, source: Iterable[Any]) -> Dict[str, Dict[str, float]]:
+        threads = [threading.Thread(target=self._feed, args=(source,), name="source", daemon=True)]
+        for index, stage in enumerate(self.stages):
+            stage._running = stage.workers
+            threads += [threading.Thread(target=self._work, args=(index,), name=f"{stage.name}-{i}", daemon=True)
+                        for i in range(stage.workers)]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(POLL_SECONDS)
+        except KeyboardInterrupt as e:
+            self._fail(e)
+            for thread in threads:
+                thread.join()
+        if self.error is not None:
+            raise self.error
+        return {"source": dict(self.source_stats), **{s.name: dict(s.stats) for s in self.stages}}
+
+# ---------------------------------------------------------
+# INDEXING STAGES
+# ---------------------------------------------------------
+class IndexingRun:
+    """State shared by the stages of one indexing run."""
+
+    def __init__(self, conn, dry_run: bool = False):
+        self.conn = conn
+        self.dry_run = dry_run
+        self.lock = threading.Lock()
+        self.files: List[Dict[str, Any]] = []
+        self.stored: Dict[str, Any] = {}          # chunk_key -> (content_hash, file_path)
+        self.seen_keys = set()
+        self.failed_paths = set()                 # (project, rel_path) we couldn't read
+        self.counts = {"files": 0, "chunks": 0, "unchanged": 0, "embedded": 0, "upserted": 0,
+                       "read_errors": 0, "removed": 0}
+        self.lexical = LexicalIndex.load(INDEX_FILE)
+
+    def load_stored(self, projects: List[str]):
+        if self.conn is None:
+            return
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT chunk_key, content_hash, file_path FROM codebase_embeddings
+            WHERE project = ANY(%s) AND chunk_key IS NOT NULL;
+        """, (projects,))
+        self.stored = {key: (h, path) for key, h, path in cursor.fetchall()}
+        self.conn.rollback()
+
+    def scan(self, roots: List[str]) -> Iterable[Dict[str, Any]]:
+        for root in roots:
+            for item in scan_directory(root):
+                self.files.append(item)
+                yield item
+
+    def chunk(self, batch: List[Tuple[Dict[str, Any], Optional[List[str]], Optional[str]]]
+              ) -> Iterable[Dict[str, Any]]:
+        """Hashes the chunks iter_chunked_files produced and drops the unchanged ones."""
+        for item, chunks, read_error in batch:
+            if read_error is not None:
+                with self.lock:
+                    self.failed_paths.add((item["project"], item["rel_path"]))
+                    self.counts["read_errors"] += 1
+                continue
+            with self.lock:
+                self.counts["files"] += 1
+            for i, chunk in enumerate(chunks):
+                record = {
+                    "id": item["full_path"],
+                    "full_path": item["full_path"],
+                    "project": item["project"],
+                    "path": item["rel_path"],
+                    "content": chunk,
+                    "chunk_index": i,
+                    "total_chunks": len(chunks),
+                    "chunk_key": chunk_doc_id(item["project"], item["rel_path"], i),
+                    "content_hash": content_hash(chunk)
+                }
+                stored = self.stored.get(record["chunk_key"])
+                with self.lock:
+                    self.counts["chunks"] += 1
+                    self.seen_keys.add(record["chunk_key"])
+                    if stored is not None and stored[0] == record["content_hash"]:
+                        self.counts["unchanged"] += 1
+                        continue
+                yield record
+
+    def embed(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not self.dry_run:
+            from embedding_versions import active_model
+            model = active_model()
+            vectors = get_batch_embeddings([r["content"] for r in batch], model)
+            if len(vectors) != len(batch):
+                raise RuntimeError(f"Fallo al generar embeddings ({batch[0]['path']})")
+            for record, vector in zip(batch, vectors):
+                record["embedding"] = vector
+                record["model"] = model
+        with self.lock:
+            self.counts["embedded"] += len(batch)
+        return batch
+
+    def upload(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not self.dry_run:
+            conn = connect_db()   # pooled: checked out per batch, so workers share connections
+            if conn is None:
+                raise RuntimeError("No DB connection for the upload stage")
+            cursor = conn.cursor()
+            try:
+                from embedding_versions import store_embeddings
+                store_embeddings(cursor, [(
+                    r["project"], r["path"], r["content"], r["embedding"],
+                    json.dumps({
+                        "source": "pipeline",
+                        "original_id": r["id"],
+                        "chunk_index": r["chunk_index"],
+                        "total_chunks": r["total_chunks"],
+                        "model": r["model"]
+                    }),
+                    r["chunk_key"], r["content_hash"]
+                ) for r in batch])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+            with self.lock:
+                for r in batch:
+                    self.lexical.add(r["chunk_key"], r["content"], r["project"], r["path"], r["chunk_index"],
+                                     {"total_chunks": r["total_chunks"]})
+        with self.lock:
+            self.counts["upserted"] += len(batch)
+        return []
+
+    def stale_keys(self) -> List[str]:
+        """Stored chunks this run didn't produce, except those of files we failed to read."""
+        return sorted(key for key, (_, path) in self.stored.items()
+                      if key not in self.seen_keys and (key.split("/", 1)[0], path) not in self.failed_paths)
+
+    def finish(self):
+        stale = self.stale_keys()
+        self.counts["removed"] = len(stale)
+        if not self.dry_run:
+            if stale:
+                cursor = self.conn.cursor()
+                try:
+                    cursor.execute("DELETE FROM codebase_embeddings WHERE chunk_key = ANY(%s);", (stale,))
+                    self.conn.commit()
+                except Exception:
+                    self.conn.rollback()
+                    raise
+                for key in stale:
+                    self.lexical.remove(key)
+            self.lexical.save(INDEX_FILE)
+            with open(INPUT_FILE, "w", encoding="utf-8") as f:
+                json.dump(self.files, f, indent=2)
+
+def build_pipeline(run: IndexingRun, embed_workers: int = EMBED_WORKERS,
+                   upload_workers: int = UPLOAD_WORKERS, queue_size: int = QUEUE_SIZE) -> Pipeline:
+    return Pipeline([
+        Stage("chunk", run.chunk, HASH_WORKERS),
+        Stage("embed", run.embed, embed_workers, batch_size=EMBED_BATCH_SIZE),
+        Stage("upload", run.upload, upload_workers, batch_size=UPLOAD_BATCH_SIZE),
+    ], queue_size)
+
+def print_stage_stats(stats: Dict[str, Dict[str, float]], elapsed: float):
+    """busy = doing work, starved = waiting for input, blocked = waiting on a full queue downstream."""
+    print(f"\n   {'stage':<8} {'in':>7} {'out':>7} {'busy_s':>8} {'starved_s':>10} {'blocked_s':>10}")
+    for name, s in stats.items():
+        print(f"   {name:<8} {s.get('in', '-'):>7} {s['out']:>7} {s.get('busy_s', 0):>8.2f} "
+              f"{s.get('starved_s', 0):>10.2f} {s['blocked_s']:>10.2f}")
+    busiest = max((name for name in stats if name != "source"), key=lambda n: stats[n]["busy_s"])
+    print(f"   ⏱️ {elapsed:.2f}s en total; etapa más lenta: {busiest} "
+          f"({stats[busiest]['busy_s']:.2f}s de trabajo)")
+
+def main():
+    print("="*60)
+    print("🏭 PIPELINE DE INDEXACIÓN (SCAN -> CHUNK -> EMBED -> UPLOAD)")
+    print("="*60)
+
+    args = sys.argv[1:]
+    options = {a.split("=", 1)[0]: a.split("=", 1)[1] for a in args if a.startswith("--") and "=" in a}
+    dry_run = "--dry-run" in args
+    roots = [d for d in DIRECTORIES_TO_SCAN if os.path.exists(d)]
+
+    conn = connect_db()
+    if conn is None and not dry_run:
+        print("❌ Could not connect to database. Use --dry-run to only scan and chunk.")
+        sys.exit(1)
+    if dry_run:
+        print("🧪 Dry run: sin llamadas a Vertex ni escrituras" +
+              ("" if conn else " (sin DB: todos los fragmentos cuentan como cambiados)"))
+
+    run = IndexingRun(conn, dry_run)
+    try:
+        run.load_stored([os.path.basename(root) for root in roots])
+        chunk_workers = int(options["--chunk-workers"]) if "--chunk-workers" in options else CHUNK_WORKERS
+        pipeline = build_pipeline(
+            run,
+            embed_workers=int(options.get("--embed-workers", EMBED_WORKERS)),
+            upload_workers=int(options.get("--upload-workers", UPLOAD_WORKERS)),
+            queue_size=int(options.get("--queue-size", QUEUE_SIZE))
+        )
+        start = time.time()
+        # Files are read and split in a process pool on their way into the first queue
+        stats = pipeline.run(iter_chunked_files(run.scan(roots), chunk_workers))
+        run.finish()
+        elapsed = time.time() - start
+
+        c = run.counts
+        print(f"\n📂 {c['files']} archivos, {c['chunks']} fragmentos: {c['unchanged']} sin cambios, "
+              f"{c['embedded']} vectorizados, {c['upserted']} subidos, {c['removed']} eliminados"
+              + (" (dry run)" if dry_run else ""))
+        if c["read_errors"]:
+            print(f"   ⚠️ {c['read_errors']} archivos ilegibles (sus filas se conservan)")
+        print_stage_stats(stats, elapsed)
+    except KeyboardInterrupt:
+        print("\n⛔ Interrumpido: lo subido queda; la próxima corrida solo procesa lo pendiente")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ Pipeline detenido: {e}")
+        print("   Lo subido queda; la próxima corrida solo procesa lo pendiente")
+        sys.exit(1)
+    finally:
+        if conn is not None:
+            conn.close()
+
+if __name__ == "__main__":
+    from profiling import run_main  # --profile
+    run_main("pipeline", main)
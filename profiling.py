@@ -0,0 +1,241 @@
+"""
+🔬 OPT-IN PROFILING FOR THE PIPELINE SCRIPTS
+
+`--profile` on any entry point wrapped with run_main() writes one
+directory per run:
+
+    profile_<script>_<timestamp>/
+        cprofile.pstats     deterministic profile of the main thread (snakeviz, pstats)
+        stacks.collapsed    wall-clock stack samples of every thread, one
+                            "frame;frame;frame count" line per stack
+                            (flamegraph.pl, speedscope, inferno)
+        report.json         wall time and peak memory per stage, top
+                            functions, allocation sites live at exit
+
+Stages are the metrics.timer() sections the scripts already have
+(embed_api, limiter_wait, sync_log_write, json_save, ...), so samples are
+tagged with the stage they were taken in. `--profile=cpu` skips
+tracemalloc, which slows allocation-heavy code down noticeably.
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import metrics
+
+# Configuration
+SAMPLE_INTERVAL = 0.005     # seconds between stack samples
+TRACEMALLOC_FRAMES = 10
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 25
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class StackSampler(threading.Thread):
+    """
+    Samples every thread's stack at a fixed interval. Waiting threads
+    are sampled too, so the result is wall-clock time: a thread asleep in
+    the rate limiter shows up as such.
+    """
+
+    def __init__(self, stage_of: Callable[[int], Optional[str]], interval: float = SAMPLE_INTERVAL):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.stage_of = stage_of
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(f"[{self.stage_of(ident) or '-'}]")
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in sorted(self.stacks.items()))
+
+class Profiler:
+    """Receives stage boundaries from metrics timers and owns the profilers of one run."""
+
+    def __init__(self, script: str, memory: bool = True, interval: float = SAMPLE_INTERVAL):
+        self.script = script
+        self.memory = memory
+        self.lock = threading.Lock()
+        self.open_stages: Dict[int, List[str]] = {}      # thread -> nested stage names
+        self.stage_stats: Dict[str, Dict[str, float]] = {}
+        self.peak_stack: List[int] = []                  # main-thread stages only: running peaks
+        self.main_thread = threading.get_ident()
+        self.cprofile = cProfile.Profile()
+        self.sampler = StackSampler(self.stage_of, interval)
+        self.started_at = 0.0
+        self.wall_s = 0.0
+
+    def stage_of(self, ident: int) -> Optional[str]:
+        stages = self.open_stages.get(ident)
+        return stages[-1] if stages else None
+
+    # metrics listener
+    def enter(self, stage: str):
+        ident = threading.get_ident()
+        with self.lock:
+            self.open_stages.setdefault(ident, []).append(stage)
+        if self.memory and ident == self.main_thread:
+            # Peaks nest: the enclosing stage keeps the highest value seen so far
+            if self.peak_stack:
+                self.peak_stack[-1] = max(self.peak_stack[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self.peak_stack.append(0)
+
+    def exit(self, stage: str, seconds: float):
+        ident = threading.get_ident()
+        peak = None
+        if self.memory and ident == self.main_thread and self.peak_stack:
+            peak = max(self.peak_stack.pop(), tracemalloc.get_traced_memory()[1])
+            if self.peak_stack:
+                self.peak_stack[-1] = max(self.peak_stack[-1], peak)
+        with self.lock:
+            stages = self.open_stages.get(ident)
+            if stages:
+                stages.pop()
+            stats = self.stage_stats.setdefault(stage, {"calls": 0, "wall_s": 0.0, "peak_kb": None})
+            stats["calls"] += 1
+            stats["wall_s"] += seconds
+            if peak is not None:
+                stats["peak_kb"] = max(stats["peak_kb"] or 0, round(peak / 1024, 1))
+
+    def start(self):
+        if self.memory:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        metrics.REGISTRY.listener = self
+        self.started_at = time.perf_counter()
+        self.sampler.start()
+        self.cprofile.enable()
+
+    def stop(self):
+        self.cprofile.disable()
+        self.sampler.stop()
+        self.wall_s = time.perf_counter() - self.started_at
+        metrics.REGISTRY.listener = None
+
+    # -----------------------------------------------------
+    # ARTIFACT
+    # -----------------------------------------------------
+    def _top_functions(self) -> List[Dict[str, Any]]:
+        stats = pstats.Stats(self.cprofile)
+        rows = []
+        for (filename, line, name), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+            rows.append({"function": f"{name} ({os.path.basename(filename)}:{line})",
+                         "calls": ncalls, "self_s": round(tottime, 4), "cumulative_s": round(cumtime, 4)})
+        rows.sort(key=lambda r: r["cumulative_s"], reverse=True)
+        return rows[:TOP_FUNCTIONS]
+
+    def _memory_report(self) -> Optional[Dict[str, Any]]:
+        if not self.memory:
+            return None
+        current, peak = tracemalloc.get_traced_memory()
+        # Leave out the profilers' own bookkeeping
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, path) for path in
+            (tracemalloc.__file__, cProfile.__file__, pstats.__file__, __file__, "<frozen importlib._bootstrap*>")
+        ])
+        tracemalloc.stop()
+        return {
+            "current_kb": round(current / 1024, 1),
+            "peak_kb": round(peak / 1024, 1),
+            "live_at_exit": [   # allocation sites still holding memory when the run ended
+                {"where": f"{os.path.basename(s.traceback[0].filename)}:{s.traceback[0].lineno}",
+                 "size_kb": round(s.size / 1024, 1), "blocks": s.count}
+                for s in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+            ]
+        }
+
+    def write(self, directory: Optional[str] = None) -> str:
+        directory = directory or f"profile_{self.script}_{datetime.now():%Y%m%d_%H%M%S}"
+        os.makedirs(directory, exist_ok=True)
+        self.cprofile.dump_stats(os.path.join(directory, "cprofile.pstats"))
+        with open(os.path.join(directory, "stacks.collapsed"), "w", encoding="utf-8") as f:
+            f.write(self.sampler.collapsed())
+
+        stage_samples: Counter = Counter()
+        for stack, n in self.sampler.stacks.items():
+            stage_samples[stack.split(";", 2)[1].strip("[]")] += n
+        report = {
+            "script": self.script,
+            "argv": sys.argv,
+            "wall_s": round(self.wall_s, 3),
+            "sample_interval_ms": self.sampler.interval * 1000,
+            "samples": self.sampler.samples,
+            "stages": {name: {**s, "wall_s": round(s["wall_s"], 4)}
+                       for name, s in sorted(self.stage_stats.items(), key=lambda i: -i[1]["wall_s"])},
+            "samples_by_stage": dict(stage_samples.most_common()),
+            "top_functions": self._top_functions(),
+            "memory": self._memory_report()
+        }
+        with open(os.path.join(directory, "report.json"), "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        self.print_summary(report, directory)
+        return directory
+
+    @staticmethod
+    def print_summary(report: Dict[str, Any], directory: str):
+        print(f"\n🔬 Profile ({report['wall_s']:.2f}s, {report['samples']} samples) -> {directory}/")
+        for name, s in list(report["stages"].items())[:10]:
+            share = s["wall_s"] / report["wall_s"] * 100 if report["wall_s"] else 0
+            peak = f", peak {s['peak_kb'] / 1024:.1f} MB" if s["peak_kb"] is not None else ""
+            print(f"   {name:<24} {s['calls']:>6}x {s['wall_s']:>8.2f}s ({share:4.1f}%){peak}")
+        if report["memory"]:
+            print(f"   Peak traced memory: {report['memory']['peak_kb'] / 1024:.1f} MB")
+        print("   Flamegraph: flamegraph.pl stacks.collapsed > flame.svg (or open it in speedscope)")
+
+def profile_mode(args: List[str]) -> Optional[str]:
+    """'full', 'cpu' or None, from --profile / --profile=cpu / PIPELINE_PROFILE."""
+    for arg in args:
+        if arg == "--profile":
+            return "full"
+        if arg.startswith("--profile="):
+            return arg.split("=", 1)[1] or "full"
+    return os.environ.get("PIPELINE_PROFILE") or None
+
+def run_main(script: str, main: Callable[[], Any]):
+    """
+    Runs main(), under the profilers when --profile is given. The flag is
+    removed from sys.argv first, so scripts that treat their arguments as
+    file names never see it.
+    """
+    mode = profile_mode(sys.argv[1:])
+    if mode is None:
+        return main()
+    sys.argv = [sys.argv[0]] + [a for a in sys.argv[1:] if not (a == "--profile" or a.startswith("--profile="))]
+
+    profiler = Profiler(script, memory=(mode != "cpu"))
+    profiler.start()
+    try:
+        return main()
+    finally:
+        profiler.stop()
+        profiler.write()
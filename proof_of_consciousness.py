@@ -1,32 +1,50 @@
-import os
-import psycopg2
-import json
+from db import connect_db
+from hybrid_search import vector_search
+from context_pack import assemble_context, describe_range
+from search_client import SearchClient, ServiceUnavailable
 
-# Configuration from .env
-ENV_PATH = r'c:\Users\rmend\Desktop\LAVASECO ORQUIDEAS\lavaseco-app\.env'
+QUESTIONS = [
+    "Donde se define la estructura de los pedidos (Order) en Lavaseco?",
+    "Que componente de hydra-web visualiza o interactua con pedidos?"
+]
 
-def load_env(path: str):
-    env = {}
-    if os.path.exists(path):
-        with open(path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                if '=' in line:
-                    k, v = line.split('=', 1)
-                    env[k.strip()] = v.strip().strip('"').strip("'")
-    return env
+def print_pack(pack):
+    for f in pack["files"]:
+        print(f"   👉 Match ({f['score']:.4f}) [{f['project']}]: {f['file_path']}")
+        for r in f["ranges"]:
+            content = r["content"][:200].replace('\n', ' ')
+            print(f"      Context ({describe_range(r, f['total_chunks'])}): {content}...")
 
-config = load_env(ENV_PATH)
-DB_URL = config.get('DATABASE_URL')
+def ask_search_service() -> bool:
+    """Answers through a running search_service.py; False if none is up."""
+    client = SearchClient()
+    try:
+        client.health()
+        print("🛰️ Using warm search service...")
+        for q in QUESTIONS:
+            print(f"\n❓ PREGUNTA: {q}")
+            result = client.search(q, count=10, threshold=0.5, context=True,
+                                   token_budget=1500, max_files=3)
+            if not result["hits"]:
+                print("   ❌ No direct matches found (>0.5 similarity).")
+            print_pack(result["context"])
+        return True
+    except ServiceUnavailable:
+        return False
+    finally:
+        client.close()
 
 def main():
     print("="*60)
     print("🧠 PROOF OF CONSCIOUSNESS: 360 INTEGRATION")
     print("="*60)
+
+    if ask_search_service():
+        return
     
-    conn = psycopg2.connect(DB_URL)
+    conn = connect_db()
+    if conn is None:
+        return
     cursor = conn.cursor()
 
     # We need to generate embeddings for the questions to query the DB.
@@ -39,37 +57,25 @@ def main():
     # I can try to use the `generate_embeddings.py` module to get the vector for the query!
     
     try:
-        from generate_embeddings import model
+        from generate_embeddings import init_model
+        from embedding_versions import active_model
+        model_name = active_model(cursor)
+        model = init_model(model_name)
         print("💡 Generating query vectors...")
         
-        questions = [
-            "Donde se define la estructura de los pedidos (Order) en Lavaseco?",
-            "Que componente de hydra-web visualiza o interactua con pedidos?"
-        ]
+        embeddings = model.get_embeddings(QUESTIONS)
         
-        embeddings = model.get_embeddings(questions)
-        
-        for i, q in enumerate(questions):
+        for i, q in enumerate(QUESTIONS):
             print(f"\n❓ PREGUNTA: {q}")
             vector = embeddings[i].values
             
-            cursor.execute("""
-                select project, file_path, content, similarity 
-                from match_codebase(%s::vector, 0.5, 3)
-            """, (vector,))
-            
-            results = cursor.fetchall()
-            if not results:
+            # Over-fetch chunks, then fold them into file-level hits so one
+            # large file cannot take every slot.
+            hits = vector_search(cursor, vector, 0.5, 10, model=model_name)
+            if not hits:
                  print("   ❌ No direct matches found (>0.5 similarity).")
-            
-            for r in results:
-                project = r[0]
-                path = r[1]
-                sim = r[3]
-                print(f"   👉 Match ({sim:.4f}) [{project}]: {path}")
-                # print snippet
-                content = r[2][:200].replace('\n', ' ')
-                print(f"      Context: {content}...")
+
+            print_pack(assemble_context(hits, token_budget=1500, max_files=3))
 
     except ImportError:
         print("⚠️ Could not import generation model. Ensure generate_embeddings.py is in the same folder.")
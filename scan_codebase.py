@@ -1,11 +1,17 @@
 import os
 import json
+import time
+
+import metrics
+from db import setting
 
 # Configuration
-DIRECTORIES_TO_SCAN = [
+# SCAN_DIRECTORIES (environment or .env) overrides these: paths joined by os.pathsep (";" on Windows)
+DEFAULT_DIRECTORIES = [
     r"c:\Users\rmend\Desktop\LAVASECO ORQUIDEAS\lavaseco-app",
     r"c:\Users\rmend\Desktop\ESTEROIDES DE ANTIGRAVITY\06_01_2026_FRONTEND\hydra-web"
 ]
+DIRECTORIES_TO_SCAN = [d for d in setting("SCAN_DIRECTORIES", "").split(os.pathsep) if d] or DEFAULT_DIRECTORIES
 
 EXTENSIONS = {'.ts', '.tsx', '.js', '.jsx', '.py', '.md', '.prisma'}
 
@@ -17,6 +23,7 @@ IGNORE_DIRS = {
 def scan_directory(root_path):
     found_files = []
     print(f"Scanning: {root_path}...")
+    start = time.perf_counter()
     
     if not os.path.exists(root_path):
         print(f"⚠️ Warning: Path not found: {root_path}")
@@ -31,7 +38,8 @@ def scan_directory(root_path):
             if ext in EXTENSIONS:
                 full_path = os.path.join(root, file)
                 # Store relative path for readability, but keep full path for processing
-                rel_path = os.path.relpath(full_path, root_path)
+                # Forward slashes on every OS so path-prefix filters match
+                rel_path = os.path.relpath(full_path, root_path).replace(os.sep, "/")
                 found_files.append({
                     "full_path": full_path,
                     "rel_path": rel_path,
@@ -39,12 +47,16 @@ def scan_directory(root_path):
                     "ext": ext
                 })
                 
+    project = os.path.basename(root_path)
+    metrics.observe("scan", time.perf_counter() - start, project=project)
+    metrics.count("files_scanned", len(found_files), project=project)
     return found_files
 
 def main():
     print("="*60)
     print("🔍 CODEBASE SCANNER FOR GRAPHRAG")
     print("="*60)
+    metrics.enable_from_args()
     
     all_files = []
     for directory in DIRECTORIES_TO_SCAN:
@@ -53,13 +65,15 @@ def main():
         print(f"   -> Found {len(files)} files in {os.path.basename(directory)}")
 
     output_file = "codebase_map.json"
-    with open(output_file, "w", encoding="utf-8") as f:
+    with metrics.timer("json_save"), open(output_file, "w", encoding="utf-8") as f:
         json.dump(all_files, f, indent=2)
 
     print("\n" + "="*60)
     print(f"✅ SCAN COMPLETE. Found {len(all_files)} total files.")
     print(f"📄 Map saved to: {output_file}")
     print("="*60)
+    metrics.finish("scan_codebase")
 
 if __name__ == "__main__":
-    main()
+    from profiling import run_main  # --profile
+    run_main("scan_codebase", main)
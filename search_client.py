@@ -0,0 +1,79 @@
+import http.client
+import json
+import os
+import sys
+from typing import Any, Dict
+
+# Thin client for search_service.py: standard library only, so scripts that
+# use it start instantly and never load Vertex or psycopg2 themselves.
+HOST = os.environ.get("SEARCH_SERVICE_HOST", "127.0.0.1")
+PORT = int(os.environ.get("SEARCH_SERVICE_PORT", "8765"))
+TIMEOUT = 30
+
+class ServiceUnavailable(Exception):
+    pass
+
+class SearchClient:
+    """Holds one keep-alive connection to the search service."""
+
+    def __init__(self, host: str = HOST, port: int = PORT, timeout: float = TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.conn = None
+
+    def _request(self, method: str, path: str, payload: Dict[str, Any] = None) -> Dict[str, Any]:
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body else {}
+
+        # One retry covers a keep-alive connection the server already closed
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                data = json.loads(response.read() or b"{}")
+                if response.status != 200:
+                    raise RuntimeError(f"search service returned {response.status}: {data.get('error')}")
+                return data
+            except (ConnectionError, http.client.HTTPException, OSError) as e:
+                self.close()
+                if attempt == 1:
+                    raise ServiceUnavailable(f"search service not reachable at {self.host}:{self.port}: {e}")
+
+    def health(self) -> Dict[str, Any]:
+        return self._request("GET", "/health")
+
+    def search(self, query: str, **options) -> Dict[str, Any]:
+        """
+        options: count, threshold, project, path, extension, doc_type,
+        lexical_only, context, token_budget, max_files, graph, budget_ms.
+        """
+        return self._request("POST", "/search", {"query": query, **options})
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+def main():
+    query = " ".join(a for a in sys.argv[1:] if not a.startswith("--"))
+    if not query:
+        print("Usage: python search_client.py [--context] <query>")
+        return
+
+    client = SearchClient()
+    try:
+        result = client.search(query, context="--context" in sys.argv[1:])
+    except ServiceUnavailable as e:
+        print(f"❌ {e}")
+        print("   Start it with: python search_service.py")
+        sys.exit(1)
+
+    print(f"❓ {query} ({result['elapsed_ms']:.1f}ms)")
+    for hit in result["hits"]:
+        print(f"   👉 ({hit['rrf_score']:.4f}) [{hit['project']}] {hit['file_path']}")
+
+if __name__ == "__main__":
+    main()
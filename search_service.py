@@ -0,0 +1,440 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import db
+import metrics
+from lexical_index import LexicalIndex, INDEX_FILE
+from hybrid_search import hybrid_search
+from context_pack import assemble_context, DEFAULT_TOKEN_BUDGET
+from graph_rag import graph_rag_search, LATENCY_BUDGET_MS
+from memory_graph import MemoryGraph
+
+# Configuration
+HOST = os.environ.get("SEARCH_SERVICE_HOST", "127.0.0.1")
+PORT = int(os.environ.get("SEARCH_SERVICE_PORT", "8765"))
+
+WORKER_THREADS = 8          # blocking work: Vertex calls, DB queries, BM25
+VECTOR_CACHE_SIZE = 1024    # query text -> embedding
+EMBED_BATCH_WINDOW = 0.01   # seconds to collect concurrent queries into one Vertex request
+EMBED_BATCH_MAX = 5         # same batch size generate_embeddings uses
+MAX_BODY_BYTES = 1 << 20
+GRAPH_REFRESH_S = 30        # pull new nodes/relations at most this often
+MODEL_REFRESH_S = 30        # re-read the active embedding model (embedding_versions.py) this often
+
+FILTER_KEYS = ("project", "path", "extension", "doc_type")
+
+class SearchService:
+    """
+    Keeps everything a search needs warm between requests: the embedding
+    model, a query -> vector cache, the lexical index and a pool of DB
+    connections. Blocking work runs on a thread pool; the event loop only
+    parses requests and coordinates.
+    """
+
+    def __init__(self, use_vertex: bool = True, use_db: bool = True, use_graph: bool = False):
+        self.use_vertex = use_vertex
+        self.use_db = use_db
+        self.use_graph = use_graph
+        self.graph: Optional[MemoryGraph] = None
+        self.graph_refreshed_at = 0.0
+        self.graph_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=WORKER_THREADS)
+        self.pool = None
+        self.index = LexicalIndex()
+        self.index_mtime = None
+        self.index_loading: Optional[asyncio.Future] = None
+        # Keyed by (model, query): after a model flip old vectors are simply not found
+        self.vector_cache: "OrderedDict[Tuple[str, str], asyncio.Future]" = OrderedDict()
+        self.pending_embeds: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.query_model: Optional[str] = None
+        self.query_model_at = 0.0
+        self.flush_handle = None
+        self.started_at = time.time()
+        self.stats = {"requests": 0, "cache_hits": 0, "cache_misses": 0, "embed_batches": 0, "errors": 0}
+
+    # -----------------------------------------------------
+    # WARM-UP
+    # -----------------------------------------------------
+    def warm_up(self):
+        self.reload_index()
+        print(f"📚 Lexical index: {len(self.index)} chunks")
+
+        if self.use_db:
+            try:
+                self.pool = db.get_pool()
+                print(f"💾 DB pool ready (up to {self.pool.maxconn} connections)")
+            except Exception as e:
+                print(f"⚠️ DB unavailable, vector search disabled: {e}")
+                self.pool = None
+
+        if self.use_graph and self.pool is not None:
+            conn = self.pool.checkout()
+            try:
+                self.graph = MemoryGraph()
+                self.graph.load(conn)
+                self.graph_refreshed_at = time.time()
+                print(f"🕸️ Memory graph: {self.graph.node_count} nodes / {self.graph.edge_count} relations")
+            except Exception as e:
+                print(f"⚠️ Memory graph unavailable, GraphRAG will query the DB: {e}")
+                self.graph = None
+                conn.rollback()
+            finally:
+                conn.close()  # back to the pool
+
+        if self.use_vertex:
+            try:
+                from generate_embeddings import init_model
+                if self.pool is not None:
+                    from embedding_versions import active_model
+                    self.query_model = active_model()
+                    self.query_model_at = time.time()
+                init_model(self.query_model)
+                print(f"🧬 Query model: {self.query_model or 'default'}")
+            except Exception as e:
+                print(f"⚠️ Vertex unavailable, vector search disabled: {e}")
+                self.use_vertex = False
+
+    def _changed_index_mtime(self) -> Optional[float]:
+        try:
+            mtime = os.path.getmtime(INDEX_FILE)
+        except OSError:
+            return None
+        return mtime if mtime != self.index_mtime else None
+
+    def reload_index(self):
+        """Loads the index file in place; blocking, so only used before serving."""
+        mtime = self._changed_index_mtime()
+        if mtime is not None:
+            self.index = LexicalIndex.load(INDEX_FILE)
+            self.index_mtime = mtime
+
+    def refresh_index(self):
+        """
+        Picks up a rebuilt index file without restarting the service. The
+        load runs on the thread pool and the new index is swapped in when it
+        is done; requests meanwhile keep searching the current one.
+        """
+        if self.index_loading is not None:
+            return
+        mtime = self._changed_index_mtime()
+        if mtime is not None:
+            self.index_loading = asyncio.ensure_future(self._load_index(mtime))
+
+    async def _load_index(self, mtime: float):
+        loop = asyncio.get_running_loop()
+        try:
+            with metrics.timer("index_reload"):
+                index = await loop.run_in_executor(self.executor, LexicalIndex.load, INDEX_FILE)
+            self.index = index
+            print(f"📚 Lexical index reloaded: {len(index)} chunks")
+        except Exception as e:
+            print(f"⚠️ Lexical index reload failed, keeping the current one: {e}")
+        finally:
+            # A failed file is not retried until it is rebuilt again
+            self.index_mtime = mtime
+            self.index_loading = None
+
+    # -----------------------------------------------------
+    # EMBEDDINGS (cached + micro-batched)
+    # -----------------------------------------------------
+    def _embed_batch_sync(self, texts: List[str], model: str) -> List[List[float]]:
+        from generate_embeddings import get_batch_embeddings
+        return get_batch_embeddings(texts, model)
+
+    async def active_model(self) -> str:
+        """The model queries are embedded with; searches in flight keep the one they started with."""
+        if self.query_model is None or time.time() - self.query_model_at > MODEL_REFRESH_S:
+            from embedding_versions import active_model
+            loop = asyncio.get_running_loop()
+            self.query_model = await loop.run_in_executor(self.executor, active_model)
+            self.query_model_at = time.time()
+        return self.query_model
+
+    async def embed(self, query: str, model: str) -> Optional[List[float]]:
+        key = (model, query)
+        cached = self.vector_cache.get(key)
+        if cached is not None:
+            self.vector_cache.move_to_end(key)
+            self.stats["cache_hits"] += 1
+            metrics.count("query_cache", result="hit")
+            return await cached
+
+        self.stats["cache_misses"] += 1
+        metrics.count("query_cache", result="miss")
+        loop = asyncio.get_running_loop()
+        future = self.pending_embeds.get(key)
+        if future is None:
+            future = loop.create_future()
+            self.pending_embeds[key] = future
+            self.vector_cache[key] = future
+            while len(self.vector_cache) > VECTOR_CACHE_SIZE:
+                self.vector_cache.popitem(last=False)
+
+            if len(self.pending_embeds) >= EMBED_BATCH_MAX:
+                self._flush_embeds()
+            elif self.flush_handle is None:
+                self.flush_handle = loop.call_later(EMBED_BATCH_WINDOW, self._flush_embeds)
+
+        try:
+            return await future
+        except Exception:
+            self.vector_cache.pop(key, None)
+            raise
+
+    def _flush_embeds(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if not self.pending_embeds:
+            return
+
+        batch = self.pending_embeds
+        self.pending_embeds = {}
+        self.stats["embed_batches"] += 1
+        asyncio.ensure_future(self._run_embed_batch(batch))
+
+    async def _run_embed_batch(self, batch: Dict[Tuple[str, str], asyncio.Future]):
+        loop = asyncio.get_running_loop()
+        # One request per model; only a batch straddling a model flip has two
+        by_model: Dict[str, List[str]] = {}
+        for model, text in batch:
+            by_model.setdefault(model, []).append(text)
+        try:
+            for model, texts in by_model.items():
+                with metrics.timer("query_embed_batch"):
+                    vectors = await loop.run_in_executor(self.executor, self._embed_batch_sync, texts, model)
+                metrics.count("query_embed_texts", len(texts))
+                if len(vectors) != len(texts):
+                    raise RuntimeError("embedding request failed")
+                for text, vector in zip(texts, vectors):
+                    batch[(model, text)].set_result(vector)
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+
+    # -----------------------------------------------------
+    # SEARCH
+    # -----------------------------------------------------
+    def _search_sync(self, query: str, vector, count: int, threshold: float,
+                     filters: Dict[str, str], model: Optional[str] = None) -> List[Dict[str, Any]]:
+        if vector is None or self.pool is None:
+            return hybrid_search(query, self.index, None, None, count, threshold, **filters)
+
+        conn = self.pool.checkout()
+        try:
+            cursor = conn.cursor()
+            hits = hybrid_search(query, self.index, cursor, vector, count, threshold, model=model, **filters)
+            cursor.close()
+            conn.rollback()  # ends the transaction, so per-call probes don't leak
+            return hits
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()  # back to the pool
+
+    def _graph_search_sync(self, vector, count: int, threshold: float, budget_ms: float,
+                           filters: Dict[str, str], model: Optional[str] = None) -> Dict[str, Any]:
+        conn = self.pool.checkout()
+        try:
+            stale = time.time() - self.graph_refreshed_at > GRAPH_REFRESH_S
+            if self.graph is not None and stale and self.graph_lock.acquire(blocking=False):
+                # One worker refreshes a copy and swaps it in; searches already
+                # running keep traversing the graph they started with
+                try:
+                    graph = self.graph.copy()
+                    graph.refresh(conn)
+                    self.graph = graph
+                    self.graph_refreshed_at = time.time()
+                finally:
+                    self.graph_lock.release()
+            graph = self.graph
+            result = graph_rag_search(conn.cursor(), vector, graph, count, threshold, budget_ms,
+                                      model=model, **filters)
+            conn.rollback()
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()  # back to the pool
+
+    async def search(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        query = str(params.get("query", "")).strip()
+        if not query:
+            raise ValueError("missing 'query'")
+
+        count = int(params.get("count", 5))
+        threshold = float(params.get("threshold", 0.3))
+        filters = {k: params[k] for k in FILTER_KEYS if params.get(k)}
+        start = time.perf_counter()
+
+        self.refresh_index()
+        vector = None
+        model = None
+        if self.use_vertex and self.pool is not None and not params.get("lexical_only"):
+            model = await self.active_model()
+            vector = await self.embed(query, model)
+
+        loop = asyncio.get_running_loop()
+        if params.get("graph") and vector is not None:
+            result = await loop.run_in_executor(self.executor, self._graph_search_sync, vector, count, threshold,
+                                                float(params.get("budget_ms", LATENCY_BUDGET_MS)), filters, model)
+            result["query"] = query
+            hits = result["hits"]
+        else:
+            hits = await loop.run_in_executor(self.executor, self._search_sync, query, vector,
+                                              count, threshold, filters, model)
+            result = {"query": query, "hits": hits}
+        if params.get("context"):
+            max_files = params.get("max_files")
+            result["context"] = assemble_context(hits, int(params.get("token_budget", DEFAULT_TOKEN_BUDGET)),
+                                                 int(max_files) if max_files else None)
+        result["elapsed_ms"] = (time.perf_counter() - start) * 1000
+        return result
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "status": "ok",
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "index_chunks": len(self.index),
+            "vector_search": bool(self.use_vertex and self.pool),
+            "db_pool": self.pool.stats() if self.pool is not None else None,
+            "graph_nodes": self.graph.node_count if self.graph is not None else None,
+            "cached_queries": len(self.vector_cache),
+            "embedding_model": self.query_model,
+            **self.stats
+        }
+
+    def metrics_text(self) -> str:
+        metrics.gauge("index_chunks", len(self.index))
+        metrics.gauge("cached_queries", len(self.vector_cache))
+        metrics.gauge("uptime_seconds", round(time.time() - self.started_at, 1))
+        if self.graph is not None:
+            metrics.gauge("graph_nodes", self.graph.node_count)
+        if self.pool is not None:
+            pool = self.pool.stats()
+            metrics.gauge("db_connections_in_use", pool["in_use"])
+            metrics.gauge("db_connections_replaced", pool["replaced"])
+        return metrics.REGISTRY.to_prometheus()
+
+    # -----------------------------------------------------
+    # HTTP (minimal HTTP/1.1 with keep-alive)
+    # -----------------------------------------------------
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode("latin-1").split()
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    await self.respond(writer, 413, {"error": "body too large"}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload = await self.route(method, path, body)
+                close = headers.get("connection", "").lower() == "close" or version == "HTTP/1.0"
+                await self.respond(writer, status, payload, close)
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method: str, path: str, body: bytes):
+        self.stats["requests"] += 1
+        start = time.perf_counter()
+        status, payload = await self._dispatch(method, path, body)
+        label = path if path in ("/health", "/health/db", "/search", "/metrics") else "other"
+        metrics.observe("http_request", time.perf_counter() - start, route=label)
+        metrics.count("http_requests", route=label, status=status)
+        return status, payload
+
+    async def _dispatch(self, method: str, path: str, body: bytes):
+        try:
+            if method == "GET" and path == "/health":
+                return 200, self.health()
+            if method == "GET" and path == "/health/db":
+                # Round trip through the pool; kept off /health so load balancers don't hit the DB
+                check = await asyncio.get_running_loop().run_in_executor(self.executor, db.health_check)
+                return (200 if check["ok"] else 503), check
+            if method == "GET" and path == "/metrics":
+                return 200, self.metrics_text()
+            if method == "POST" and path == "/search":
+                return 200, await self.search(json.loads(body or b"{}"))
+            return 404, {"error": f"no route for {method} {path}"}
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        except Exception as e:
+            self.stats["errors"] += 1
+            return 500, {"error": str(e)}
+
+    async def respond(self, writer: asyncio.StreamWriter, status: int, payload, close: bool = False):
+        # Prometheus text for /metrics, JSON for everything else
+        if isinstance(payload, str):
+            body = payload.encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = json.dumps(payload, default=str).encode("utf-8")
+            content_type = "application/json"
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large",
+                  503: "Service Unavailable"}.get(status, "Error")
+        head = (
+            f"HTTP/1.1 {status} {reason}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    def close(self):
+        if self.pool is not None:
+            db.close_pool()
+        self.executor.shutdown(wait=False)
+
+async def serve(service: SearchService, host: str = HOST, port: int = PORT):
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    print(f"🚀 Search service listening on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+def main():
+    print("="*60)
+    print("🛰️ SEARCH SERVICE (WARM MODEL + INDEX + DB POOL)")
+    print("="*60)
+
+    lexical_only = "--lexical-only" in sys.argv[1:]
+    metrics.enable("--no-metrics" not in sys.argv[1:])  # scraped at GET /metrics
+    service = SearchService(use_vertex=not lexical_only, use_db=not lexical_only,
+                            use_graph="--graph" in sys.argv[1:])
+    service.warm_up()
+    try:
+        asyncio.run(serve(service))
+    except KeyboardInterrupt:
+        print("\n👋 Search service stopped.")
+    finally:
+        service.close()
+
+if __name__ == "__main__":
+    main()
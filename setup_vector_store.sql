@@ -9,40 +9,191 @@ create table if not exists codebase_embeddings (
   content text not null,      -- contenido del código
   embedding vector(768),      -- Dimensiones del modelo de Google (text-embedding-004)
   metadata jsonb,             -- Informacion extra (imports, functions)
-  created_at timestamptz default now()
+  created_at timestamptz default now(),
+  file_ext text generated always as (lower(substring(file_path from '\.[^./]+$'))) stored,
+  chunk_key text,             -- identidad estable: proyecto/ruta#chunk_index
+  content_hash text           -- sha256 del contenido (detecta fragmentos sin cambios)
 );
 
+-- Tablas creadas antes de la columna file_ext
+alter table codebase_embeddings
+  add column if not exists file_ext text
+  generated always as (lower(substring(file_path from '\.[^./]+$'))) stored;
+
+-- Tablas creadas antes de chunk_key / content_hash: se eliminan duplicados
+-- de re-ejecuciones (se conserva el más antiguo) y se rellenan ambas columnas.
+alter table codebase_embeddings
+  add column if not exists chunk_key text,
+  add column if not exists content_hash text;
+
+delete from codebase_embeddings a
+using codebase_embeddings b
+where a.chunk_key is null and b.chunk_key is null
+  and a.project = b.project
+  and a.file_path = b.file_path
+  and coalesce(a.metadata->>'chunk_index', '0') = coalesce(b.metadata->>'chunk_index', '0')
+  and a.id > b.id;
+
+update codebase_embeddings
+set chunk_key = project || '/' || file_path || '#' || coalesce(metadata->>'chunk_index', '0'),
+    content_hash = encode(sha256(convert_to(content, 'UTF8')), 'hex')
+where chunk_key is null;
+
+-- Clave de ON CONFLICT (project, chunk_key). Incluye project porque en la
+-- tabla particionada (partition_embeddings.py) todo índice único debe
+-- contener la clave de partición; chunk_key ya empieza por el proyecto.
+create unique index if not exists codebase_embeddings_project_chunk_key_idx
+  on codebase_embeddings (project, chunk_key);
+
 -- 3. Crear índice para búsqueda rápida (IVFFlat)
 -- NOTA: Esto es opcional al inicio, pero bueno para performance
-create index on codebase_embeddings using ivfflat (embedding vector_cosine_ops)
-with (lists = 100);
+-- Con nombre, para que re-ejecutar este script no añada otro índice igual.
+-- La tabla particionada tiene uno por partición (partition_embeddings.py).
+do $$
+begin
+  if (select relkind from pg_class where oid = 'codebase_embeddings'::regclass) <> 'p' then
+    create index if not exists codebase_embeddings_embedding_idx
+      on codebase_embeddings using ivfflat (embedding vector_cosine_ops)
+      with (lists = 100);
+  end if;
+end;
+$$;
+
+-- 4. Índices para búsquedas filtradas (proyecto, ruta, extensión, tipo)
+create index if not exists codebase_embeddings_project_path_idx
+  on codebase_embeddings (project, file_path text_pattern_ops);
+create index if not exists codebase_embeddings_path_idx
+  on codebase_embeddings (file_path text_pattern_ops);
+create index if not exists codebase_embeddings_ext_idx
+  on codebase_embeddings (file_ext);
+create index if not exists codebase_embeddings_type_idx
+  on codebase_embeddings ((metadata->>'type'));
+
+-- 4b. Versiones del modelo de embeddings (embedding_versions.py): cada modelo
+-- tiene su propia columna; la del modelo activo siempre se llama "embedding".
+create table if not exists embedding_versions (
+  version int primary key,
+  model text not null,
+  dims int not null,
+  column_name text not null,
+  status text not null check (status in ('building', 'active', 'retired', 'dropped')),
+  created_at timestamptz default now(),
+  activated_at timestamptz
+);
+create unique index if not exists embedding_versions_model_idx
+  on embedding_versions (model) where status <> 'dropped';
+create unique index if not exists embedding_versions_status_idx
+  on embedding_versions (status) where status in ('active', 'building');
+insert into embedding_versions (version, model, dims, column_name, status, activated_at)
+select 1, 'text-embedding-004', 768, 'embedding', 'active', now()
+where not exists (select 1 from embedding_versions);
+
+-- 5. Función de búsqueda semántica (RPC)
+-- Drops every existing overload: the argument list and the result
+-- columns have changed over time and "create or replace" cannot do either.
+do $$
+declare
+  fn regprocedure;
+begin
+  for fn in select oid::regprocedure from pg_proc where proname in ('match_codebase', 'match_codebase_sql') loop
+    execute 'drop function ' || fn;
+  end loop;
+end;
+$$;
+
+-- Builds the statement match_codebase executes. Kept separate so
+-- check_index_usage.py can EXPLAIN exactly the same SQL.
+create or replace function match_codebase_sql (
+  filter_project text default null,
+  filter_path text default null,
+  filter_extension text default null,
+  filter_type text default null,
+  vector_column text default 'embedding'  -- another model's column (embedding_versions.py)
+)
+returns text
+language plpgsql
+immutable
+as $$
+declare
+  vec text := 'e.' || quote_ident(vector_column);
+  predicates text := vec || ' is not null';
+begin
+  -- Only the active filters are added to the statement, so each one is a
+  -- plain indexable predicate instead of an "(param is null or ...)" branch.
+  if filter_project is not null then
+    predicates := predicates || ' and e.project = $2';
+  end if;
+  if filter_path is not null then
+    predicates := predicates || ' and e.file_path like $3';
+  end if;
+  if filter_extension is not null then
+    predicates := predicates || ' and e.file_ext = $4';
+  end if;
+  if filter_type is not null then
+    predicates := predicates || ' and e.metadata->>''type'' = $5';
+  end if;
+
+  -- The inner query is a bare "order by distance limit n", which the ANN
+  -- index serves directly; the similarity threshold is applied afterwards
+  -- to those n candidates only, instead of computing it for every row.
+  return
+    'select top.id, top.project, top.file_path, top.content, top.metadata, top.similarity
+     from (
+       select e.id, e.project, e.file_path, e.content, e.metadata,
+              1 - (' || vec || ' <=> $1) as similarity
+       from codebase_embeddings e
+       where ' || predicates || '
+       order by ' || vec || ' <=> $1
+       limit $7
+     ) top
+     where top.similarity > $6
+     order by top.similarity desc';
+end;
+$$;
 
--- 4. Función de búsqueda semántica (RPC)
 create or replace function match_codebase (
-  query_embedding vector(768),
+  query_embedding vector,              -- any dimensions: each model version has its own
   match_threshold float,
-  match_count int
+  match_count int,
+  filter_project text default null,    -- e.g. 'hydra-web'
+  filter_path text default null,       -- LIKE pattern, e.g. 'src/lib/billing/%'
+  filter_extension text default null,  -- e.g. '.ts'
+  filter_type text default null,       -- metadata->>'type', e.g. 'conversation_memory'
+  probes int default 10,               -- ivfflat lists visited (recall vs. speed)
+  ef_search int default 40,            -- hnsw candidate list size, if an hnsw index is used
+  query_model text default null        -- model that embedded the query; null = the `embedding` column
 )
 returns table (
   id bigint,
   project text,
   file_path text,
   content text,
+  metadata jsonb,
   similarity float
 )
 language plpgsql
 as $$
+declare
+  vector_column text := 'embedding';
 begin
-  return query
-  select
-    codebase_embeddings.id,
-    codebase_embeddings.project,
-    codebase_embeddings.file_path,
-    codebase_embeddings.content,
-    1 - (codebase_embeddings.embedding <=> query_embedding) as similarity
-  from codebase_embeddings
-  where 1 - (codebase_embeddings.embedding <=> query_embedding) > match_threshold
-  order by codebase_embeddings.embedding <=> query_embedding
-  limit match_count;
+  -- Transaction-local, so each call can pick its own recall/latency trade-off
+  perform set_config('ivfflat.probes', probes::text, true);
+  perform set_config('hnsw.ef_search', ef_search::text, true);
+
+  if query_model is not null and to_regclass('embedding_versions') is not null then
+    -- Locks the table before the lookup: a flip renames the columns, and
+    -- has to wait until this search is done with the one it looked up.
+    perform 1 from codebase_embeddings where false;
+    select v.column_name into vector_column
+    from embedding_versions v
+    where v.model = query_model and v.status <> 'dropped';
+    if not found then
+      raise exception 'No queryable vectors for embedding model %', query_model;
+    end if;
+  end if;
+
+  return query execute match_codebase_sql(filter_project, filter_path, filter_extension, filter_type, vector_column)
+  using query_embedding, filter_project, filter_path, lower(filter_extension), filter_type,
+        match_threshold, match_count;
 end;
 $$;
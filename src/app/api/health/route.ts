@@ -1,27 +1,69 @@
 import { NextResponse } from 'next/server';
+import { randomUUID } from 'crypto';
 import { prisma } from '@/lib/prisma';
 
 export const dynamic = 'force-dynamic';
 
+// Cold-start phases (read by cold_start.py). Everything at module scope runs
+// once per instance: the first request to this route pays for loading it.
+const processStartedAt = Date.now() - process.uptime() * 1000;
+const moduleLoadedAt = Date.now();
+const instanceId = randomUUID();
+let coldRequestServed = false;
+let dbConnectMs: number | null = null;
+
 export async function GET() {
+    const requestStartedAt = Date.now();
+    const cold = !coldRequestServed;
+    coldRequestServed = true;
+
+    const phases: Record<string, number | null> = {
+        process_to_module_ms: moduleLoadedAt - processStartedAt,
+        module_to_request_ms: cold ? requestStartedAt - moduleLoadedAt : null,
+        db_connect_ms: null,
+        db_query_ms: null,
+        handler_ms: null
+    };
+
     try {
+        // Connect explicitly the first time so pool setup isn't hidden in the query
+        if (dbConnectMs === null) {
+            const connectStart = Date.now();
+            await prisma.$connect();
+            dbConnectMs = Date.now() - connectStart;
+            phases.db_connect_ms = dbConnectMs;
+        }
+
         // Test database connection
+        const queryStart = Date.now();
         await prisma.$queryRaw`SELECT 1`;
+        phases.db_query_ms = Date.now() - queryStart;
+        phases.handler_ms = Date.now() - requestStartedAt;
 
         return NextResponse.json({
             status: 'healthy',
             timestamp: new Date().toISOString(),
             database: 'connected',
             environment: process.env.NODE_ENV,
-            version: '1.0.0'
+            version: '1.0.0',
+            instance: {
+                id: instanceId,
+                revision: process.env.K_REVISION || null,
+                cold,
+                uptime_ms: Math.round(process.uptime() * 1000)
+            },
+            phases
         });
     } catch (error: any) {
+        phases.handler_ms = Date.now() - requestStartedAt;
         return NextResponse.json({
             status: 'unhealthy',
             timestamp: new Date().toISOString(),
             database: 'disconnected',
             error: error.message,
-            environment: process.env.NODE_ENV
+            environment: process.env.NODE_ENV,
+            instance: { id: instanceId, revision: process.env.K_REVISION || null, cold },
+            phases
         }, { status: 500 });
     }
 }
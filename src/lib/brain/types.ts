@@ -1,5 +1,5 @@
 
-export type NodeType = 'Concept' | 'Technology' | 'Problem' | 'Solution' | 'Pattern' | 'Rule' | 'Error' | 'Project' | 'Preference' | 'Client' | 'Order';
+export type NodeType = 'Concept' | 'Technology' | 'Problem' | 'Solution' | 'Pattern' | 'Rule' | 'Error' | 'Project' | 'Preference' | 'Client' | 'Order' | 'File' | 'Symbol';
 
 export type RelationType = 'USES' | 'DEPENDS_ON' | 'RESOLVES' | 'CAUSES' | 'IS_A' | 'HAS' | 'CONTAINS' | 'RELATED_TO' | 'LEARNS_FROM' | 'PREFERS' | 'ORDERED';
 
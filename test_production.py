@@ -3,11 +3,11 @@
 Prueba el despliegue de Cloud Run de forma exhaustiva
 """
 
-import requests
-import time
 import sys
 from datetime import datetime
 
+from http_client import make_client
+
 # Configurar URL base (se actualizará después del despliegue)
 BASE_URL = input("Ingresa la URL de Cloud Run (ej: https://lavaseco-app-xxxxx-uc.a.run.app): ").strip()
 
@@ -22,52 +22,61 @@ print(f"🌐 URL: {BASE_URL}")
 print(f"⏰ Inicio: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 print("="*60 + "\n")
 
+# Un solo cliente keep-alive para todas las pruebas: el handshake TCP/TLS se
+# paga una vez y se reporta aparte del tiempo de servidor (--http2 para HTTP/2)
+client = make_client(BASE_URL, http2="--http2" in sys.argv, timeout=10)
+
+def format_timing(r):
+    setup = f"conexión {r['setup_ms']:.0f}ms + " if not r["reused"] else "conexión reutilizada, "
+    return f"{r['total_ms']:.0f}ms ({setup}servidor {r['server_ms']:.0f}ms, {r['http_version']})"
+
 def test_health_check():
     """Verificar que el servicio responde"""
     print("1️⃣  Test: Health Check")
     try:
-        start = time.time()
-        response = requests.get(f"{BASE_URL}/api/health", timeout=10)
-        duration = time.time() - start
+        response = client.get("/api/health")
         
-        if response.status_code == 200:
-            data = response.json()
+        if response["status"] == 200:
+            data = response["body"] or {}
             print(f"   ✅ Status: {data.get('status')}")
             print(f"   ✅ Database: {data.get('database')}")
             print(f"   ✅ Environment: {data.get('environment')}")
-            print(f"   ⏱️  Response time: {duration:.2f}s")
+            print(f"   ⏱️  Response time: {format_timing(response)}")
             return True
         else:
-            print(f"   ❌ Failed with status {response.status_code}")
+            print(f"   ❌ Failed with status {response['status']}")
             return False
     except Exception as e:
         print(f"   ❌ Error: {e}")
         return False
 
 def test_cold_start():
-    """Medir tiempo de cold start"""
+    """Medir el arranque en frío por fases (una muestra; distribución con cold_start.py)"""
     print("\n2️⃣  Test: Cold Start Performance")
+    from cold_start import timed_request, run_record
     try:
-        # Esperar 60 segundos para asegurar cold start
-        print("   ⏳ Esperando 60s para cold start...")
-        time.sleep(60)
-        
-        start = time.time()
-        response = requests.get(f"{BASE_URL}/", timeout=30)
-        duration = time.time() - start
-        
-        if response.status_code == 200:
-            print(f"   ✅ Cold start: {duration:.2f}s")
-            if duration < 5:
+        record = run_record(timed_request(f"{BASE_URL}/api/health"))
+        if record["status"] != 200:
+            print(f"   ❌ Failed with status {record['status']}")
+            return False
+
+        print(f"   ⏱️  Total: {record['total_ms']:.0f}ms (DNS {record['dns_ms']:.0f} | TCP {record['connect_ms']:.0f} | "
+              f"TLS {record['tls_ms']:.0f} | TTFB {record['ttfb_ms']:.0f})")
+        if record.get("server_handler_ms") is not None:
+            print(f"   🖥️  Servidor: handler {record['server_handler_ms']}ms, "
+                  f"DB connect {record.get('server_db_connect_ms')}ms, DB query {record.get('server_db_query_ms')}ms")
+        if record["cold"]:
+            boot = record.get("server_process_to_module_ms") or 0
+            print(f"   🥶 Instancia fría: arranque del proceso -> ruta {boot}ms")
+            if record["ttfb_ms"] < 5000:
                 print("   🎉 Excelente rendimiento!")
-            elif duration < 10:
+            elif record["ttfb_ms"] < 10000:
                 print("   ⚠️  Rendimiento aceptable")
             else:
                 print("   ⚠️  Cold start lento, considera min-instances=1")
-            return True
         else:
-            print(f"   ❌ Failed with status {response.status_code}")
-            return False
+            print("   ℹ️  La instancia ya estaba caliente; para forzar arranques en frío: python cold_start.py cloudrun")
+        return True
     except Exception as e:
         print(f"   ❌ Error: {e}")
         return False
@@ -76,16 +85,21 @@ def test_warm_requests():
     """Probar rendimiento con instancia caliente"""
     print("\n3️⃣  Test: Warm Request Performance")
     times = []
+    handler_times = []
+    setups = 0
     
     for i in range(5):
         try:
-            start = time.time()
-            response = requests.get(f"{BASE_URL}/api/health", timeout=10)
-            duration = time.time() - start
-            times.append(duration)
+            response = client.get("/api/health")
             
-            if response.status_code == 200:
-                print(f"   Request {i+1}/5: {duration:.2f}s ✅")
+            if response["status"] == 200:
+                # Solo el tiempo de servidor: el de conexión no es costo de la app
+                times.append(response["server_ms"])
+                setups += 0 if response["reused"] else 1
+                handler = ((response["body"] or {}).get("phases") or {}).get("handler_ms")
+                if handler is not None:
+                    handler_times.append(handler)
+                print(f"   Request {i+1}/5: {format_timing(response)} ✅")
             else:
                 print(f"   Request {i+1}/5: Failed ❌")
         except Exception as e:
@@ -93,9 +107,13 @@ def test_warm_requests():
     
     if times:
         avg = sum(times) / len(times)
-        print(f"\n   📊 Promedio: {avg:.2f}s")
-        print(f"   📊 Mínimo: {min(times):.2f}s")
-        print(f"   📊 Máximo: {max(times):.2f}s")
+        print(f"\n   📊 Servidor promedio: {avg:.0f}ms (incluye 1 RTT)")
+        print(f"   📊 Mínimo: {min(times):.0f}ms")
+        print(f"   📊 Máximo: {max(times):.0f}ms")
+        if handler_times:
+            print(f"   🖥️  Handler (reportado por el servidor): {sum(handler_times) / len(handler_times):.0f}ms promedio")
+        if setups:
+            print(f"   ⚠️  {setups} conexión(es) nuevas: el servidor cerró el keep-alive")
         return True
     return False
 
@@ -103,10 +121,10 @@ def test_database_connection():
     """Verificar conexión persistente a Supabase"""
     print("\n4️⃣  Test: Database Connection Persistence")
     try:
-        response = requests.get(f"{BASE_URL}/api/health", timeout=10)
+        response = client.get("/api/health")
         
-        if response.status_code == 200:
-            data = response.json()
+        if response["status"] == 200:
+            data = response["body"] or {}
             if data.get('database') == 'connected':
                 print("   ✅ Conexión a Supabase: Estable")
                 return True
@@ -115,37 +133,36 @@ def test_database_connection():
                 print(f"   Error: {data.get('error')}")
                 return False
         else:
-            print(f"   ❌ Failed with status {response.status_code}")
+            print(f"   ❌ Failed with status {response['status']}")
             return False
     except Exception as e:
         print(f"   ❌ Error: {e}")
         return False
 
 def test_concurrent_requests():
-    """Probar manejo de múltiples requests concurrentes"""
+    """Probar manejo de tráfico concurrente (carga open-loop con load_test.py)"""
     print("\n5️⃣  Test: Concurrent Request Handling")
-    import concurrent.futures
-    
-    def make_request(i):
-        try:
-            start = time.time()
-            response = requests.get(f"{BASE_URL}/api/health", timeout=10)
-            duration = time.time() - start
-            return (i, response.status_code, duration)
-        except Exception as e:
-            return (i, 0, 0)
-    
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-        futures = [executor.submit(make_request, i) for i in range(10)]
-        results = [f.result() for f in concurrent.futures.as_completed(futures)]
-    
-    success = sum(1 for _, status, _ in results if status == 200)
-    avg_time = sum(duration for _, _, duration in results if duration > 0) / len(results)
-    
-    print(f"   ✅ Exitosas: {success}/10")
-    print(f"   ⏱️  Tiempo promedio: {avg_time:.2f}s")
-    
-    return success >= 8
+    import asyncio
+    from load_test import LoadTest
+
+    # Rampa corta: 10s hasta 5 rps y 20s sostenidos a 10 rps, con la mezcla de mostrador
+    report = asyncio.run(LoadTest(BASE_URL, [(10, 5.0), (20, 10.0)]).run())
+    latency = report["latency"]
+
+    print(f"   ✅ Exitosas: {report['completed']}/{report['sent']} ({report['throughput_rps']:.1f} rps)")
+    if latency.get("count"):
+        print(f"   ⏱️  p50: {latency['p50_ms']:.0f}ms | p95: {latency['p95_ms']:.0f}ms | "
+              f"p99: {latency['p99_ms']:.0f}ms | max: {latency['max_ms']:.0f}ms")
+    for name, stats in report["endpoints"].items():
+        if stats["errors"]:
+            print(f"   ❌ {name}: {stats['errors']} errores")
+    server = report["server_time"]
+    if server.get("count"):
+        print(f"   🖥️  Servidor p50: {server['p50_ms']:.0f}ms | p95: {server['p95_ms']:.0f}ms "
+              f"({report['connections_opened']} conexiones, setup p50 {report['connect_time'].get('p50_ms', 0):.0f}ms)")
+    print(f"   📉 Tasa de error: {report['error_rate'] * 100:.2f}%")
+
+    return report["error_rate"] <= 0.02
 
 # Ejecutar todas las pruebas
 print("\n🚀 Iniciando batería de pruebas...\n")
@@ -157,6 +174,7 @@ results = {
     "Database Connection": test_database_connection(),
     "Concurrent Requests": test_concurrent_requests()
 }
+client.close()
 
 # Resumen final
 print("\n" + "="*60)
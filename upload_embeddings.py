@@ -1,51 +1,25 @@
+import hashlib
 import json
 import os
 import time
 import sys
-from typing import List, Dict, Any
-
-try:
-    import psycopg2
-    from psycopg2.extras import execute_values
-    HAS_PSYCOPG2 = True
-except ImportError:
-    HAS_PSYCOPG2 = False
-    print("⚠️ psycopg2 not found. Install it for faster direct DB access: pip install psycopg2-binary")
-
-# Configuration from .env
-ENV_PATH = r'c:\Users\rmend\Desktop\LAVASECO ORQUIDEAS\lavaseco-app\.env'
-
-def load_env(path: str) -> Dict[str, str]:
-    env = {}
-    if os.path.exists(path):
-        with open(path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                if '=' in line:
-                    k, v = line.split('=', 1)
-                    env[k.strip()] = v.strip().strip('"').strip("'")
-    return env
-
-config = load_env(ENV_PATH)
-DB_URL = config.get('DATABASE_URL')
+
+import metrics
+from db import connect_db
+from lexical_index import chunk_doc_id
+
 EMBEDDINGS_FILE = 'codebase_embeddings.json'
 BATCH_SIZE = 25  # Reduced from 100 to 25 per user request
 
-def connect_db():
-    if not HAS_PSYCOPG2:
-        return None
-    try:
-        return psycopg2.connect(DB_URL)
-    except Exception as e:
-        print(f"❌ DB Connection failed: {e}")
-        return None
+def content_hash(content: str) -> str:
+    """sha256 of the chunk text; matches encode(sha256(convert_to(content, 'UTF8')), 'hex')."""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
 
 def main():
     print("="*60)
     print("💾 UPLOAD EMBEDDINGS TO SUPABASE (Optimized Batch: 25)")
     print("="*60)
+    metrics.enable_from_args()
 
     if not os.path.exists(EMBEDDINGS_FILE):
         print(f"❌ File not found: {EMBEDDINGS_FILE}")
@@ -60,26 +34,13 @@ def main():
     cursor = conn.cursor()
 
     # 2. Load Data
-    with open(EMBEDDINGS_FILE, 'r', encoding='utf-8') as f:
+    with metrics.timer("json_load"), open(EMBEDDINGS_FILE, 'r', encoding='utf-8') as f:
         data = json.load(f)
     
     print(f"📂 Loaded {len(data)} chunk embeddings from file.")
 
     try:
-        # 3. Truncate (Clean Slate required for integrity)
-        print("🧹 Cleaning existing memory (TRUNCATE TABLE codebase_embeddings)...")
-        cursor.execute("TRUNCATE TABLE codebase_embeddings;")
-        conn.commit()
-
-        # 4. Batch Insert
-        print("🚀 Inserting data...")
-        
-        insert_query = """
-            INSERT INTO codebase_embeddings (project, file_path, content, embedding, metadata)
-            VALUES %s
-        """
-        
-        # Prepare data for execute_values
+        # Rows in vector_codec.EMBEDDING_COLUMNS order
         values = []
         for item in data:
             # Metadata upgrade: include chunk info if present
@@ -89,6 +50,8 @@ def main():
                     "chunk_index": item['chunk_index'],
                     "total_chunks": item.get('total_chunks')
                 })
+            if item.get('model'):
+                meta_dict["model"] = item['model']
                 
             meta = json.dumps(meta_dict)
             
@@ -97,23 +60,67 @@ def main():
             if not emb:
                 continue
 
+            project = item.get('project', 'unknown')
+            path = item.get('path', item.get('rel_path', 'unknown'))
+            content = item.get('content', '')
             values.append((
-                item.get('project', 'unknown'),
-                item.get('path', item.get('rel_path', 'unknown')),
-                item.get('content', ''), # Insert the actual chunk content
+                project,
+                path,
+                content, # Insert the actual chunk content
                 emb, 
-                meta
+                meta,
+                chunk_doc_id(project, path, item.get('chunk_index', 0)),
+                content_hash(content)
             ))
 
+        # 3. Truncate (Clean Slate required for integrity)
+        # A partitioned table only loses the partitions of the projects in the file.
+        # Their ANN indexes go too, and are trained again on the new rows below.
+        from partition_embeddings import ensure_ann_indexes, ensure_partition, is_partitioned, truncate_tables
+        targets = {}
+        if is_partitioned(cursor):
+            for project in sorted({row[0] for row in values}):
+                targets[project] = ensure_partition(cursor, project)
+        tables = list(targets.values()) or ["codebase_embeddings"]
+        print(f"🧹 Cleaning existing memory (TRUNCATE {', '.join(tables)})...")
+        with metrics.timer("db_truncate"):
+            truncate_tables(cursor, tables)
+            conn.commit()
+
+        # 4. Batch Insert
+        print("🚀 Inserting data...")
+        
+        # Vectors go as pgvector binary through COPY; --text-vectors uses the old INSERT path
+        binary = "--text-vectors" not in sys.argv[1:]
+
+        # Vectors from another model than the active one are re-embedded, and a
+        # model being migrated to (embedding_versions.py) gets its own as well
+        from embedding_versions import store_embeddings
+
+        # Batches never mix projects, so each one goes straight into its partition
         total = len(values)
         start_time = time.time()
         
-        for i in range(0, total, BATCH_SIZE):
-            batch = values[i:i + BATCH_SIZE]
-            execute_values(cursor, insert_query, batch)
-            conn.commit()
-            print(f"   Processed {min(i + BATCH_SIZE, total)}/{total} rows...", end='\r')
+        done = 0
+        for project in sorted({row[0] for row in values}):
+            rows = [row for row in values if row[0] == project]
+            table = targets.get(project, "codebase_embeddings")
+            for i in range(0, len(rows), BATCH_SIZE):
+                batch = rows[i:i + BATCH_SIZE]
+                with metrics.timer("db_insert"):
+                    store_embeddings(cursor, batch, on_conflict="nothing", binary=binary, table=table)
+                    conn.commit()
+                metrics.count("rows_uploaded", len(batch))
+                done += len(batch)
+                print(f"   Processed {done}/{total} rows...", end='\r')
         
+        # ANN indexes trained on the rows just loaded
+        with metrics.timer("db_index"):
+            cursor.execute("SET LOCAL statement_timeout = 0;")   # index builds on a full table
+            for table, lists in ensure_ann_indexes(cursor, tables).items():
+                print(f"\n   ⚡ {table}: ivfflat lists = {lists}")
+            conn.commit()
+
         print(f"\n✅ Upload completed in {time.time() - start_time:.2f} seconds.")
 
     except Exception as e:
@@ -122,6 +129,8 @@ def main():
     finally:
         cursor.close()
         conn.close()
+        metrics.finish("upload_embeddings")
 
 if __name__ == "__main__":
-    main()
+    from profiling import run_main  # --profile
+    run_main("upload_embeddings", main)
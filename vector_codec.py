@@ -0,0 +1,247 @@
+"""
+pgvector's binary wire format (4 bytes per dimension instead of text), used
+to write embeddings through COPY ... (FORMAT binary):
+
+    upsert_embeddings(cursor, rows)          # rows in EMBEDDING_COLUMNS order
+    python vector_codec.py [--rows=2000] [--db]   # compare text vs binary
+"""
+
+import io
+import json
+import struct
+import sys
+import time
+from array import array
+from typing import Any, Callable, Dict, Iterable, List, Sequence
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+# Configuration
+EMBEDDING_COLUMNS = ("project", "file_path", "content", "embedding", "metadata", "chunk_key", "content_hash")
+EMBEDDING_TYPES = ("text", "text", "text", "vector", "jsonb", "text", "text")
+STAGE_TABLE = "embedding_stage"
+BENCH_ROWS = 2000
+BENCH_DIMS = 768
+
+VECTOR_HEADER = struct.Struct(">HH")
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)   # signature, flags, no header extension
+COPY_TRAILER = struct.pack(">h", -1)
+
+# ---------------------------------------------------------
+# VECTORS
+# ---------------------------------------------------------
+def encode_vector(vector: Any) -> bytes:
+    """A vector (float32 array, or any float sequence) in vector_recv()'s format."""
+    if HAS_NUMPY:
+        data = np.asarray(vector, dtype=">f4")   # a float32 array is byte-swapped in one C pass
+        return VECTOR_HEADER.pack(len(data), 0) + data.tobytes()
+    data = array("f", vector)
+    if sys.byteorder == "little":
+        data.byteswap()
+    return VECTOR_HEADER.pack(len(data), 0) + data.tobytes()
+
+def decode_vector(buf) -> Any:
+    """One vector_send() value as a float32 NumPy array (array('f') without NumPy)."""
+    dims, _ = VECTOR_HEADER.unpack_from(buf)
+    if HAS_NUMPY:
+        return np.frombuffer(buf, dtype=">f4", count=dims, offset=VECTOR_HEADER.size).astype(np.float32)
+    values = array("f", bytes(buf[VECTOR_HEADER.size:VECTOR_HEADER.size + 4 * dims]))
+    if sys.byteorder == "little":
+        values.byteswap()
+    return values
+
+def decode_vectors(bufs: Sequence[Any]) -> "np.ndarray":
+    """n vector_send() values of one dimension as a single (n, dims) float32 matrix."""
+    if not bufs:
+        return np.empty((0, 0), dtype=np.float32)
+    dims = VECTOR_HEADER.unpack_from(bufs[0])[0]
+    width = VECTOR_HEADER.size + 4 * dims
+    if any(len(buf) != width for buf in bufs):
+        raise ValueError("Vectors of different dimensions in one batch (see drift_check.py)")
+    # The 4-byte header occupies exactly one float32 slot per row: decode
+    # everything in one call and drop that column.
+    matrix = np.frombuffer(b"".join(bufs), dtype=">f4").reshape(len(bufs), dims + 1)
+    return matrix[:, 1:].astype(np.float32)
+
+# ---------------------------------------------------------
+# COPY BINARY
+# ---------------------------------------------------------
+def _encode_text(value: Any) -> bytes:
+    return str(value).encode("utf-8")
+
+def _encode_jsonb(value: Any) -> bytes:
+    return b"\x01" + (value if isinstance(value, str) else json.dumps(value)).encode("utf-8")  # jsonb format version 1
+
+FIELD_ENCODERS: Dict[str, Callable[[Any], bytes]] = {
+    "text": _encode_text,
+    "jsonb": _encode_jsonb,
+    "vector": encode_vector,
+}
+
+def copy_payload(rows: Iterable[Sequence[Any]], types: Sequence[str]) -> bytes:
+    """The COPY ... (FORMAT binary) stream for rows whose columns have the given types."""
+    encoders = [FIELD_ENCODERS[t] for t in types]
+    tuple_header = struct.pack(">h", len(types))
+    length = struct.Struct(">i").pack
+    parts = [COPY_SIGNATURE]
+    for row in rows:
+        parts.append(tuple_header)
+        for encode, value in zip(encoders, row):
+            if value is None:
+                parts.append(length(-1))
+            else:
+                data = encode(value)
+                parts.append(length(len(data)))
+                parts.append(data)
+    parts.append(COPY_TRAILER)
+    return b"".join(parts)
+
+def copy_binary(cursor, table: str, columns: Sequence[str], types: Sequence[str],
+                rows: Iterable[Sequence[Any]]) -> int:
+    """COPY rows into table in the binary format; returns the payload size in bytes."""
+    payload = copy_payload(rows, types)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT binary)", io.BytesIO(payload))
+    return len(payload)
+
+def upsert_embeddings(cursor, rows: List[Sequence[Any]], on_conflict: str = "update",
+                      binary: bool = True, table: str = "codebase_embeddings"):
+    """
+    Writes rows (EMBEDDING_COLUMNS order, metadata as a JSON string) keyed
+    on (project, chunk_key), which is unique on the flat and the partitioned
+    table alike. on_conflict="update" refreshes the stored chunk,
+    "nothing" keeps it. binary=False is the plain execute_values path.
+    Runs in the caller's transaction.
+    """
+    columns = ", ".join(EMBEDDING_COLUMNS)
+    if on_conflict == "update":
+        conflict = """ON CONFLICT (project, chunk_key) DO UPDATE SET
+                content = EXCLUDED.content,
+                embedding = EXCLUDED.embedding,
+                metadata = EXCLUDED.metadata,
+                content_hash = EXCLUDED.content_hash,
+                created_at = now()"""
+    else:
+        conflict = "ON CONFLICT (project, chunk_key) DO NOTHING"
+
+    if not binary:
+        from psycopg2.extras import execute_values
+        execute_values(cursor, f"INSERT INTO {table} ({columns}) VALUES %s {conflict}", [
+            tuple(v.tolist() if hasattr(v, "tolist") else v for v in row) for row in rows
+        ])
+        return
+
+    # Session-local, emptied at commit; re-created if a rollback dropped it
+    cursor.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS {STAGE_TABLE} (
+          project text, file_path text, content text, embedding vector,
+          metadata jsonb, chunk_key text, content_hash text
+        ) ON COMMIT DELETE ROWS;
+        TRUNCATE {STAGE_TABLE};
+    """)
+    copy_binary(cursor, STAGE_TABLE, EMBEDDING_COLUMNS, EMBEDDING_TYPES, rows)
+    cursor.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {STAGE_TABLE} {conflict};")
+
+# ---------------------------------------------------------
+# BENCHMARK
+# ---------------------------------------------------------
+def text_payload(rows: List[Sequence[Any]]) -> int:
+    """Bytes execute_values sends for the same rows (without a connection: the adapted values)."""
+    from psycopg2.extensions import adapt
+    size = 0
+    for row in rows:
+        for value in row:
+            quoted = adapt(value)
+            if hasattr(quoted, "encoding"):
+                quoted.encoding = "utf-8"
+            size += len(quoted.getquoted()) + 1   # + separator
+    return size
+
+def synthetic_rows(n: int, dims: int) -> List[tuple]:
+    if HAS_NUMPY:
+        vectors = np.random.default_rng(7).standard_normal((n, dims)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        lists = vectors.tolist()      # what Vertex / the embeddings JSON hand over
+    else:
+        import random
+        rng = random.Random(7)
+        lists = [[rng.gauss(0, 1) / dims ** 0.5 for _ in range(dims)] for _ in range(n)]
+    return [("bench", f"src/file_{i}.ts", f"export const value{i} = {i};\n" * 20, lists[i],
+             json.dumps({"chunk_index": 0, "total_chunks": 1}), f"bench/src/file_{i}.ts#0", f"{i:064x}")
+            for i in range(n)]
+
+def _timed(fn: Callable[[], Any], repeats: int = 3):
+    best_cpu = best_wall = float("inf")
+    result = None
+    for _ in range(repeats):
+        cpu, wall = time.process_time(), time.perf_counter()
+        result = fn()
+        best_cpu = min(best_cpu, time.process_time() - cpu)
+        best_wall = min(best_wall, time.perf_counter() - wall)
+    return result, best_cpu, best_wall
+
+def run_benchmark(n_rows: int = BENCH_ROWS, dims: int = BENCH_DIMS, conn=None):
+    rows = synthetic_rows(n_rows, dims)
+    vector_index = EMBEDDING_COLUMNS.index("embedding")
+    vectors_only = [(r[vector_index],) for r in rows]
+    print(f"🧪 {n_rows} rows x {dims} dims")
+
+    results = []
+    size, cpu, _ = _timed(lambda: text_payload(vectors_only))
+    results.append(("text: vectors", size, cpu))
+    size, cpu, _ = _timed(lambda: len(copy_payload(vectors_only, ("vector",))))
+    results.append(("binary: vectors", size, cpu))
+    if HAS_NUMPY:
+        matrix = np.asarray([r[0] for r in vectors_only], dtype=np.float32)
+        arrays = [(v,) for v in matrix]
+        size, cpu, _ = _timed(lambda: len(copy_payload(arrays, ("vector",))))
+        results.append(("binary: vectors from float32", size, cpu))
+    size, cpu, _ = _timed(lambda: text_payload(rows))
+    results.append(("text: full rows", size, cpu))
+    size, cpu, _ = _timed(lambda: len(copy_payload(rows, EMBEDDING_TYPES)))
+    results.append(("binary: full rows", size, cpu))
+
+    print(f"\n   {'client encoding':<30} {'bytes/row':>10} {'total_MB':>9} {'cpu_ms':>9}")
+    for name, size, cpu in results:
+        print(f"   {name:<30} {size / n_rows:>10.0f} {size / 2 ** 20:>9.2f} {cpu * 1000:>9.1f}")
+
+    if conn is None:
+        return
+    # Round trips into a session-local copy of the table; nothing permanent is written
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        CREATE TEMP TABLE vector_codec_bench (
+          project text, file_path text, content text, embedding vector({dims}),
+          metadata jsonb, chunk_key text, content_hash text, created_at timestamptz,
+          UNIQUE (project, chunk_key)
+        );
+    """)
+    print(f"\n   {'database upsert':<30} {'wall_ms':>9} {'client_cpu_ms':>14} {'rows/s':>9}")
+    for name, binary in (("text (execute_values)", False), ("binary (COPY + INSERT)", True)):
+        def write():
+            cursor.execute("TRUNCATE vector_codec_bench;")
+            upsert_embeddings(cursor, rows, binary=binary, table="vector_codec_bench")
+        _, cpu, wall = _timed(write)
+        print(f"   {name:<30} {wall * 1000:>9.1f} {cpu * 1000:>14.1f} {n_rows / wall:>9.0f}")
+    conn.rollback()
+
+def main():
+    args = sys.argv[1:]
+    n_rows = next((int(a.split("=", 1)[1]) for a in args if a.startswith("--rows=")), BENCH_ROWS)
+    conn = None
+    if "--db" in args:
+        from db import connect_db
+        conn = connect_db()
+        if not conn:
+            sys.exit(1)
+    try:
+        run_benchmark(n_rows, conn=conn)
+    finally:
+        if conn:
+            conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,4 @@
-import os
-import psycopg2
-
-# Configuration from .env
-ENV_PATH = r'c:\Users\rmend\Desktop\LAVASECO ORQUIDEAS\lavaseco-app\.env'
-
-def load_env(path: str):
-    env = {}
-    if os.path.exists(path):
-        with open(path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                if '=' in line:
-                    k, v = line.split('=', 1)
-                    env[k.strip()] = v.strip().strip('"').strip("'")
-    return env
-
-config = load_env(ENV_PATH)
-DB_URL = config.get('DATABASE_URL')
+from db import connect_db
 
 def main():
     print("="*60)
@@ -26,26 +6,50 @@ def main():
     print("="*60)
     
     try:
-        conn = psycopg2.connect(DB_URL)
+        conn = connect_db()
+        if conn is None:
+            return
         cursor = conn.cursor()
         
         # 1. Count Total Nodes
         cursor.execute("SELECT count(*) FROM codebase_embeddings;")
         count = cursor.fetchone()[0]
         print(f"🧠 Total Memory Nodes: {count}")
-        
-        # 2. Test Vector Search (RPC)
+
+        # 2. Stream every vector (server-side cursor, binary decode) and check it
+        print("📤 Streaming all vectors...")
+        from export_embeddings import iter_embeddings, HAS_NUMPY
+        streamed = unusable = 0
+        dims = set()
+        for rows, vectors in iter_embeddings(conn, columns=("id",)):
+            streamed += len(rows)
+            if HAS_NUMPY:
+                dims.add(vectors.shape[1])
+                norms = (vectors.astype("float64") ** 2).sum(axis=1)
+                usable = (norms > 0) & (norms < float("inf"))  # NaN fails both
+                unusable += int((~usable).sum())
+            else:
+                dims.update(len(v) for v in vectors)
+        conn.rollback()
+        print(f"✅ {streamed} vectors streamed, dimensions {sorted(dims) or '-'}"
+              + (f", ⚠️ {unusable} NaN/zero" if unusable else ""))
+
+        # 3. Test Vector Search (RPC)
         # We need a dummy embedding. Using a zero vector or random for test if psql allows.
         # But we can't easily generate embedding here without numpy/vertex.
         # However, we can call the function with a dummy list if pgvector casts it.
         # '[0.1, 0.1, ...]' string literal to vector.
         
         print("🔍 Testing Semantic Search (RPC match_codebase)...")
-        dummy_vector = '[' + ','.join(['0.01'] * 768) + ']'
+        # Dimensions of the active model (embedding_versions.py), 768 before the registry exists
+        from embedding_versions import versions
+        live = versions(cursor)
+        dims = live[0].dims if live else 768
+        dummy_vector = '[' + ','.join(['0.01'] * dims) + ']'
         
         try:
             cursor.execute("""
-                select * from match_codebase(
+                select id, project, file_path, content, similarity from match_codebase(
                     %s::vector, 
                     0.0, 
                     3
@@ -0,0 +1,454 @@
+"""
+👁️ WATCH MODE: KEEPS codebase_embeddings IN SYNC WITH THE EDITOR
+
+Watches DIRECTORIES_TO_SCAN (inotify on Linux, polling elsewhere),
+debounces bursts of saves, re-chunks only the files that changed, embeds
+only the chunks whose content_hash changed and upserts / deletes rows by
+chunk_key. The BM25 index is updated in place, so search_service picks
+the change up on its next reload.
+
+    python watch_codebase.py [--poll] [--debounce=1.0] [--no-initial-sync] [--once]
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import json
+import os
+import select
+import struct
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from generate_embeddings import get_batch_embeddings, recursive_split_text, TARGET_CHUNK_SIZE, INPUT_FILE
+from lexical_index import LexicalIndex, chunk_doc_id, INDEX_FILE
+from scan_codebase import DIRECTORIES_TO_SCAN, EXTENSIONS, IGNORE_DIRS, scan_directory
+from db import connect_db
+from upload_embeddings import content_hash
+
+# Configuration
+DEBOUNCE_SECONDS = 1.0      # quiet time after the last event before syncing
+MAX_DELAY_SECONDS = 10.0    # ...but never hold a change longer than this
+POLL_INTERVAL = 2.0         # polling fallback: seconds between directory walks
+EMBED_BATCH_SIZE = 5        # texts per Vertex request, as in generate_embeddings
+RETRY_DELAY = 30.0          # after a failed sync (API / DB down), try again this much later
+
+# inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0o2000000)
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF)
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+# ---------------------------------------------------------
+# WATCHERS
+# ---------------------------------------------------------
+def walk_tree(root: str) -> Iterable[Tuple[str, List[str]]]:
+    """os.walk over the directories scan_codebase would visit."""
+    for current, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if d not in IGNORE_DIRS]
+        yield current, files
+
+class InotifyWatcher:
+    """
+    One inotify watch per directory (inotify is not recursive); watches
+    for new directories are added as they appear. A queue overflow is
+    reported so the caller can fall back to a full reconcile.
+    """
+
+    def __init__(self, roots: List[str]):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.paths: Dict[int, str] = {}
+        for root in roots:
+            self.add_tree(root)
+
+    def _add_watch(self, path: str):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                raise OSError(err, "inotify watch limit reached (fs.inotify.max_user_watches)")
+            return  # the directory vanished before we got to it
+        self.paths[wd] = path
+
+    def add_tree(self, root: str) -> Set[str]:
+        """Watches root and its subdirectories; returns the files already in them."""
+        found = set()
+        for current, files in walk_tree(root):
+            self._add_watch(current)
+            found.update(os.path.join(current, name) for name in files)
+        return found
+
+    def read(self, timeout: float) -> Tuple[Set[str], bool]:
+        changed: Set[str] = set()
+        overflow = False
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return changed, overflow
+
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                if mask & IN_IGNORED:
+                    self.paths.pop(wd, None)
+                    continue
+                parent = self.paths.get(wd)
+                if parent is None or not name:
+                    continue
+                path = os.path.join(parent, os.fsdecode(name))
+                if mask & IN_ISDIR:
+                    if os.path.basename(path) in IGNORE_DIRS:
+                        continue
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        # Files can land before the watch exists: report what is already there
+                        changed |= self.add_tree(path)
+                    else:
+                        changed.add(path)  # a removed directory: everything under it goes
+                else:
+                    changed.add(path)
+        return changed, overflow
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """Portable fallback: diffs (mtime, size) snapshots of the tree."""
+
+    def __init__(self, roots: List[str], interval: float = POLL_INTERVAL):
+        self.roots = roots
+        self.interval = interval
+        self.snapshot = self._snapshot()
+
+    def _snapshot(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        for root in self.roots:
+            for current, files in walk_tree(root):
+                for name in files:
+                    if os.path.splitext(name)[1].lower() not in EXTENSIONS:
+                        continue
+                    path = os.path.join(current, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    snapshot[path] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def read(self, timeout: float) -> Tuple[Set[str], bool]:
+        time.sleep(min(timeout, self.interval))
+        current = self._snapshot()
+        changed = {p for p, sig in current.items() if self.snapshot.get(p) != sig}
+        changed |= self.snapshot.keys() - current.keys()
+        self.snapshot = current
+        return changed, False
+
+    def close(self):
+        pass
+
+def make_watcher(roots: List[str], force_poll: bool = False):
+    if not force_poll and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(roots)
+        except (OSError, AttributeError) as e:
+            print(f"⚠️ inotify no disponible ({e}); usando sondeo cada {POLL_INTERVAL}s")
+    return PollingWatcher(roots)
+
+# ---------------------------------------------------------
+# SYNC
+# ---------------------------------------------------------
+def like_prefix(path: str) -> str:
+    return path.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "/%"
+
+class CodebaseSync:
+    """Applies a set of changed paths to codebase_embeddings and the BM25 index."""
+
+    def __init__(self, conn, roots: List[str]):
+        self.conn = conn
+        self.roots = roots
+        self.lexical = LexicalIndex.load(INDEX_FILE)
+        self.files_map: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(INPUT_FILE):
+            with open(INPUT_FILE, "r", encoding="utf-8") as f:
+                self.files_map = {item["full_path"]: item for item in json.load(f)}
+
+    def resolve(self, path: str) -> Optional[Tuple[str, str]]:
+        """(project, rel_path) for a path under a watched root, None if it's not ours."""
+        path = os.path.abspath(path)
+        for root in self.roots:
+            if path == root or not path.startswith(root + os.sep):
+                continue
+            rel_path = os.path.relpath(path, root).replace(os.sep, "/")
+            if any(part in IGNORE_DIRS for part in rel_path.split("/")):
+                return None
+            return os.path.basename(root), rel_path
+        return None
+
+    def _file_records(self, full_path: str, project: str, rel_path: str) -> List[Dict[str, Any]]:
+        try:
+            with open(full_path, "r", encoding="utf-8", errors="ignore") as f:
+                content = f.read()
+        except OSError:
+            return []
+        if not content.strip():
+            return []
+        chunks = recursive_split_text(content, TARGET_CHUNK_SIZE)
+        return [{
+            "full_path": full_path,
+            "project": project,
+            "path": rel_path,
+            "content": chunk,
+            "chunk_index": i,
+            "total_chunks": len(chunks),
+            "chunk_key": chunk_doc_id(project, rel_path, i),
+            "content_hash": content_hash(chunk)
+        } for i, chunk in enumerate(chunks)]
+
+    def sync(self, paths: Iterable[str]) -> Dict[str, int]:
+        """
+        Re-chunks the given files, embeds only chunks whose hash changed,
+        and in one transaction upserts them and deletes the rows of chunks
+        (or whole files / directories) that no longer exist.
+        """
+        stats = {"files": 0, "chunks": 0, "embedded": 0, "removed": 0}
+        records: List[Dict[str, Any]] = []
+        present: Dict[str, Set[str]] = {}   # project -> rel paths that exist on disk
+        gone: Dict[str, Set[str]] = {}      # project -> rel paths (files or dirs) that don't
+        map_dirty = False
+
+        for path in set(paths):
+            resolved = self.resolve(path)
+            if resolved is None:
+                continue
+            project, rel_path = resolved
+            if os.path.isfile(path):
+                ext = os.path.splitext(path)[1].lower()
+                if ext not in EXTENSIONS:
+                    continue
+                present.setdefault(project, set()).add(rel_path)
+                records.extend(self._file_records(path, project, rel_path))
+                if path not in self.files_map:
+                    self.files_map[path] = {"full_path": path, "rel_path": rel_path,
+                                            "project": project, "ext": ext}
+                    map_dirty = True
+            elif not os.path.exists(path):
+                gone.setdefault(project, set()).add(rel_path)
+                for full_path in [p for p in self.files_map if p == path or p.startswith(path + os.sep)]:
+                    del self.files_map[full_path]
+                    map_dirty = True
+        stats["files"] = sum(len(p) for p in present.values()) + sum(len(p) for p in gone.values())
+        stats["chunks"] = len(records)
+        if not stats["files"]:
+            return stats
+
+        cursor = self.conn.cursor()
+        stored: Dict[str, str] = {}
+        if records:
+            cursor.execute(
+                "SELECT chunk_key, content_hash FROM codebase_embeddings WHERE chunk_key = ANY(%s);",
+                ([r["chunk_key"] for r in records],)
+            )
+            stored = dict(cursor.fetchall())
+        from embedding_versions import active_model, store_embeddings
+        model = active_model(cursor)
+        self.conn.rollback()  # don't hold the read transaction open across Vertex calls
+
+        changed = [r for r in records if stored.get(r["chunk_key"]) != r["content_hash"]]
+        for i in range(0, len(changed), EMBED_BATCH_SIZE):
+            batch = changed[i:i + EMBED_BATCH_SIZE]
+            vectors = get_batch_embeddings([r["content"] for r in batch], model)
+            if len(vectors) != len(batch):
+                raise RuntimeError("Fallo al generar embeddings")
+            for record, vector in zip(batch, vectors):
+                record["embedding"] = vector
+        stats["embedded"] = len(changed)
+
+        keys = [r["chunk_key"] for r in records]
+        removed: List[str] = []
+        try:
+            if changed:
+                store_embeddings(cursor, [(
+                    r["project"], r["path"], r["content"], r["embedding"],
+                    json.dumps({
+                        "source": "watch",
+                        "original_id": r["full_path"],
+                        "chunk_index": r["chunk_index"],
+                        "total_chunks": r["total_chunks"],
+                        "model": model
+                    }),
+                    r["chunk_key"], r["content_hash"]
+                ) for r in changed])
+
+            for project in sorted(present.keys() | gone.keys()):
+                # Chunks past the new end of a shorter file, deleted files, and
+                # everything under a deleted directory
+                files = sorted(present.get(project, set()) | gone.get(project, set()))
+                prefixes = [like_prefix(p) for p in sorted(gone.get(project, set()))]
+                cursor.execute("""
+                    DELETE FROM codebase_embeddings
+                    WHERE project = %s
+                      AND (file_path = ANY(%s) OR file_path LIKE ANY(%s))
+                      AND NOT (chunk_key = ANY(%s))
+                    RETURNING chunk_key;
+                """, (project, files, prefixes, keys))
+                removed.extend(row[0] for row in cursor.fetchall())
+            stats["removed"] = len(removed)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        if changed or removed:
+            for key in removed:
+                self.lexical.remove(key)
+            for r in changed:
+                self.lexical.add(r["chunk_key"], r["content"], r["project"], r["path"], r["chunk_index"],
+                                 {"total_chunks": r["total_chunks"]})
+            self.lexical.save(INDEX_FILE)
+        if map_dirty:
+            self.save_map()
+        return stats
+
+    def save_map(self):
+        """Keeps codebase_map.json (used by drift_check / code_graph) in step with the disk."""
+        tmp_path = INPUT_FILE + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(sorted(self.files_map.values(), key=lambda item: item["full_path"]), f, indent=2)
+        os.replace(tmp_path, INPUT_FILE)
+
+    def reconcile(self) -> Dict[str, int]:
+        """
+        Full pass for start-up and inotify overflows: every file on disk plus
+        every stored path, so edits and deletions made while we weren't
+        watching are caught. Unchanged chunks cost a hash, not an API call.
+        """
+        paths: Set[str] = set()
+        disk_items = []
+        for root in self.roots:
+            disk_items.extend(scan_directory(root))
+        paths.update(item["full_path"] for item in disk_items)
+        self.files_map.update({item["full_path"]: item for item in disk_items})
+
+        cursor = self.conn.cursor()
+        for root in self.roots:
+            cursor.execute("SELECT DISTINCT file_path FROM codebase_embeddings WHERE project = %s;",
+                           (os.path.basename(root),))
+            paths.update(os.path.join(root, *file_path.split("/")) for (file_path,) in cursor.fetchall())
+        self.conn.rollback()
+
+        stats = self.sync(paths)
+        self.save_map()
+        return stats
+
+# ---------------------------------------------------------
+# LOOP
+# ---------------------------------------------------------
+def report(stats: Dict[str, int], elapsed: float):
+    print(f"[{datetime.now():%H:%M:%S}] 🔄 {stats['files']} archivos, {stats['chunks']} fragmentos: "
+          f"{stats['embedded']} vectorizados, {stats['removed']} eliminados ({elapsed:.2f}s)")
+
+def watch(syncer: CodebaseSync, watcher, debounce: float = DEBOUNCE_SECONDS,
+          max_delay: float = MAX_DELAY_SECONDS):
+    pending: Set[str] = set()
+    needs_reconcile = False
+    first_event = last_event = None
+    retry_at = 0.0
+
+    while True:
+        changed, overflow = watcher.read(debounce / 2 if pending or needs_reconcile else 60.0)
+        now = time.monotonic()
+        if overflow:
+            print("⚠️ Cola de inotify desbordada: sincronización completa")
+            needs_reconcile = True
+        if changed:
+            pending |= changed
+            last_event = now
+            first_event = first_event or now
+
+        due = (pending or needs_reconcile) and now >= retry_at and (
+            needs_reconcile or now - last_event >= debounce or now - first_event >= max_delay)
+        if not due:
+            continue
+
+        batch, pending = pending, set()
+        start = time.time()
+        try:
+            stats = syncer.reconcile() if needs_reconcile else syncer.sync(batch)
+            needs_reconcile = False
+            first_event = last_event = None
+            if stats["files"]:
+                report(stats, time.time() - start)
+        except Exception as e:
+            print(f"❌ Error de sincronización: {e} (reintento en {RETRY_DELAY:.0f}s)")
+            pending |= batch
+            retry_at = now + RETRY_DELAY
+
+def main():
+    print("="*60)
+    print("👁️ WATCH MODE: EMBEDDINGS EN TIEMPO REAL")
+    print("="*60)
+
+    args = sys.argv[1:]
+    debounce = next((float(a.split("=", 1)[1]) for a in args if a.startswith("--debounce=")), DEBOUNCE_SECONDS)
+    roots = [os.path.abspath(d) for d in DIRECTORIES_TO_SCAN if os.path.isdir(d)]
+    for directory in DIRECTORIES_TO_SCAN:
+        if not os.path.isdir(directory):
+            print(f"⚠️ Warning: Path not found: {directory}")
+    if not roots:
+        print("❌ Nada que vigilar")
+        sys.exit(1)
+
+    conn = connect_db()
+    if not conn:
+        sys.exit(1)
+
+    try:
+        syncer = CodebaseSync(conn, roots)
+        if "--no-initial-sync" not in args or "--once" in args:
+            start = time.time()
+            print("🔍 Sincronización inicial (solo se vectoriza lo que cambió)...")
+            report(syncer.reconcile(), time.time() - start)
+        if "--once" in args:
+            return
+
+        watcher = make_watcher(roots, force_poll="--poll" in args)
+        print(f"👁️ Vigilando {len(roots)} directorios ({type(watcher).__name__}, debounce {debounce}s). Ctrl+C para salir.")
+        try:
+            watch(syncer, watcher, debounce)
+        finally:
+            watcher.close()
+    except KeyboardInterrupt:
+        print("\n👋 Watch mode detenido")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    from profiling import run_main  # --profile
+    run_main("watch_codebase", main)